@@ -0,0 +1,135 @@
+"""
+Device and variable catalog for the substitution generator
+
+The Substitution Generator menus list every Indigo device and variable, and the states of the selected device. Rather
+than enumerating and sorting the whole Indigo database each time a menu is populated, the catalog is built once and
+then kept up to date from the plugin's device and variable change notifications. Names are kept sorted in a NameIndex,
+so filtering doesn't have to sort.
+"""
+
+import threading
+
+from name_index import NameIndex
+
+DEVICES_HEADER   = [('-1', '%%disabled:Devices%%'), ('-1', '%%separator%%')]
+VARIABLES_HEADER = [('-2', '%%disabled:Variables%%'), ('-2', '%%separator%%')]
+
+
+# =============================================================================
+def _state_names(dev) -> tuple:
+    """Return a device's state names, sorted, without the `.ui` variants."""
+    return tuple(sorted(state for state in dev.states if not state.endswith('.ui')))
+
+
+class Catalog:
+    """A sorted, incrementally maintained catalog of Indigo devices, their states, and variables."""
+
+    def __init__(self):
+        """Catalog initialization."""
+        self.built      = False
+        self._devices   = NameIndex()
+        self._lock      = threading.Lock()
+        self._states    = {}
+        self._variables = NameIndex()
+
+    # =============================================================================
+    def build(self, devices, variables) -> None:
+        """(Re)build the catalog.
+
+        Args:
+            devices: An iterable of Indigo devices.
+            variables: An iterable of Indigo variables.
+        """
+        with self._lock:
+            self._devices   = NameIndex()
+            self._states    = {}
+            self._variables = NameIndex()
+            for dev in devices:
+                self._add_device(dev)
+            for var in variables:
+                self._variables.add(var.id, var.name)
+            self.built = True
+
+    # =============================================================================
+    def update_device(self, dev) -> None:
+        """Add a new device or apply a change to an existing one. Ignored until the catalog is built.
+
+        Args:
+            dev: The new or updated Indigo device.
+        """
+        if not self.built:
+            return
+        with self._lock:
+            if self._devices.names.get(dev.id) != dev.name or self._states.get(dev.id) != _state_names(dev):
+                self._add_device(dev)
+
+    # =============================================================================
+    def remove_device(self, dev_id: int) -> None:
+        """Remove a deleted device.
+
+        Args:
+            dev_id (int): The Indigo device ID.
+        """
+        with self._lock:
+            self._devices.remove(dev_id)
+            self._states.pop(dev_id, None)
+
+    # =============================================================================
+    def update_variable(self, var) -> None:
+        """Add a new variable or apply a change to an existing one. Ignored until the catalog is built.
+
+        Args:
+            var: The new or updated Indigo variable.
+        """
+        if not self.built:
+            return
+        with self._lock:
+            if self._variables.names.get(var.id) != var.name:
+                self._variables.add(var.id, var.name)
+
+    # =============================================================================
+    def remove_variable(self, var_id: int) -> None:
+        """Remove a deleted variable.
+
+        Args:
+            var_id (int): The Indigo variable ID.
+        """
+        with self._lock:
+            self._variables.remove(var_id)
+
+    # =============================================================================
+    def devices_and_variables(self, fltr: str = "") -> list:
+        """Return the devices and variables menu: matching devices, then matching variables, each under a header.
+
+        Args:
+            fltr (str): A case-insensitive name filter.
+
+        Returns:
+            list: `(id, name)` tuples.
+        """
+        with self._lock:
+            return DEVICES_HEADER + self._devices.search(fltr) + VARIABLES_HEADER + self._variables.search(fltr)
+
+    # =============================================================================
+    def states(self, item_id: int) -> list | None:
+        """Return the states menu for a device or variable.
+
+        Args:
+            item_id (int): The Indigo device or variable ID.
+
+        Returns:
+            list | None: `(state, state)` tuples for a device, `[('value', 'Value')]` for a variable, or None if the
+                ID isn't in the catalog.
+        """
+        with self._lock:
+            if item_id in self._states:
+                return [(state, state) for state in self._states[item_id]]
+            if item_id in self._variables.names:
+                return [('value', 'Value')]
+            return None
+
+    # =============================================================================
+    def _add_device(self, dev) -> None:
+        """Add or update a device. Must be called with the lock held."""
+        self._devices.add(dev.id, dev.name)
+        self._states[dev.id] = _state_names(dev)
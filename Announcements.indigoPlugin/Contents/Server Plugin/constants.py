@@ -14,6 +14,7 @@ ANNOUNCEMENT_DIALOG_FIELDS = (
     'announcementIndex',
     'announcementName',
     'announcementRefresh',
+    'announcementCatchUp',
     'announcementList',
     'announcementText',
 )
@@ -22,6 +23,7 @@ ANNOUNCEMENT_DIALOG_OPEN_FIELDS = (
     'announcementName',
     'announcementList',
     'announcementRefresh',
+    'announcementCatchUp',
     'announcementText',
     'subGeneratorResult',
 )
@@ -33,3 +35,51 @@ DEBUG_LABELS = {
     40: "Error Messages",
     50: "Critical Errors Only"
 }
+
+# The numeric plugin prefs, with their type and the smallest and largest values allowed (None for no limit).
+NUMERIC_PREFS = {
+    'pluginRefresh':       (int, 1, None),
+    'refreshTolerance':    (float, 0, 100),
+    'tickTimeBudget':      (float, 0, None),
+    'tickWorkBudget':      (int, 0, None),
+    'serverLatencyTarget': (float, 0, None),
+    'tickMaxGap':          (float, 0, None),
+    'renderWorkers':       (int, 1, None),
+    'formatWorkers':       (int, 0, None),
+    'metricsPort':         (int, 0, 65535),
+    'speechQueueDepth':    (int, 1, None),
+    'speechGap':           (float, 0, None),
+}
+
+# The maximum number of rendered announcement strings retained by the render cache.
+RENDER_CACHE_SIZE = 512
+
+# Seconds between refresh passes while due announcements are being carried over because of the tick budget.
+BACKLOG_SLICE_INTERVAL = 0.5
+
+# The maximum number of missed refreshes replayed for an announcement with the `all` catch-up policy.
+CATCH_UP_LIMIT = 60
+
+# The target time (seconds) for the plugin's startup() method. Shown in the plugin diagnostics.
+STARTUP_TARGET = 0.25
+
+# The maximum number of announcements listed in the announcements device dialog. Use the search field to find others.
+ANNOUNCEMENT_LIST_LIMIT = 200
+
+# The minimum number of seconds between log messages for an error that repeats on every refresh pass.
+ERROR_LOG_INTERVAL = 300
+
+# Seconds between writes of the metrics file (plugin prefs), and the bounds (seconds) of the refresh pass histogram.
+METRICS_INTERVAL     = 15
+TICK_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# The render recording (plugin prefs), relative to the Indigo install folder, and the size at which recording stops.
+RECORDING_FILE  = "/Preferences/Plugins/com.fogbert.indigoplugin.announcements.recording.jsonl"
+RECORDING_LIMIT = 50 * 1024 * 1024
+
+# Renders kept in the history of each announcement, the memory limit of the whole history, and the history file (plugin
+# prefs), relative to the Indigo install folder, with the seconds between writes.
+HISTORY_ENTRIES        = 100
+HISTORY_FILE           = "/Preferences/Plugins/com.fogbert.indigoplugin.announcements.history.json"
+HISTORY_MAX_BYTES      = 16 * 1024 * 1024
+HISTORY_SPILL_INTERVAL = 300
@@ -0,0 +1,202 @@
+"""
+Announcement formatting pipeline
+
+Applies the `<<value, spec>>` formatters (ct:, dt:, n:) to an announcement after Indigo substitution. Nothing here talks
+to the Indigo server, so the pipeline can run in a worker process: the plugin substitutes the Indigo references on its
+own thread and hands the substituted strings to `render_batch()`.
+"""
+
+import datetime as dt
+import logging
+import re
+import time
+
+from templates import FORMATTER_PATTERN
+
+LOGGER = logging.getLogger("Plugin")
+
+
+# =============================================================================
+def validate_format_spec(spec: str, allowlist: str) -> None:
+    """Raise ValueError if any character in spec is not in allowlist.
+
+    Args:
+        spec (str): The format specifier string to validate.
+        allowlist (str): String of allowable characters.
+
+    Raises:
+        ValueError: If spec contains a character not in allowlist.
+    """
+    for char in spec:
+        if char not in allowlist:
+            raise ValueError
+
+
+# =============================================================================
+def format_digits(match: re.Match) -> str:
+    """Format announcement digits based on announcement criteria.
+
+    Determines the proper formatting routine to use when converting target values to the specified format, then
+    delegates to the appropriate formatter.
+
+    Args:
+        match (re.Match): The regex match object containing the value and format spec groups.
+
+    Returns:
+        str: The formatted result string.
+    """
+    match1: str = match.group(1)  # the string to be formatted
+    match2: str = match.group(2)  # the format specification
+    match1 = match1.replace('<<', '')
+    match2 = match2.replace('>>', '')
+
+    # Current time conversions specified with ct: ...
+    if match2.startswith('ct:'):
+        result = format_current_time(match1, match2)
+
+    # Datetime conversions specified with dt: ...
+    elif match2.startswith('dt:'):
+        result = format_datetime(match1, match2)
+
+    # Number conversions specified with n: ...
+    elif match2.startswith('n:'):
+        result = format_number(match1, match2)
+
+    else:
+        result = f"{match1} {match2}"
+
+    return result
+
+
+# =============================================================================
+def format_current_time(match1: str, match2: str) -> str:
+    """Format the current time based on announcement criteria.
+
+    Creates a formatted version of the current time. Called when the format specifier is "ct:".
+
+    Args:
+        match1 (str): The original value string (unused for current time).
+        match2 (str): The format specification string (e.g., "ct:%H:%M").
+
+    Returns:
+        str: The formatted current time string.
+    """
+    match2 = match2.replace('ct:', '')
+
+    try:
+        validate_format_spec(match2, '.,%:-aAwdbBmyYHIpMSfzZjUWcxX ')
+        match1 = dt.datetime.now()
+        return f"{match1:{match2}}"
+
+    except ValueError:
+        LOGGER.debug("Error: ", exc_info=True)
+        return f"Unallowable datetime specifiers: {match1} {match2}"
+
+
+# =============================================================================
+def format_datetime(match1: str, match2: str) -> str:
+    """Format a datetime string based on announcement criteria.
+
+    Formats a string using common Python datetime format specifiers. Called when the format specifier is "dt:".
+
+    Args:
+        match1 (str): The datetime value string to parse (or "now" for the current time).
+        match2 (str): The format specification string (e.g., "dt:%A").
+
+    Returns:
+        str: The formatted datetime string.
+    """
+    match2 = match2.replace('dt:', '')
+
+    try:
+        validate_format_spec(match2, '.,%:-aAwdbBmyYHIpMSfzZjUWcxX ')
+        if match1 == 'now':
+            match1 = dt.datetime.now()
+        else:
+            from dateutil import parser  # noqa - imported on first use to keep plugin startup fast
+            match1 = parser.parse(match1)
+        return f"{match1:{match2}}"
+
+    except ValueError:
+        LOGGER.debug("Error: ", exc_info=True)
+        return f"Unallowable datetime specifiers: {match1} {match2}"
+
+
+# =============================================================================
+def format_number(match1: str, match2: str) -> str:
+    """Format a number based on announcement criteria.
+
+    Formats a string using common Python numeric format specifiers. Called when the format specifier is "n:".
+
+    Args:
+        match1 (str): The numeric value string to format.
+        match2 (str): The format specification string (e.g., "n:2" for 2 decimal places).
+
+    Returns:
+        str: The formatted number string.
+    """
+    match2 = match2.replace('n:', '')
+
+    try:
+        validate_format_spec(match2, '0123456789')
+        return f"{float(match1):0.{int(match2)}f}"
+
+    except ValueError:
+        LOGGER.debug("Error: ", exc_info=True)
+        return f"Unallowable numeric specifiers: {match1} {match2}"
+
+
+# =============================================================================
+def substitution_regex(announcement: str) -> str:
+    """Apply regex formatting substitutions to an announcement string.
+
+    The only possible matches are expressly listed in the pattern. Currently supported specifiers: ct:, dt:, n:.
+
+    Args:
+        announcement (str): The announcement string to be parsed.
+
+    Returns:
+        str: The announcement string with all formatting substitutions applied.
+    """
+    return FORMATTER_PATTERN.sub(format_digits, announcement)
+
+
+# =============================================================================
+def trace_formatters(announcement: str) -> tuple:
+    """Apply the formatting substitutions to an announcement string, timing each formatter.
+
+    Args:
+        announcement (str): The announcement string with its Indigo references already substituted.
+
+    Returns:
+        tuple: The formatted string (as from substitution_regex), and a dict for each formatter with its `token`,
+            `input` value, `spec`, `output` and duration in milliseconds (`ms`), in template order.
+    """
+    steps = []
+
+    def traced(match: re.Match) -> str:
+        started = time.perf_counter()
+        result  = format_digits(match)
+        steps.append({
+            'token': match.group(0),
+            'input': match.group(1).replace('<<', ''),
+            'spec': match.group(2).replace('>>', ''),
+            'output': result,
+            'ms': (time.perf_counter() - started) * 1000,
+        })
+        return result
+
+    return FORMATTER_PATTERN.sub(traced, announcement), steps
+
+
+# =============================================================================
+def render_batch(announcements: list) -> list:
+    """Apply the formatting pipeline to a batch of substituted announcement strings.
+
+    Args:
+        announcements (list): Announcement strings with their Indigo references already substituted.
+
+    Returns:
+        list: The formatted strings, in the same order.
+    """
+    return [substitution_regex(announcement) for announcement in announcements]
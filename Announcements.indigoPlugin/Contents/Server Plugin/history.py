@@ -0,0 +1,203 @@
+"""
+Rendered announcement history
+
+Each announcement keeps a ring buffer of its recent renders as `(timestamp, rendered text, render ms)`. Consecutive
+renders are often identical, so rendered strings are interned: every entry holding the same text shares one string,
+and a string's memory is counted once. Total memory is bounded; when it's exceeded, the oldest entries across all
+announcements are dropped first.
+
+The history can be saved to a compact JSON file (each distinct string written once) and loaded back, so it survives a
+plugin restart.
+"""
+
+import collections
+import json
+import os
+import sys
+import tempfile
+import threading
+
+# The estimated memory of one ring buffer entry (the entry tuple, its numbers and the buffer slot), excluding the text.
+ENTRY_BYTES = 128
+
+
+class RenderHistory:
+    """Ring buffers of rendered announcements, keyed by `(dev_id, announcement_id)`."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        """History initialization.
+
+        Args:
+            max_entries (int): The number of renders kept for each announcement.
+            max_bytes (int): The estimated memory limit for the whole history.
+        """
+        self.bytes       = 0
+        self.max_bytes   = max_bytes
+        self.max_entries = max_entries
+        self._entries    = 0
+        self._lock       = threading.Lock()
+        self._order      = collections.deque()  # (sequence, key) in render order, for evicting the oldest entries
+        self._rings      = {}  # key: deque of (sequence, timestamp, text, ms)
+        self._sequence   = 0
+        self._texts      = {}  # text: [interned text, entries holding it]
+
+    # =============================================================================
+    def __len__(self) -> int:
+        return self._entries
+
+    # =============================================================================
+    @property
+    def texts(self) -> int:
+        """Return the number of distinct rendered strings held."""
+        return len(self._texts)
+
+    # =============================================================================
+    def record(self, key: tuple, timestamp: float, text: str, ms: float) -> None:
+        """Add a render to an announcement's history.
+
+        Args:
+            key (tuple): `(dev_id, announcement_id)`.
+            timestamp (float): The render time as seconds since the epoch.
+            text (str): The rendered announcement.
+            ms (float): The render time in milliseconds.
+        """
+        with self._lock:
+            self._sequence += 1
+            ring = self._rings.get(key)
+            if ring is None:
+                ring = self._rings[key] = collections.deque()
+            ring.append((self._sequence, timestamp, self.__intern__(text), ms))
+            self._order.append((self._sequence, key))
+            self._entries += 1
+            self.bytes    += ENTRY_BYTES
+
+            if len(ring) > self.max_entries:
+                self.__release__(ring.popleft())
+            while self.bytes > self.max_bytes and self._order:
+                self.__evict_oldest__()
+            if len(self._order) > 2 * self._entries + 1024:
+                self._order = collections.deque(
+                    sorted((entry[0], ring_key) for ring_key, entries in self._rings.items() for entry in entries)
+                )
+
+    # =============================================================================
+    def query(self, key: tuple, since: float = None, limit: int = None) -> list:
+        """Return an announcement's history, oldest first.
+
+        Args:
+            key (tuple): `(dev_id, announcement_id)`.
+            since (float): Only renders at or after this time (seconds since the epoch).
+            limit (int): Only the most recent `limit` renders.
+
+        Returns:
+            list: `(timestamp, text, ms)` tuples.
+        """
+        with self._lock:
+            entries = list(self._rings.get(key, ()))
+        history = [(timestamp, text, ms) for _, timestamp, text, ms in entries if since is None or timestamp >= since]
+        return history[-limit:] if limit else history
+
+    # =============================================================================
+    def remove(self, dev_id: int, announcement_id: int = None) -> None:
+        """Drop the history of a deleted announcement, or of all of a deleted device's announcements.
+
+        Args:
+            dev_id (int): The announcements device ID.
+            announcement_id (int): The announcement ID; None for all of the device's announcements.
+        """
+        with self._lock:
+            for key in [key for key in self._rings if key[0] == dev_id and announcement_id in (None, key[1])]:
+                for entry in self._rings.pop(key):
+                    self.__release__(entry)
+
+    # =============================================================================
+    def save(self, path: str) -> None:
+        """Write the history to a file atomically.
+
+        Args:
+            path (str): The history file.
+        """
+        with self._lock:
+            texts   = {}
+            history = [
+                [key[0], key[1], [
+                    [round(timestamp, 3), texts.setdefault(text, len(texts)), round(ms, 2)]
+                    for _, timestamp, text, ms in ring
+                ]]
+                for key, ring in self._rings.items() if ring
+            ]
+        data = json.dumps({'texts': list(texts), 'history': history}, ensure_ascii=False, separators=(',', ':'))
+
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".history-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, mode='w', encoding="utf-8") as outfile:
+                outfile.write(data)
+            os.replace(temp, path)
+        except OSError:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+    # =============================================================================
+    def load(self, path: str) -> int:
+        """Add the renders saved in a history file, in render order. A missing file is ignored.
+
+        Args:
+            path (str): The history file.
+
+        Returns:
+            int: The number of renders loaded.
+
+        Raises:
+            ValueError: If the file isn't a history file.
+        """
+        if not os.path.isfile(path):
+            return 0
+        with open(path, mode='r', encoding="utf-8") as infile:
+            data = json.load(infile)
+        try:
+            texts   = data['texts']
+            renders = sorted(
+                (timestamp, (dev_id, announcement_id), texts[text], ms)
+                for dev_id, announcement_id, entries in data['history'] for timestamp, text, ms in entries
+            )
+        except (KeyError, IndexError, TypeError) as error:
+            raise ValueError("Not a render history file.") from error
+
+        for timestamp, key, text, ms in renders:
+            self.record(key, timestamp, text, ms)
+        return len(renders)
+
+    # =============================================================================
+    def __intern__(self, text: str) -> str:
+        """Return the shared copy of a rendered string. Must be called with the lock held."""
+        interned = self._texts.get(text)
+        if interned is None:
+            interned = self._texts[text] = [text, 0]
+            self.bytes += sys.getsizeof(text)
+        interned[1] += 1
+        return interned[0]
+
+    # =============================================================================
+    def __release__(self, entry: tuple) -> None:
+        """Account for a dropped entry. Must be called with the lock held."""
+        interned = self._texts[entry[2]]
+        interned[1] -= 1
+        if not interned[1]:
+            del self._texts[entry[2]]
+            self.bytes -= sys.getsizeof(entry[2])
+        self._entries -= 1
+        self.bytes    -= ENTRY_BYTES
+
+    # =============================================================================
+    def __evict_oldest__(self) -> None:
+        """Drop the oldest entry across all announcements. Must be called with the lock held.
+
+        Entries already dropped from a full ring buffer or a deleted announcement are skipped.
+        """
+        sequence, key = self._order.popleft()
+        ring = self._rings.get(key)
+        if ring and ring[0][0] == sequence:
+            self.__release__(ring.popleft())
+            if not ring:
+                del self._rings[key]
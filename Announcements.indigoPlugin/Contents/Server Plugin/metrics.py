@@ -0,0 +1,281 @@
+"""
+Plugin performance statistics
+
+Lightweight counters used to report plugin performance in the plugin diagnostics, and a registry of counters, gauges
+and histograms exported in the Prometheus text exposition format. The registry can be written atomically to a local
+textfile (for the node-exporter textfile collector) or served on a localhost-only socket.
+"""
+
+import bisect
+import math
+import os
+import tempfile
+import threading
+from typing import Callable
+
+
+class LatencyStats:
+    """Running count, mean, maximum and most recent value of a latency measured in seconds."""
+
+    def __init__(self):
+        """Statistics initialization."""
+        self.count   = 0
+        self.last    = 0.0
+        self.maximum = 0.0
+        self.total   = 0.0
+        self._lock   = threading.Lock()
+
+    # =============================================================================
+    def record(self, seconds: float) -> None:
+        """Add a measurement.
+
+        Args:
+            seconds (float): The measured latency in seconds.
+        """
+        with self._lock:
+            self.count   += 1
+            self.last     = seconds
+            self.maximum  = max(self.maximum, seconds)
+            self.total   += seconds
+
+    # =============================================================================
+    @property
+    def mean(self) -> float:
+        """Return the mean of all measurements, in seconds."""
+        return self.total / self.count if self.count else 0.0
+
+    # =============================================================================
+    def summary(self) -> str:
+        """Return a one-line summary of the measurements in milliseconds."""
+        return (
+            f"last {self.last * 1000:.1f} ms, mean {self.mean * 1000:.1f} ms, max {self.maximum * 1000:.1f} ms "
+            f"({self.count} samples)"
+        )
+
+
+class Metric:
+    """A counter or gauge. The value is kept here, or read from `function` when the metric is collected."""
+
+    def __init__(self, name: str, kind: str, description: str, function: Callable[[], float] = None):
+        """Metric initialization.
+
+        Args:
+            name (str): The metric name.
+            kind (str): `counter` or `gauge`.
+            description (str): The metric's HELP text.
+            function (Callable[[], float]): Returns the current value; the metric can't be changed directly.
+        """
+        self.description = description
+        self.function    = function
+        self.kind        = kind
+        self.name        = name
+        self._lock       = threading.Lock()
+        self._value      = 0.0
+
+    # =============================================================================
+    def inc(self, amount: float = 1) -> None:
+        """Add to the value."""
+        with self._lock:
+            self._value += amount
+
+    # =============================================================================
+    def set(self, value: float) -> None:
+        """Set the value."""
+        with self._lock:
+            self._value = value
+
+    # =============================================================================
+    @property
+    def value(self) -> float:
+        """Return the current value."""
+        return float(self.function()) if self.function else self._value
+
+    # =============================================================================
+    def samples(self) -> list:
+        """Return the `(name, value)` samples of the metric."""
+        return [(self.name, self.value)]
+
+
+class Histogram:
+    """A histogram of observed values with cumulative buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, buckets: tuple):
+        """Histogram initialization.
+
+        Args:
+            name (str): The metric name.
+            description (str): The metric's HELP text.
+            buckets (tuple): The bucket upper bounds, in increasing order.
+        """
+        self.buckets     = tuple(buckets)
+        self.description = description
+        self.name        = name
+        self._counts     = [0] * (len(self.buckets) + 1)
+        self._lock       = threading.Lock()
+        self._sum        = 0.0
+
+    # =============================================================================
+    def observe(self, value: float) -> None:
+        """Add an observation."""
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+
+    # =============================================================================
+    def samples(self) -> list:
+        """Return the `(name, value)` samples of the metric: cumulative buckets, then the sum and count."""
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        samples    = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            samples.append((f'{self.name}_bucket{{le="{_format_value(bound)}"}}', cumulative))
+        samples.append((f"{self.name}_sum", total))
+        samples.append((f"{self.name}_count", cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """The plugin's metrics, by name."""
+
+    def __init__(self, prefix: str):
+        """Registry initialization.
+
+        Args:
+            prefix (str): Prepended (with an underscore) to every metric name.
+        """
+        self.prefix   = prefix
+        self._metrics = {}
+
+    # =============================================================================
+    def counter(self, name: str, description: str, function: Callable[[], float] = None) -> Metric:
+        """Register a counter."""
+        return self.__register__(name, Metric(f"{self.prefix}_{name}", 'counter', description, function))
+
+    # =============================================================================
+    def gauge(self, name: str, description: str, function: Callable[[], float] = None) -> Metric:
+        """Register a gauge."""
+        return self.__register__(name, Metric(f"{self.prefix}_{name}", 'gauge', description, function))
+
+    # =============================================================================
+    def histogram(self, name: str, description: str, buckets: tuple) -> Histogram:
+        """Register a histogram."""
+        return self.__register__(name, Histogram(f"{self.prefix}_{name}", description, buckets))
+
+    # =============================================================================
+    def inc(self, name: str, amount: float = 1) -> None:
+        """Add to a counter or gauge."""
+        self._metrics[name].inc(amount)
+
+    # =============================================================================
+    def set(self, name: str, value: float) -> None:
+        """Set a gauge."""
+        self._metrics[name].set(value)
+
+    # =============================================================================
+    def observe(self, name: str, value: float) -> None:
+        """Add an observation to a histogram."""
+        self._metrics[name].observe(value)
+
+    # =============================================================================
+    def exposition(self) -> str:
+        """Return every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics text.
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                samples = metric.samples()
+            except Exception:  # noqa - a failing collector mustn't stop the others from being exported
+                continue
+            lines.extend(f"{name} {_format_value(value)}" for name, value in samples)
+        return "\n".join(lines) + "\n"
+
+    # =============================================================================
+    def write_textfile(self, path: str) -> int:
+        """Write the metrics to a file atomically, so a collector never reads a partly written file.
+
+        Args:
+            path (str): The metrics file. Its directory must exist.
+
+        Returns:
+            int: The number of bytes written.
+        """
+        data      = self.exposition().encode("utf-8")
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp  = tempfile.mkstemp(dir=directory, prefix=".metrics-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, mode='wb') as outfile:
+                outfile.write(data)
+            os.chmod(temp, 0o644)
+            os.replace(temp, path)
+        except OSError:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        return len(data)
+
+    # =============================================================================
+    def __register__(self, name: str, metric):
+        self._metrics[name] = metric
+        return metric
+
+
+class MetricsServer:
+    """Serves a registry's metrics over HTTP on localhost only."""
+
+    def __init__(self, registry: MetricsRegistry, port: int):
+        """Start serving.
+
+        Args:
+            registry (MetricsRegistry): The metrics to serve.
+            port (int): The TCP port, on 127.0.0.1.
+
+        Raises:
+            OSError: If the port can't be bound.
+        """
+        import http.server  # noqa - only needed when the metrics socket is turned on
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):  # noqa
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.exposition().encode("utf-8")
+                self.send_response(200)
+                self.send_header('Content-Type', "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):  # noqa - requests aren't logged
+                pass
+
+        self.port    = port
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True).start()
+
+    # =============================================================================
+    def stop(self) -> None:
+        """Stop serving and release the port."""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# =============================================================================
+def _format_value(value: float) -> str:
+    """Format a sample value or bucket bound as Prometheus expects."""
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return f"{int(value)}"
+    return f"{value:.6g}"
+
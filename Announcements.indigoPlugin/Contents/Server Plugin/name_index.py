@@ -0,0 +1,53 @@
+"""
+Sorted name index
+
+Items (devices, variables, announcements) are kept sorted by name, case-insensitively, so dialog lists can be served
+in order without sorting and filtered with a binary search for prefix matches followed by a scan of the pre-lowercased
+names for substring matches.
+"""
+
+import bisect
+
+
+class NameIndex:
+    """Names kept sorted case-insensitively, with their IDs."""
+
+    def __init__(self):
+        """Index initialization."""
+        self.keys  = []  # (lowercase name, id), sorted
+        self.names = {}  # id: name
+
+    # =============================================================================
+    def add(self, item_id: int, name: str) -> None:
+        """Add or rename an item."""
+        self.remove(item_id)
+        self.names[item_id] = name
+        bisect.insort(self.keys, (name.lower(), item_id))
+
+    # =============================================================================
+    def remove(self, item_id: int) -> None:
+        """Remove an item, if present."""
+        name = self.names.pop(item_id, None)
+        if name is not None:
+            index = bisect.bisect_left(self.keys, (name.lower(), item_id))
+            del self.keys[index]
+
+    # =============================================================================
+    def search(self, fltr: str = "") -> list:
+        """Return `(id, name)` tuples matching a filter: prefix matches first, then other substring matches.
+
+        Args:
+            fltr (str): The case-insensitive filter. An empty filter matches everything.
+
+        Returns:
+            list: The matching items, each group sorted by name.
+        """
+        fltr = fltr.lower()
+        if not fltr:
+            return [(item_id, self.names[item_id]) for _, item_id in self.keys]
+
+        start  = bisect.bisect_left(self.keys, (fltr,))
+        stop   = bisect.bisect_left(self.keys, (fltr + '\uffff',))
+        prefix = self.keys[start:stop]
+        others = [key for key in self.keys[:start] + self.keys[stop:] if fltr in key[0]]
+        return [(item_id, self.names[item_id]) for _, item_id in prefix + others]
@@ -0,0 +1,105 @@
+"""
+Adaptive refresh pacing
+
+The concurrent thread normally starts a refresh pass whenever an announcement comes due. When the Indigo server is
+slow, back-to-back passes only add to its load, so the pacing controller tracks the latency of server round trips
+(`updateStatesOnServer()` and reference lookups) and the duration of each pass as moving averages. If either is over its
+target, the controller stretches: each pass is followed by a rest of `stretch - 1` times the average pass duration
+(so passes use at most `1 / stretch` of the time), and each pass refreshes at most `1 / stretch` of the announcements
+due, oldest first; the rest are carried over. Once the server is responsive again, the stretch relaxes back to 1.
+"""
+
+import math
+import threading
+
+# The weight of the newest sample in the moving averages.
+SMOOTHING = 0.3
+
+# The stretch grows by this factor after each pass under load, and shrinks by RELAX after each idle pass.
+GROWTH = 1.5
+RELAX  = 0.8
+
+# The shortest rest between passes, in seconds.
+MIN_GAP = 0.05
+
+
+class TickController:
+    """Stretches the time between refresh passes, and sheds work, while the Indigo server is slow."""
+
+    def __init__(self, target_latency: float, max_gap: float, enabled: bool = True):
+        """Controller initialization.
+
+        Args:
+            target_latency (float): Server round trips slower than this (seconds, on average) mean the server is
+                under load.
+            max_gap (float): The longest rest between passes, in seconds.
+            enabled (bool): When False, passes are never stretched.
+        """
+        self.enabled        = enabled
+        self.max_gap        = max_gap
+        self.overruns       = 0
+        self.pass_seconds   = 0.0
+        self.server_latency = 0.0
+        self.stretch        = 1.0
+        self.target_latency = target_latency
+        self._lock          = threading.Lock()
+
+    # =============================================================================
+    def observe(self, seconds: float) -> None:
+        """Add the duration of a server round trip. May be called from any thread."""
+        with self._lock:
+            self.server_latency += SMOOTHING * (seconds - self.server_latency)
+
+    # =============================================================================
+    def end_pass(self, seconds: float, limit: float) -> bool:
+        """Add the duration of a refresh pass and adjust the stretch.
+
+        Args:
+            seconds (float): How long the pass took.
+            limit (float): How long a pass may take (the time budget or refresh interval), in seconds.
+
+        Returns:
+            bool: True if the pass overran the limit.
+        """
+        overran = seconds > limit > 0
+        with self._lock:
+            self.pass_seconds += SMOOTHING * (seconds - self.pass_seconds)
+            if overran:
+                self.overruns += 1
+            pressure = max(
+                self.server_latency / self.target_latency if self.target_latency > 0 else 0.0,
+                self.pass_seconds / limit if limit > 0 else 0.0,
+            )
+            if not self.enabled:
+                self.stretch = 1.0
+            elif pressure > 1:
+                self.stretch = min(self.stretch * GROWTH, self.max_stretch)
+            elif pressure < 0.5:
+                self.stretch = max(self.stretch * RELAX, 1.0)
+        return overran
+
+    # =============================================================================
+    @property
+    def max_stretch(self) -> float:
+        """Return the stretch at which the rest between passes reaches the maximum gap."""
+        return max(1.0, 1.0 + self.max_gap / max(self.pass_seconds, MIN_GAP))
+
+    # =============================================================================
+    @property
+    def gap(self) -> float:
+        """Return the minimum rest before the next pass, in seconds."""
+        return min(max((self.stretch - 1.0) * self.pass_seconds, MIN_GAP), max(self.max_gap, MIN_GAP))
+
+    # =============================================================================
+    def work_limit(self, due: int) -> int:
+        """Return how many of the due announcements the next pass should refresh.
+
+        Args:
+            due (int): The number of announcements due.
+
+        Returns:
+            int: All of them, unless the server is under load.
+        """
+        if self.stretch <= 1.0 or not due:
+            return due
+        return max(1, math.ceil(due / self.stretch))
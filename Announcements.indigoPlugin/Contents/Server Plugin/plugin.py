@@ -12,26 +12,47 @@ more geared towards creating announcements to be used with more advanced speech
 # ================================== IMPORTS ==================================
 
 # Built-in modules
-import ast
+import collections
+import concurrent.futures
 import datetime as dt
 import json
 import logging
+import math
+import multiprocessing
 import os
 import re
-import shutil
 import string
+import threading
+import time
 
 # Third-party modules
 try:
     import indigo  # noqa
-    from dateutil import parser  # noqa
 except ImportError:
     pass
 
 # My modules
 import DLFramework.DLFramework as Dave
-from constants import ANNOUNCEMENT_DIALOG_FIELDS, ANNOUNCEMENT_DIALOG_OPEN_FIELDS, DEBUG_LABELS  # noqa
+import formatting  # noqa
+from catalog import Catalog  # noqa
+from constants import (  # noqa
+    ANNOUNCEMENT_DIALOG_FIELDS, ANNOUNCEMENT_DIALOG_OPEN_FIELDS, ANNOUNCEMENT_LIST_LIMIT, BACKLOG_SLICE_INTERVAL,
+    CATCH_UP_LIMIT, DEBUG_LABELS, ERROR_LOG_INTERVAL, HISTORY_ENTRIES, HISTORY_FILE, HISTORY_MAX_BYTES,
+    HISTORY_SPILL_INTERVAL, METRICS_INTERVAL, NUMERIC_PREFS, RECORDING_FILE, RECORDING_LIMIT, RENDER_CACHE_SIZE,
+    STARTUP_TARGET, TICK_SECONDS_BUCKETS
+)
+from history import RenderHistory  # noqa
+from metrics import LatencyStats, MetricsRegistry, MetricsServer  # noqa
+from pacing import TickController  # noqa
 from plugin_defaults import kDefaultPluginPrefs  # noqa
+from recording import RenderRecorder  # noqa
+from render_cache import RenderCache  # noqa
+from scheduling import leveled_refresh_time, salutation_boundaries, salutation_period  # noqa
+from speech import DROP_POLICIES, PRIORITIES, SpeechQueue  # noqa
+from store import AnnouncementStore, thaw  # noqa
+from templates import CompiledTemplate, compile_template, substitute_values  # noqa
+from tick_log import THREADDEBUG, RateLimitedLog  # noqa
+from triggers import ANNOUNCEMENT_CHANGED, RENDER_FAILED, SALUTATION_CHANGED, TriggerIndex  # noqa
 
 # =================================== HEADER ==================================
 __author__    = Dave.__author__
@@ -39,23 +60,59 @@ __copyright__ = Dave.__copyright__
 __license__   = Dave.__license__
 __build__     = Dave.__build__
 __title__     = 'Announcements Plugin for Indigo Home Control'
-__version__   = '2025.2.7'
+__version__   = '2025.3.0'
 
 
 # =============================================================================
-def _validate_format_spec(spec: str, allowlist: str) -> None:
-    """Raise ValueError if any character in spec is not in allowlist.
+def _refresh_deadline(announcement: dict) -> dt.datetime:
+    """Return the time an announcement is next due to be refreshed.
 
     Args:
-        spec (str): The format specifier string to validate.
-        allowlist (str): String of allowable characters.
+        announcement (dict): The announcement's stored data.
+
+    Returns:
+        dt.datetime: The scheduled refresh time.
 
     Raises:
-        ValueError: If spec contains a character not in allowlist.
+        ValueError: If the stored refresh time can't be parsed.
     """
-    for char in spec:
-        if char not in allowlist:
-            raise ValueError
+    refresh_time = announcement.get('nextRefresh', '1970-01-01 00:00:00')
+    try:
+        return dt.datetime.fromisoformat(refresh_time)
+    except ValueError:
+        from dateutil import parser  # noqa - only needed for timestamps that aren't ISO format
+        return parser.parse(refresh_time)
+
+
+# =============================================================================
+def _refresh_interval(announcement: dict) -> float:
+    """Return an announcement's refresh interval in seconds.
+
+    Announcements saved before intervals were entered in seconds store their interval in minutes under `Refresh`.
+
+    Args:
+        announcement (dict): The announcement's stored data.
+
+    Returns:
+        float: The refresh interval in seconds.
+    """
+    if 'RefreshSeconds' in announcement:
+        return float(announcement['RefreshSeconds'])
+    return float(announcement['Refresh']) * 60
+
+
+# =============================================================================
+def _quarantine_message(missing: tuple) -> str:
+    """Return the device state shown in place of an announcement that references missing devices or variables.
+
+    Args:
+        missing (tuple): The missing `('d', dev_id)` and `('v', var_id)` references.
+
+    Returns:
+        str: The message.
+    """
+    names = ", ".join(f"{'device' if kind == 'd' else 'variable'} {target_id}" for kind, target_id in missing)
+    return f"Unavailable: {names} no longer exist{'s' if len(missing) == 1 else ''}."
 
 
 # =============================================================================
@@ -76,14 +133,58 @@ class Plugin(indigo.PluginBase):
 
         # ============================ Instance Attributes ============================
         self.announcements_file   = ""
+        self.catalog              = Catalog()
         self.debug_level          = int(self.pluginPrefs.get('showDebugLevel', "30"))
+        self.dependency_index     = {}
+        self.forced_refresh       = set()
+        self.format_pool          = None
+        self.history              = RenderHistory(max_entries=HISTORY_ENTRIES, max_bytes=HISTORY_MAX_BYTES)
+        self.history_spilled      = time.monotonic()
+        self.metrics              = MetricsRegistry(prefix="announcements")
+        self.metrics_server       = None
+        self.metrics_written      = 0.0
+        self.next_refresh_due     = None
+        self.pacing               = TickController(
+            target_latency=float(self.pluginPrefs.get('serverLatencyTarget', 250)) / 1000,
+            max_gap=float(self.pluginPrefs.get('tickMaxGap', 60)),
+            enabled=bool(self.pluginPrefs.get('adaptiveTick', True)),
+        )
         self.pluginIsInitializing = True
         self.pluginIsShuttingDown = False
+        self.prewarm_seconds      = 0.0
+        self.quarantine           = {}
+        self.recorder             = None
+        self.refresh_backlog      = 0
+        self.refresh_lock         = threading.RLock()
+        self.render_cache         = RenderCache(max_entries=RENDER_CACHE_SIZE)
+        self.render_errors        = RateLimitedLog(self.logger, interval=ERROR_LOG_INTERVAL)
+        self.salutation_schedule  = {}
+        self.speak_latency        = LatencyStats()
+        self.startup_seconds      = 0.0
+        self.store                = AnnouncementStore(
+            load=self.__announcement_file_read__, save=self.__announcement_file_write__
+        )
+        self.template_index       = {}
+        self.tick_histogram       = collections.Counter()
+        self.tick_stats           = {
+            'backlog': 0, 'max_backlog': 0, 'lateness': 0.0, 'max_lateness': 0.0, 'renders': 0, 'shared': 0
+        }
+        self.triggers             = TriggerIndex()
         self.update_frequency     = int(self.pluginPrefs.get('pluginRefresh', 15))
+        self.speech_queue         = SpeechQueue(
+            sink=self.__speak__,
+            max_depth=int(self.pluginPrefs.get('speechQueueDepth', 10)),
+            drop_policy=self.pluginPrefs.get('speechDropPolicy', 'lowest'),
+            gap=float(self.pluginPrefs.get('speechGap', 0)),
+            logger=self.logger,
+        )
+
+        self.__register_metrics__()
 
         # ================================== Logging ==================================
         self.plugin_file_handler.setFormatter(logging.Formatter(fmt=Dave.LOG_FORMAT, datefmt='%Y-%m-%d %H:%M:%S'))
         self.indigo_log_handler.setLevel(self.debug_level)
+        self.__apply_trace_logging__()
 
         # ========================== Initialize DLFramework ===========================
         self.Fogbert = Dave.Fogbert(self)
@@ -111,6 +212,8 @@ class Plugin(indigo.PluginBase):
             dev_id (int): The device ID.
         """
         if not user_cancelled:
+            # The salutation boundaries may have changed; they're recomputed on the next update.
+            self.salutation_schedule.pop(dev_id, None)
             self.announcement_update_states(force=True)
             self.logger.debug("closed_device_config_ui()")
         else:
@@ -135,10 +238,21 @@ class Plugin(indigo.PluginBase):
             # Debug Logging
             self.debug_level = int(values_dict.get('showDebugLevel', 30))
             self.indigo_log_handler.setLevel(self.debug_level)
+            self.__apply_trace_logging__()
             indigo.server.log(f"Logging level: {DEBUG_LABELS[self.debug_level]} ({self.debug_level})")
 
             # Plugin-specific actions
-            self.update_frequency = int(values_dict.get('pluginRefresh', 15))
+            self.update_frequency         = int(values_dict.get('pluginRefresh', 15))
+            self.speech_queue.max_depth   = int(values_dict.get('speechQueueDepth', 10))
+            if values_dict.get('speechDropPolicy', 'lowest') in DROP_POLICIES:
+                self.speech_queue.drop_policy = values_dict.get('speechDropPolicy', 'lowest')
+            self.speech_queue.gap         = float(values_dict.get('speechGap', 0))
+            self.pacing.target_latency    = float(values_dict.get('serverLatencyTarget', 250)) / 1000
+            self.pacing.max_gap           = float(values_dict.get('tickMaxGap', 60))
+            self.pacing.enabled           = bool(values_dict.get('adaptiveTick', True))
+            self.__stop_format_pool__()  # restarted with the new size when next needed
+            self.__configure_recorder__()
+            self.__configure_metrics_server__()
 
             # Update the devices to reflect any changes
             self.announcement_update_states()
@@ -151,25 +265,125 @@ class Plugin(indigo.PluginBase):
 
     # =============================================================================
     @staticmethod
-    def device_start_comm(dev: indigo.Device) -> None:  # noqa
+    def validate_prefs_config_ui(values_dict: indigo.Dict=None) -> tuple:  # noqa
+        """Standard Indigo method called before the plugin preferences dialog is closed.
+
+        The numeric prefs are read on every refresh pass, so an empty, non-numeric or out of range entry is rejected
+        here rather than failing each pass.
+
+        Args:
+            values_dict (indigo.Dict): The dialog's current values.
+
+        Returns:
+            tuple[bool, indigo.Dict]: Validation result and the values dict.
+        """
+        error_msg_dict = indigo.Dict()
+
+        for field, (kind, minimum, maximum) in NUMERIC_PREFS.items():
+            if field not in values_dict:
+                continue
+            number = "a whole number" if kind is int else "a number"
+            try:
+                value = kind(values_dict[field])
+            except (TypeError, ValueError):
+                error_msg_dict[field] = f"Enter {number}."
+                continue
+            if not math.isfinite(value) or value < minimum or (maximum is not None and value > maximum):
+                error_msg_dict[field] = (
+                    f"Enter {number} from {minimum} to {maximum}." if maximum is not None
+                    else f"Enter {number} of {minimum} or more."
+                )
+
+        if values_dict.get('speechDropPolicy', 'lowest') not in DROP_POLICIES:
+            error_msg_dict['speechDropPolicy'] = "Select a drop policy."
+
+        if len(error_msg_dict) > 0:
+            return False, values_dict, error_msg_dict
+        return True, values_dict
+
+    # =============================================================================
+    def device_created(self, dev: indigo.Device) -> None:  # noqa
+        """Standard Indigo method called when a device is created.
+
+        The base implementation runs first. Announcements quarantined because they reference the device are re-armed.
+
+        Args:
+            dev (indigo.Device): The Indigo device object.
+        """
+        indigo.PluginBase.device_created(self, dev)
+        self.catalog.update_device(dev)
+        self.__rearm_dependents__(('d', dev.id))
+
+    # =============================================================================
+    def device_deleted(self, dev: indigo.Device) -> None:  # noqa
+        """Standard Indigo method called when a device is deleted.
+
+        The plugin subscribes to device changes, so this is called for every device. The base implementation runs
+        first (it stops comm for the plugin's own devices). The announcements of a deleted plugin device are removed
+        straight away rather than at the next plugin startup, and announcements that reference the device are
+        quarantined.
+
+        Args:
+            dev (indigo.Device): The Indigo device object.
+        """
+        indigo.PluginBase.device_deleted(self, dev)
+        self.catalog.remove_device(dev.id)
+        self.__quarantine_dependents__(('d', dev.id))
+        self.salutation_schedule.pop(dev.id, None)
+        self.history.remove(dev.id)
+
+        if dev.id in self.store.snapshot().data:
+            # Wait for a running refresh pass, which may be using the device's forced refreshes.
+            with self.refresh_lock:
+                removed = self.store.mutate(lambda announcements: announcements.pop(dev.id, None)) or {}
+                for key, announcement in removed.items():
+                    self.__reindex_announcement__(dev.id, key, announcement, None)
+                self.forced_refresh.difference_update(
+                    [item for item in self.forced_refresh.copy() if item[0] == dev.id]
+                )
+            self.logger.debug("Removed the announcements of deleted device %s.", dev.name)
+
+    # =============================================================================
+    def device_start_comm(self, dev: indigo.Device) -> None:  # noqa
         """Standard Indigo method called when device comm is enabled.
 
+        Salutations devices are brought up to date straight away, so a plugin restart in the middle of a period
+        doesn't have to wait for the next boundary.
+
         Args:
             dev (indigo.Device): The Indigo device object.
         """
         dev.stateListOrDisplayStateIdChanged()
         dev.updateStateOnServer('onOffState', value=True, uiValue=" ")
 
+        if dev.deviceTypeId == 'salutationsDevice':
+            self.salutation_schedule.pop(dev.id, None)
+            self.__update_salutations_device__(dev)
+
     # =============================================================================
-    @staticmethod
-    def device_stop_comm(dev: indigo.Device) -> None:  # noqa
+    def device_stop_comm(self, dev: indigo.Device) -> None:  # noqa
         """Standard Indigo method called when device comm is disabled.
 
         Args:
             dev (indigo.Device): The Indigo device object.
         """
+        self.salutation_schedule.pop(dev.id, None)
         dev.updateStateOnServer('onOffState', value=False, uiValue=" ")
 
+    # =============================================================================
+    def device_updated(self, orig_dev: indigo.Device, new_dev: indigo.Device) -> None:  # noqa
+        """Standard Indigo method called when a device is changed.
+
+        The plugin subscribes to device changes, so this is called for every device. The base implementation runs
+        first (it restarts comm for the plugin's own devices when their props change).
+
+        Args:
+            orig_dev (indigo.Device): The device before the change.
+            new_dev (indigo.Device): The device after the change.
+        """
+        indigo.PluginBase.device_updated(self, orig_dev, new_dev)
+        self.catalog.update_device(new_dev)
+
     # =============================================================================
     @staticmethod
     def get_device_config_ui_values(values_dict: indigo.Dict=None, type_id: str="", dev_id: int=0) -> indigo.Dict:  # noqa
@@ -210,8 +424,8 @@ class Plugin(indigo.PluginBase):
 
         default_states_list = self.devicesTypeDict[dev.deviceTypeId]['States']
 
-        # Open the announcements file and load the contents
-        local_vars['announcements'] = self.__announcement_file_read__()
+        # Take the current announcements snapshot.
+        local_vars['announcements'] = self.store.snapshot().data
 
         # Sort the dict and create a list of tuples.
         try:
@@ -238,23 +452,173 @@ class Plugin(indigo.PluginBase):
             while True:
                 self.update_frequency = int(self.pluginPrefs.get('pluginRefresh', 15))
                 self.announcement_update_states()
-                self.sleep(self.update_frequency)
+                self.__export_metrics__()
+                self.__spill_history__()
+                self.sleep(self.__seconds_until_next_wakeup__())
         except self.StopThread:
             pass
 
+    # =============================================================================
+    def shutdown(self) -> None:
+        """Standard Indigo shutdown method."""
+        self.pluginIsShuttingDown = True
+        self.speech_queue.stop()
+        self.__stop_format_pool__()
+        self.__configure_recorder__()
+        self.__configure_metrics_server__()
+        self.__export_metrics__(force=True)
+        self.__spill_history__(force=True)
+
     # =============================================================================
     def startup(self) -> None:
-        """Standard Indigo startup method."""
+        """Standard Indigo startup method.
+
+        Only the work needed before the plugin can respond is done here. The announcements audit runs on a background
+        thread once startup is complete.
+        """
+        started = time.monotonic()
+        self.speech_queue.start()
 
-        # ============================ Audit Announcements ============================
+        # ============================ Load Announcements =============================
         path_string             = "/Preferences/Plugins/com.fogbert.indigoplugin.announcements.txt"
         self.announcements_file = f"{indigo.server.getInstallFolderPath()}{path_string}"
         self.initialize_announcements_file()
+        self.store.load()
+        self.__configure_recorder__()
+        self.__configure_metrics_server__()
+
+        # Device and variable changes keep the substitution generator catalog up to date, and deletions are used to
+        # prune the announcements and the dependency index.
+        indigo.devices.subscribeToChanges()
+        indigo.variables.subscribeToChanges()
 
         # ===================== Delete Out of Date Announcements =====================
-        # Open the announcements file and load the contents
-        infile = self.__announcement_file_read__()
+        threading.Thread(target=self.__startup_audit__, name="StartupAudit", daemon=True).start()
+
+        # ========================== Prewarm Announcements ===========================
+        threading.Thread(target=self.__prewarm__, name="Prewarm", daemon=True).start()
+
+        self.startup_seconds = time.monotonic() - started
+        self.logger.debug("Startup completed in %.0f ms.", self.startup_seconds * 1000)
+
+    # =============================================================================
+    def __startup_audit__(self) -> None:
+        """Audit the announcements database in the background after startup.
+
+        Removes the announcements of deleted devices and adds placeholders for new ones. Saving the result also
+        persists any migration applied when the file was loaded (legacy format, refresh intervals in minutes). The
+        template and dependency indexes are rebuilt without the removed announcements.
+        """
+        try:
+            self.store.mutate(self.__audit_announcements__)
+            announcements         = self.store.snapshot().data
+            self.template_index   = Plugin.__index_templates__(announcements)
+            self.dependency_index = Plugin.__index_dependencies__(announcements)
+        except Exception:  # noqa - the plugin keeps running with the database as loaded
+            self.logger.warning("Unable to audit the announcements database.")
+            self.logger.debug("Error: ", exc_info=True)
+
+    # =============================================================================
+    def __prewarm__(self) -> None:
+        """Render every announcement and push the device states in the background after startup.
+
+        All templates are compiled first. Devices are then rendered and updated one at a time, starting with the
+        priority devices selected in the plugin prefs, and each referenced Indigo device is fetched only once for the
+        whole prewarm.
 
+        The next refresh of each prewarmed announcement is scheduled as if a refresh pass had rendered it, so the first
+        pass doesn't render everything again. The new refresh times are saved once the priority devices are done and
+        again at the end; announcements deleted or rescheduled meanwhile (e.g., by the startup audit or a pass) are
+        left alone.
+        """
+        started       = time.monotonic()
+        announcements = self.store.snapshot().data
+        priority      = [int(dev_id) for dev_id in self.pluginPrefs.get('prewarmDevices', [])]
+        devices       = sorted(
+            [dev for dev in indigo.devices.iter('self') if dev.enabled and dev.deviceTypeId == 'announcementsDevice'],
+            key=lambda dev: (priority.index(dev.id) if dev.id in priority else len(priority), dev.name.lower())
+        )
+        first     = sum(1 for dev in devices if dev.id in priority)
+        total     = sum(len(announcements.get(dev.id, {})) for dev in devices)
+        resolved  = {}
+        pending   = {}
+        tolerance = float(self.pluginPrefs.get('refreshTolerance', 50)) / 100
+
+        def advance(current: dict) -> None:
+            for (dev_id, key), (previous, next_refresh) in pending.items():
+                announcement = current.get(dev_id, {}).get(key)
+                if announcement is not None and announcement.get('nextRefresh') == previous:
+                    announcement['nextRefresh'] = next_refresh
+
+        self.__load_history__()
+
+        for dev in devices:
+            for announcement in announcements.get(dev.id, {}).values():
+                compile_template(announcement['Announcement'])
+
+        self.logger.info("Prewarming %s announcements on %s devices.", total, len(devices))
+
+        for count, dev in enumerate(devices, 1):
+            try:
+                rendering  = time.perf_counter()
+                quarantine = self.quarantine
+                live       = {
+                    key: announcement for key, announcement in announcements.get(dev.id, {}).items()
+                    if (dev.id, key) not in quarantine
+                }
+                rendered = self.__prerender_announcements__(
+                    [announcement['Announcement'] for announcement in live.values()], resolved
+                )
+                rendered_at = time.time()
+                ms          = (time.perf_counter() - rendering) * 1000 / max(len(live), 1)
+                for key, announcement in live.items():
+                    self.history.record((dev.id, key), rendered_at, rendered[announcement['Announcement']], ms)
+
+                # Quarantined announcements show what's missing instead of being rendered.
+                states = [
+                    {
+                        'key': announcement['Name'].replace(' ', '_'),
+                        'value': rendered[announcement['Announcement']] if key in live
+                        else _quarantine_message(quarantine[(dev.id, key)])
+                    }
+                    for key, announcement in announcements.get(dev.id, {}).items()
+                ]
+                states.append({'key': 'onOffState', 'value': True, 'uiValue': " "})
+                pushed = time.perf_counter()
+                dev.updateStatesOnServer(states)
+                self.pacing.observe(time.perf_counter() - pushed)
+                self.metrics.inc('state_updates_total')
+                self.metrics.inc('states_sent_total', len(states))
+
+                for key, announcement in live.items():
+                    interval    = _refresh_interval(announcement)
+                    next_update = leveled_refresh_time(rendered_at, interval, f"{dev.id}:{key}", interval * tolerance)
+                    pending[(dev.id, key)] = (
+                        announcement.get('nextRefresh'), dt.datetime.fromtimestamp(next_update).isoformat(sep=' ')
+                    )
+            except Exception:  # noqa - one device's failure mustn't stop the prewarm
+                self.logger.warning("Unable to prewarm %s.", dev.name)
+                self.logger.debug("Error: ", exc_info=True)
+
+            self.logger.debug("Prewarmed %s (%s of %s devices).", dev.name, count, len(devices))
+            if (first and count == first) or count == len(devices):
+                if pending:
+                    self.store.mutate(advance)
+                    pending.clear()
+            if first and count == first:
+                self.logger.info("Priority devices prewarmed in %.1f s.", time.monotonic() - started)
+
+        self.prewarm_seconds = time.monotonic() - started
+        self.logger.info("Prewarm complete in %.1f s.", self.prewarm_seconds)
+
+    # =============================================================================
+    @staticmethod
+    def __audit_announcements__(infile: dict) -> None:
+        """Drop announcements of deleted devices and add placeholders for new ones.
+
+        Args:
+            infile (dict): The mutable announcements data; changed in place.
+        """
         # Look at each plugin device id and delete any announcements if there is no longer an associated device.
         del_keys = [key for key in infile if key not in indigo.devices]
 
@@ -266,8 +630,31 @@ class Plugin(indigo.PluginBase):
             if dev.id not in infile:
                 infile[dev.id] = {}
 
-        # Open the announcements file and save the new dict.
-        self.__announcement_file_write__(infile)
+    # =============================================================================
+    def trigger_start_processing(self, trigger: indigo.Trigger) -> None:  # noqa
+        """Standard Indigo method called when a plugin trigger is enabled (or the plugin starts).
+
+        Args:
+            trigger (indigo.Trigger): The Indigo trigger object.
+        """
+        props = trigger.pluginProps
+        try:
+            dev_id = int(props.get('announcementDeviceToRefresh', 0))
+        except ValueError:
+            self.logger.warning("Trigger %s has no device selected.", trigger.name)
+            return
+
+        state = None if props.get('anyAnnouncement', False) else props.get('announcementToSpeak')
+        self.triggers.add(trigger.id, trigger.pluginTypeId, dev_id, state)
+
+    # =============================================================================
+    def trigger_stop_processing(self, trigger: indigo.Trigger) -> None:  # noqa
+        """Standard Indigo method called when a plugin trigger is disabled (or the plugin stops).
+
+        Args:
+            trigger (indigo.Trigger): The Indigo trigger object.
+        """
+        self.triggers.remove(trigger.id)
 
     # =============================================================================
     def validate_device_config_ui(self, values_dict: indigo.Dict=None, type_id: str="salutationsDevice", dev_id: int=0) -> tuple:  # noqa
@@ -319,6 +706,66 @@ class Plugin(indigo.PluginBase):
         self.announcement_update_states()
         return (True, values_dict)
 
+    # =============================================================================
+    @staticmethod
+    def validate_event_config_ui(values_dict: indigo.Dict=None, type_id: str="", event_id: int=0) -> tuple:  # noqa
+        """Standard Indigo method called before the trigger config dialog is closed.
+
+        Args:
+            values_dict (indigo.Dict): The dialog's current values.
+            type_id (str): The event type identifier.
+            event_id (int): The trigger ID.
+
+        Returns:
+            tuple[bool, indigo.Dict]: Validation result and the values dict.
+        """
+        error_msg_dict = indigo.Dict()
+
+        if not values_dict.get('announcementDeviceToRefresh'):
+            error_msg_dict['announcementDeviceToRefresh'] = "Select a device."
+
+        if type_id != SALUTATION_CHANGED and not values_dict.get('anyAnnouncement', False) \
+                and not values_dict.get('announcementToSpeak'):
+            error_msg_dict['announcementToSpeak'] = "Select an announcement."
+
+        if len(error_msg_dict) > 0:
+            return False, values_dict, error_msg_dict
+        return True, values_dict
+
+    # =============================================================================
+    def variable_created(self, var: indigo.Variable) -> None:  # noqa
+        """Standard Indigo method called when a variable is created.
+
+        Announcements quarantined because they reference the variable are re-armed.
+
+        Args:
+            var (indigo.Variable): The Indigo variable object.
+        """
+        self.catalog.update_variable(var)
+        self.__rearm_dependents__(('v', var.id))
+
+    # =============================================================================
+    def variable_deleted(self, var: indigo.Variable) -> None:  # noqa
+        """Standard Indigo method called when a variable is deleted.
+
+        Announcements that reference the variable are quarantined.
+
+        Args:
+            var (indigo.Variable): The Indigo variable object.
+        """
+        self.catalog.remove_variable(var.id)
+        self.__quarantine_dependents__(('v', var.id))
+
+    # =============================================================================
+    def variable_updated(self, orig_var: indigo.Variable, new_var: indigo.Variable) -> None:  # noqa
+        """Standard Indigo method called when a variable is changed.
+
+        Args:
+            orig_var (indigo.Variable): The variable before the change.
+            new_var (indigo.Variable): The variable after the change.
+        """
+        self.catalog.update_variable(new_var)
+
     # =============================================================================
     # ============================== Plugin Methods ===============================
     # =============================================================================
@@ -397,14 +844,11 @@ class Plugin(indigo.PluginBase):
         if not values_dict.get('announcementList'):
             return values_dict
 
-        # Open the announcements file and load the contents
-        announcements = self.__announcement_file_read__()
-
-        index = int(values_dict['announcementList'])
-        del announcements[dev_id][index]
-
-        # Open the announcements file and save the new dict.
-        self.__announcement_file_write__(announcements)
+        # Remove the announcement from the store (which saves the file).
+        index   = int(values_dict['announcementList'])
+        removed = self.store.mutate(lambda announcements: announcements[dev_id].pop(index, None))
+        self.__reindex_announcement__(dev_id, index, removed, None)
+        self.history.remove(dev_id, index)
 
         return self.__clear_announcement_fields__(values_dict)
 
@@ -428,23 +872,17 @@ class Plugin(indigo.PluginBase):
         index = int(values_dict['announcementList'])
         self.logger.info("Announcement to be duplicated: %s", index)
 
-        # Open the announcements file and load the contents
-        announcements = self.__announcement_file_read__()
-
-        # Create a new announcement.
-        temp_dict                            = announcements[dev_id]
-        new_index                            = self.announcement_create_id(temp_dict)
-        temp_dict[new_index]                 = {}
-        temp_dict[new_index]['Name']         = announcements[dev_id][index]['Name'] + " copy"
-        temp_dict[new_index]['Announcement'] = announcements[dev_id][index]['Announcement']
-        temp_dict[new_index]['Refresh']      = announcements[dev_id][index]['Refresh']
-        temp_dict[new_index]['nextRefresh']  = announcements[dev_id][index]['nextRefresh']
+        def duplicate(announcements: dict) -> tuple:
+            # Create a new announcement.
+            temp_dict                    = announcements[dev_id]
+            new_index                    = self.announcement_create_id(temp_dict)
+            temp_dict[new_index]         = dict(announcements[dev_id][index])
+            temp_dict[new_index]['Name'] = announcements[dev_id][index]['Name'] + " copy"
+            return new_index, dict(temp_dict[new_index])
 
-        # Set the dict element equal to the new list
-        announcements[dev_id] = temp_dict
-
-        # Open the announcements file and save the new dict.
-        self.__announcement_file_write__(announcements)
+        # Apply the change to the store (which saves the file).
+        new_index, copy = self.store.mutate(duplicate)
+        self.__reindex_announcement__(dev_id, new_index, None, copy)
 
         return values_dict
 
@@ -467,15 +905,15 @@ class Plugin(indigo.PluginBase):
 
         self.logger.debug("Editing the %s announcement", values_dict['announcementName'])
 
-        # Open the announcements file and load the contents
-        announcements = self.__announcement_file_read__()
-        temp_dict     = announcements[dev_id]
+        # Take the current announcements snapshot.
+        temp_dict = self.store.snapshot().data[dev_id]
 
         # Get the selected announcement index and populate the UI elements.
         index                              = int(values_dict['announcementList'])
         values_dict['announcementIndex']   = index
         values_dict['announcementName']    = temp_dict[index]['Name']
-        values_dict['announcementRefresh'] = temp_dict[index]['Refresh']
+        values_dict['announcementRefresh'] = f"{_refresh_interval(temp_dict[index]):.0f}"
+        values_dict['announcementCatchUp'] = temp_dict[index].get('CatchUp', 'once')
         values_dict['announcementText']    = temp_dict[index]['Announcement']
         values_dict['editFlag']            = True
 
@@ -494,24 +932,37 @@ class Plugin(indigo.PluginBase):
             try:
                 d = json.loads(d)  # yields dict
 
-            # source is not JSON
+            # source is not JSON. The file is saved as JSON by the startup audit.
             except json.decoder.JSONDecodeError:
+                import ast  # noqa - only needed for legacy databases
                 self.logger.debug("Converting announcements database to JSON")
                 d = ast.literal_eval(node_or_string=d)  # yields dict
 
-                with open(self.announcements_file, 'w', encoding="utf-8") as outfile:
-                    json.dump(d, outfile, ensure_ascii=False, indent=4)
-
         # Convert the string keys to int keys at both levels (JSON always serializes keys as strings)
-        return {
+        announcements = {
             int(outer_key): {int(inner_key): inner_val for inner_key, inner_val in outer_val.items()}
             for outer_key, outer_val in d.items()
         }
 
+        # Refresh intervals used to be stored in minutes. The migrated value is saved with the next write.
+        for device_announcements in announcements.values():
+            for announcement in device_announcements.values():
+                if 'RefreshSeconds' not in announcement and 'Refresh' in announcement:
+                    announcement['RefreshSeconds'] = f"{_refresh_interval(announcement):.0f}"
+                    del announcement['Refresh']
+        self.template_index   = Plugin.__index_templates__(announcements)
+        self.dependency_index = Plugin.__index_dependencies__(announcements)
+        self.__set_quarantine__(Plugin.__index_dangling__(announcements), announcements, notify=False)
+        return announcements
+
     # =============================================================================
     def __announcement_file_write__(self, announcements: dict) -> bool:
         """Write the announcements dict to disk.
 
+        The template and dependency indexes and the quarantine are built when the file is read and updated by the
+        callbacks that change announcement text or the devices and variables that exist (see __reindex_announcement__),
+        so a write that only advances refresh times doesn't rebuild them or ask the server anything.
+
         Args:
             announcements (dict): The announcements data to persist.
 
@@ -521,8 +972,180 @@ class Plugin(indigo.PluginBase):
         # Open the announcements file and write the contents
         with open(self.announcements_file, mode='w', encoding="utf-8") as outfile:
             json.dump(announcements, outfile, ensure_ascii=False, indent=4)
+            written = outfile.tell()
+        self.metrics.inc('file_writes_total')
+        self.metrics.inc('file_bytes_written_total', written)
         return True
 
+    # =============================================================================
+    @staticmethod
+    def __index_templates__(announcements: dict) -> dict:
+        """Build the in-memory index of compiled announcement templates.
+
+        The index maps (device ID, state name) to the compiled template, so an announcement can be rendered without
+        reading the announcements file. Announcements with identical text share one compiled template.
+
+        Args:
+            announcements (dict): The announcements data keyed by device ID.
+
+        Returns:
+            dict: The compiled templates keyed by (device ID, state name).
+        """
+        compiled = {}
+        index    = {}
+        for dev_id, device_announcements in announcements.items():
+            for announcement in device_announcements.values():
+                text = announcement['Announcement']
+                if text not in compiled:
+                    compiled[text] = compile_template(text)
+                index[(int(dev_id), announcement['Name'].replace(' ', '_'))] = compiled[text]
+        return index
+
+    # =============================================================================
+    @staticmethod
+    def __index_dependencies__(announcements: dict) -> dict:
+        """Build the reverse dependency index of announcements.
+
+        The index maps each device (`('d', dev_id)`) and variable (`('v', var_id)`) referenced by an announcement to the
+        announcements that reference it. It's built when the announcements are loaded and kept up to date by
+        __reindex_announcement__.
+
+        Args:
+            announcements (dict): The announcements data keyed by device ID.
+
+        Returns:
+            dict: Sets of (device ID, announcement ID) keyed by referenced device or variable.
+        """
+        index = {}
+        for dev_id, device_announcements in announcements.items():
+            for key, announcement in device_announcements.items():
+                for reference in compile_template(announcement['Announcement']).references:
+                    index.setdefault(reference[:2], set()).add((int(dev_id), int(key)))
+        return index
+
+    # =============================================================================
+    def __reindex_announcement__(self, dev_id: int, key: int, before: dict | None, after: dict | None) -> None:
+        """Update the template and dependency indexes and the quarantine for one added, edited or removed announcement.
+
+        Only the changed announcement's references are looked up on the server, and only if its text changed.
+
+        Args:
+            dev_id (int): The announcements device ID.
+            key (int): The announcement ID.
+            before (dict | None): The announcement before the change; None if it was added.
+            after (dict | None): The announcement after the change; None if it was removed.
+        """
+        if before is not None:
+            self.template_index.pop((dev_id, before['Name'].replace(' ', '_')), None)
+            for reference in compile_template(before['Announcement']).references:
+                dependents = self.dependency_index.get(reference[:2], set())
+                dependents.discard((dev_id, key))
+                if not dependents:
+                    self.dependency_index.pop(reference[:2], None)
+
+        if after is not None:
+            template = compile_template(after['Announcement'])
+            self.template_index[(dev_id, after['Name'].replace(' ', '_'))] = template
+            for reference in template.references:
+                self.dependency_index.setdefault(reference[:2], set()).add((dev_id, key))
+
+        if before is None or after is None or before['Announcement'] != after['Announcement']:
+            dangling = dict(self.quarantine)
+            dangling.pop((dev_id, key), None)
+            if after is not None:
+                missing = {
+                    reference[:2] for reference in compile_template(after['Announcement']).references
+                    if reference[1] not in (indigo.devices if reference[0] == 'd' else indigo.variables)
+                }
+                if missing:
+                    dangling[(dev_id, key)] = tuple(sorted(missing))
+            if dangling != self.quarantine:
+                self.__set_quarantine__(dangling, self.store.snapshot().data)
+
+    # =============================================================================
+    @staticmethod
+    def __index_dangling__(announcements: dict) -> dict:
+        """Find the announcements that reference devices or variables that no longer exist.
+
+        The IDs of the existing devices and variables are fetched from the server once, rather than looking up each
+        reference.
+
+        Args:
+            announcements (dict): The announcements data keyed by device ID.
+
+        Returns:
+            dict: The sorted missing `('d', dev_id)`/`('v', var_id)` references keyed by (device ID, announcement ID).
+        """
+        existing = {'d': set(indigo.devices.keys()), 'v': set(indigo.variables.keys())}
+        dangling = {}
+        for dev_id, device_announcements in announcements.items():
+            for key, announcement in device_announcements.items():
+                missing = {
+                    reference[:2] for reference in compile_template(announcement['Announcement']).references
+                    if reference[1] not in existing[reference[0]]
+                }
+                if missing:
+                    dangling[(int(dev_id), int(key))] = tuple(sorted(missing))
+        return dangling
+
+    # =============================================================================
+    def __set_quarantine__(self, dangling: dict, announcements: dict, notify: bool = True) -> None:
+        """Replace the set of quarantined announcements.
+
+        Quarantined announcements aren't refreshed. Each newly quarantined announcement is logged and, if `notify`, its
+        device state is set to say what's missing. Announcements released from quarantine are refreshed straight away.
+
+        Args:
+            dangling (dict): The missing references keyed by (device ID, announcement ID); see __index_dangling__.
+            announcements (dict): The announcements data keyed by device ID.
+            notify (bool): Write the device states of newly quarantined announcements.
+        """
+        previous, self.quarantine = self.quarantine, dangling
+
+        for item, missing in dangling.items():
+            announcement = announcements.get(item[0], {}).get(item[1])
+            if announcement is not None and previous.get(item) != missing:
+                name    = announcement['Name']
+                message = _quarantine_message(missing)
+                self.logger.warning("Announcement %s is quarantined. %s", name, message)
+                if notify:
+                    self.__push_announcement_state__(item[0], name.replace(' ', '_'), message)
+
+        for item in previous.keys() - dangling.keys():
+            announcement = announcements.get(item[0], {}).get(item[1])
+            if announcement is not None:
+                self.logger.info("Announcement %s is no longer quarantined.", announcement['Name'])
+                self.forced_refresh.add(item)
+
+    # =============================================================================
+    def __quarantine_dependents__(self, target: tuple) -> None:
+        """Quarantine the announcements that reference a deleted device or variable.
+
+        Args:
+            target (tuple): The deleted `('d', dev_id)` or `('v', var_id)`.
+        """
+        dependents = self.dependency_index.pop(target, None)
+        if dependents:
+            dangling = dict(self.quarantine)
+            for item in dependents:
+                dangling[item] = tuple(sorted(set(dangling.get(item, ())) | {target}))
+            self.__set_quarantine__(dangling, self.store.snapshot().data)
+
+    # =============================================================================
+    def __rearm_dependents__(self, target: tuple) -> None:
+        """Release the announcements quarantined because a device or variable was missing, now that it exists again.
+
+        Args:
+            target (tuple): The created `('d', dev_id)` or `('v', var_id)`.
+        """
+        if any(target in missing for missing in self.quarantine.values()):
+            dangling = {}
+            for item, missing in self.quarantine.items():
+                missing = tuple(reference for reference in missing if reference != target)
+                if missing:
+                    dangling[item] = missing
+            self.__set_quarantine__(dangling, self.store.snapshot().data)
+
     # =============================================================================
     def announcement_refresh_action(self, plugin_action: indigo.actionGroup) -> None:
         """Refresh an announcement in response to an Indigo action call.
@@ -536,8 +1159,8 @@ class Plugin(indigo.PluginBase):
         device_id         = int(plugin_action.props['announcementDeviceToRefresh'])
         dev               = indigo.devices[device_id]
 
-        # Open the announcements file and load the contents
-        announcements = self.__announcement_file_read__()
+        # Take the current announcements snapshot.
+        announcements = self.store.snapshot().data
 
         # Iterate through the keys to find the right announcement to update. Compare state-name forms
         # (spaces → underscores) to avoid reversing a lossy transform.
@@ -585,7 +1208,7 @@ class Plugin(indigo.PluginBase):
             values_dict['announcementText']    = 'REQUIRED'
             error_msg_dict['announcementText'] = "An announcement is required."
 
-        # Refresh time
+        # Refresh time (seconds)
         try:
             if int(values_dict['announcementRefresh']) <= 0:
                 values_dict['announcementRefresh']    = 1
@@ -594,6 +1217,9 @@ class Plugin(indigo.PluginBase):
             values_dict['announcementRefresh']    = 1
             error_msg_dict['announcementRefresh'] = "The refresh interval must be an integer greater than zero."
 
+        if values_dict.get('announcementCatchUp') not in ('once', 'skip', 'all'):
+            values_dict['announcementCatchUp'] = 'once'
+
         if len(error_msg_dict) > 0:
             error_msg_dict['showAlertText'] = (
                 "Configuration Errors\n\nThere are one or more settings that need to be corrected. Fields requiring "
@@ -602,53 +1228,55 @@ class Plugin(indigo.PluginBase):
             return values_dict, error_msg_dict
 
         # =============================================================================
-        # There are no validation errors, so let's continue. Open the announcements file and load the contents
-        announcements = self.__announcement_file_read__()
-
-        try:
-            temp_dict = announcements[dev_id]
-        except KeyError:
-            temp_dict = {}
-
-        # Generate a list of announcement names in use for this device.
-        announcement_name_list = [temp_dict[key]['Name'] for key in temp_dict]
-
-        # If new announcement, create unique id, then save to dict.
-        if not values_dict['editFlag'] and values_dict['announcementName'] not in announcement_name_list:
-            index             = self.announcement_create_id(temp_dict=temp_dict)
-            temp_dict[index]  = {
-                'Name': values_dict['announcementName'],
-                'Announcement': values_dict['announcementText'],
-                'Refresh': values_dict['announcementRefresh'],
-                'nextRefresh': f"{dt.datetime.now()}"
-            }
-
-        # If key exists, save to dict.
-        elif values_dict['editFlag']:
-            index                            = int(values_dict['announcementIndex'])
-            temp_dict[index]['Name']         = values_dict['announcementName']
-            temp_dict[index]['Announcement'] = values_dict['announcementText']
-            temp_dict[index]['Refresh']      = values_dict['announcementRefresh']
-
-        # User has created a new announcement with a name already in use. Append " X" until unique.
-        else:
-            unique_name = f"{values_dict['announcementName']} X"
-            while unique_name in announcement_name_list:
-                unique_name += " X"
-            index            = self.announcement_create_id(temp_dict=temp_dict)
-            temp_dict[index] = {
-                'Name': unique_name,
-                'Announcement': values_dict['announcementText'],
-                'Refresh': values_dict['announcementRefresh'],
-                'nextRefresh': f"{dt.datetime.now()}"
-            }
-            self.logger.warning("Duplicate announcement name found. Temporary correction applied.")
-
-        # Set the dict element equal to the new list
-        announcements[dev_id] = temp_dict
-
-        # Open the announcements file and save the new dict.
-        self.__announcement_file_write__(announcements)
+        # There are no validation errors, so let's continue. The change is applied to the announcements store, which
+        # serializes it with any other change in progress and saves the file.
+        def save(announcements: dict) -> tuple:
+            temp_dict = announcements.setdefault(dev_id, {})
+            before    = None
+
+            # Generate a list of announcement names in use for this device.
+            announcement_name_list = [temp_dict[key]['Name'] for key in temp_dict]
+
+            # If new announcement, create unique id, then save to dict.
+            if not values_dict['editFlag'] and values_dict['announcementName'] not in announcement_name_list:
+                index             = self.announcement_create_id(temp_dict=temp_dict)
+                temp_dict[index]  = {
+                    'Name': values_dict['announcementName'],
+                    'Announcement': values_dict['announcementText'],
+                    'RefreshSeconds': values_dict['announcementRefresh'],
+                    'CatchUp': values_dict['announcementCatchUp'],
+                    'nextRefresh': f"{dt.datetime.now()}"
+                }
+
+            # If key exists, save to dict.
+            elif values_dict['editFlag']:
+                index                              = int(values_dict['announcementIndex'])
+                before                             = dict(temp_dict[index])
+                temp_dict[index]['Name']           = values_dict['announcementName']
+                temp_dict[index]['Announcement']   = values_dict['announcementText']
+                temp_dict[index]['RefreshSeconds'] = values_dict['announcementRefresh']
+                temp_dict[index]['CatchUp']        = values_dict['announcementCatchUp']
+                temp_dict[index].pop('Refresh', None)
+
+            # User has created a new announcement with a name already in use. Append " X" until unique.
+            else:
+                unique_name = f"{values_dict['announcementName']} X"
+                while unique_name in announcement_name_list:
+                    unique_name += " X"
+                index            = self.announcement_create_id(temp_dict=temp_dict)
+                temp_dict[index] = {
+                    'Name': unique_name,
+                    'Announcement': values_dict['announcementText'],
+                    'RefreshSeconds': values_dict['announcementRefresh'],
+                    'CatchUp': values_dict['announcementCatchUp'],
+                    'nextRefresh': f"{dt.datetime.now()}"
+                }
+                self.logger.warning("Duplicate announcement name found. Temporary correction applied.")
+
+            return index, before, dict(temp_dict[index])
+
+        index, before, after = self.store.mutate(save)
+        self.__reindex_announcement__(dev_id, index, before, after)
 
         # Clear the fields.
         return self.__clear_announcement_fields__(values_dict)
@@ -674,23 +1302,22 @@ class Plugin(indigo.PluginBase):
         # The user has entered a value in the announcement field. Speak that.
         if len(values_dict['announcementText']) > 0:
             result = self.__process_announcement__(values_dict['announcementText'])
-            indigo.server.speak(result, waitUntilDone=False)
+            self.speech_queue.enqueue(result, priority=PRIORITIES['high'])
             self.logger.info("%s", result)
 
         # If the announcement field is blank, and the user has selected an announcement in the list.
         elif values_dict['announcementList'] != "":
-            # Open the announcements file and load the contents
-            announcements = self.__announcement_file_read__()
+            announcements     = self.store.snapshot().data
             announcement_text = announcements[dev_id][int(values_dict['announcementList'])]['Announcement']
             result            = self.__process_announcement__(announcement_text)
-            indigo.server.speak(result, waitUntilDone=False)
+            self.speech_queue.enqueue(result, priority=PRIORITIES['high'])
 
             self.logger.info("%s", result)
 
         # Otherwise, let the user know that there is nothing to speak.
         else:
             self.logger.error("%s", default_string)
-            indigo.server.speak(default_string, waitUntilDone=False)
+            self.speech_queue.enqueue(default_string, priority=PRIORITIES['high'])
 
         # If enabled in plugin prefs, save copy of the current announcement to variable called
         # 'spoken_announcement_raw'. This is done to allow the Speak Announcement button to trigger speech in another
@@ -719,29 +1346,28 @@ class Plugin(indigo.PluginBase):
         Returns:
             str: The announcements database serialized as JSON.
         """
-        # Open the announcements file and load the contents
-        announcements = self.__announcement_file_read__()
-        return json.dumps(announcements)
+        return json.dumps(thaw(self.store.snapshot().data))
 
     # =============================================================================
     def announcement_speak_action(self, plugin_action: indigo.actionGroup) -> None:
         """Speak an announcement in response to an Indigo action item.
 
-        Indigo action for speaking any device state or variable value.
+        Indigo action for speaking any device state or variable value. The announcement is added to the speech queue
+        with the priority selected in the action config.
 
         Args:
             plugin_action (indigo.actionGroup): The Indigo action group object.
         """
         item_source   = int(plugin_action.props['announcementDeviceToRefresh'])
         item_to_speak = plugin_action.props['announcementToSpeak']
+        priority      = PRIORITIES.get(plugin_action.props.get('speechPriority', 'normal'), PRIORITIES['normal'])
 
         try:
             if item_source in indigo.devices:
                 announcement = f"{indigo.devices[item_source].states[item_to_speak]}"
-                indigo.server.speak(announcement, waitUntilDone=False)
             else:
                 announcement = indigo.variables[item_source].value
-                indigo.server.speak(announcement, waitUntilDone=False)
+            self.speech_queue.enqueue(announcement, priority=priority)
 
         except ValueError:
             self.logger.warning("Unable to speak %s value.", item_to_speak)
@@ -751,43 +1377,269 @@ class Plugin(indigo.PluginBase):
             self.logger.warning("No announcements to speak for this device %s", item_to_speak)
             self.logger.debug("Error: ", exc_info=True)
 
+    # =============================================================================
+    def announcement_render_speak_action(self, plugin_action: indigo.actionGroup) -> None:
+        """Render an announcement and speak it in response to an Indigo action item.
+
+        Unlike announcement_speak_action, which speaks the device state rendered at the last refresh, the announcement
+        is rendered fresh from its compiled template and queued for speech straight away. The device state is written
+        afterward on a separate thread so the server round trip doesn't delay speech.
+
+        Args:
+            plugin_action (indigo.actionGroup): The Indigo action group object.
+        """
+        triggered  = time.monotonic()
+        device_id  = int(plugin_action.props['announcementDeviceToRefresh'])
+        state_name = plugin_action.props['announcementToSpeak']
+        priority   = PRIORITIES.get(plugin_action.props.get('speechPriority', 'normal'), PRIORITIES['normal'])
+
+        template = self.template_index.get((device_id, state_name))
+        if template is None:
+            self.logger.warning("No announcement named %s for device %s", state_name, device_id)
+            return
+
+        result = self.__process_announcement__(template.text)
+        self.speech_queue.enqueue(result, priority=priority)
+        self.speak_latency.record(time.monotonic() - triggered)
+
+        threading.Thread(
+            target=self.__push_announcement_state__, args=(device_id, state_name, result), daemon=True
+        ).start()
+
+    # =============================================================================
+    def __push_announcement_state__(self, device_id: int, state_name: str, value: str) -> None:
+        """Write a single rendered announcement to its device state.
+
+        Args:
+            device_id (int): The announcements device ID.
+            state_name (str): The announcement state name.
+            value (str): The rendered announcement.
+        """
+        try:
+            indigo.devices[device_id].updateStateOnServer(state_name, value=value)
+        except (KeyError, ValueError):
+            self.logger.warning("Unable to update the %s state.", state_name)
+            self.logger.debug("Error: ", exc_info=True)
+
+    # =============================================================================
+    def announcement_explain_action(self, plugin_action: indigo.actionGroup) -> str:
+        """Log a timed trace of an announcement render in response to an Indigo action item.
+
+        Args:
+            plugin_action (indigo.actionGroup): The Indigo action group object.
+
+        Returns:
+            str: The trace serialized as JSON, or an empty string if there's no such announcement.
+        """
+        trace = self.__explain_announcement__(
+            int(plugin_action.props['announcementDeviceToRefresh']), plugin_action.props['announcementToSpeak']
+        )
+        return json.dumps(trace) if trace else ""
+
+    # =============================================================================
+    def announcement_explain_menu(self, values_dict: indigo.Dict=None, type_id: str="") -> bool:  # noqa
+        """Log a timed trace of an announcement render when "Explain Announcement" is selected from the plugin menu.
+
+        Args:
+            values_dict (indigo.Dict): The dialog's values.
+            type_id (str): The menu item identifier.
+
+        Returns:
+            bool: True, to close the dialog.
+        """
+        try:
+            device_id = int(values_dict['announcementDeviceToRefresh'])
+        except (KeyError, ValueError):
+            self.logger.warning("Select an announcements device to explain.")
+            return True
+        self.__explain_announcement__(device_id, values_dict.get('announcementToSpeak', ""))
+        return True
+
+    # =============================================================================
+    def __explain_announcement__(self, device_id: int, state_name: str) -> dict:
+        """Render an announcement step by step and log what each step resolved to and how long it took.
+
+        The announcement is rendered fresh, bypassing the render cache, so every step is timed; the trace says whether
+        the render cache would have served it. References are resolved and substituted by the same helpers as a real
+        render (__resolve_references__ and substitute_values), so the explanation can't drift from it. Each
+        `%%d:`/`%%v:` reference is logged with its resolved value, and each `<<value, spec>>` formatter with its input
+        and output. The whole trace is also logged as a single JSON line (times in milliseconds) that can be attached
+        to a ticket.
+
+        Args:
+            device_id (int): The announcements device ID.
+            state_name (str): The announcement state name.
+
+        Returns:
+            dict: The trace, or an empty dict if there's no such announcement.
+        """
+        template = self.template_index.get((device_id, state_name))
+        if template is None:
+            self.logger.warning("No announcement named %s for device %s", state_name, device_id)
+            return {}
+
+        started       = time.perf_counter()
+        timings       = []
+        values        = self.__resolve_references__(template, timings=timings)
+        substituting  = time.perf_counter()
+        substituted   = substitute_values(template, values)
+        substitute_ms = (time.perf_counter() - substituting) * 1000
+        result, steps = formatting.trace_formatters(substituted)
+        total_ms      = (time.perf_counter() - started) * 1000
+
+        references = [
+            {
+                'token': f"%%d:{reference[1]}:{reference[2]}%%" if reference[0] == 'd' else f"%%v:{reference[1]}%%",
+                'value': value,
+                'ms': ms,
+            }
+            for reference, value, ms in zip(template.references, values, timings)
+        ]
+        key = (template.template_id, values, template.time_bucket(time.time()))
+        trace  = {
+            'device': device_id,
+            'announcement': state_name,
+            'template': template.text,
+            'cache_hit': key in self.render_cache,
+            'references': references,
+            'substitute_ms': substitute_ms,
+            'formatters': steps,
+            'result': result,
+            'total_ms': total_ms,
+        }
+
+        self.logger.info(
+            "Explain %s (device %s): %s", state_name, device_id,
+            "render cache hit" if trace['cache_hit'] else "not in the render cache"
+        )
+        for item in references:
+            self.logger.info("  %s = %r (%.3f ms)", item['token'], item['value'], item['ms'])
+        self.logger.info("  substitute_values(): %.3f ms", substitute_ms)
+        for item in steps:
+            self.logger.info("  %s: %r -> %r (%.3f ms)", item['token'], item['input'], item['output'], item['ms'])
+        self.logger.info("  Total: %.3f ms. Result: %r", total_ms, result)
+        self.logger.info("Explain JSON: %s", json.dumps(trace))
+        return trace
+
+    # =============================================================================
+    def announcement_history_action(self, plugin_action: indigo.actionGroup) -> str:
+        """Log and return the recent renders of an announcement in response to an Indigo action item.
+
+        Args:
+            plugin_action (indigo.actionGroup): The Indigo action group object.
+
+        Returns:
+            str: The renders serialized as JSON, oldest first, or an empty string if there's no such announcement.
+        """
+        device_id  = int(plugin_action.props['announcementDeviceToRefresh'])
+        state_name = plugin_action.props['announcementToSpeak']
+        try:
+            limit = int(plugin_action.props.get('historyLimit', 10) or 0)
+        except ValueError:
+            limit = 10
+
+        announcements   = self.store.snapshot().data.get(device_id, {})
+        announcement_id = next(
+            (key for key, item in announcements.items() if item['Name'].replace(' ', '_') == state_name), None
+        )
+        if announcement_id is None:
+            self.logger.warning("No announcement named %s for device %s", state_name, device_id)
+            return ""
+
+        history = [
+            {
+                'time': dt.datetime.fromtimestamp(timestamp).isoformat(sep=' ', timespec='seconds'),
+                'timestamp': timestamp,
+                'text': text,
+                'ms': round(ms, 2),
+            }
+            for timestamp, text, ms in self.history.query((device_id, announcement_id), limit=limit or None)
+        ]
+        self.logger.info("History of %s (%s renders):", state_name, len(history))
+        for item in history:
+            self.logger.info("  %s  %r (%.1f ms)", item['time'], item['text'], item['ms'])
+        return json.dumps(history)
+
+    # =============================================================================
+    @staticmethod
+    def __speak__(text: str) -> None:
+        """Speak a single utterance. This is the speech queue's sink.
+
+        Args:
+            text (str): The text to be spoken.
+        """
+        indigo.server.speak(text, waitUntilDone=True)
+
+    # =============================================================================
+    def speech_queue_enqueue_action(self, plugin_action: indigo.actionGroup) -> None:
+        """Add text to the speech queue in response to an Indigo action item.
+
+        The text may contain substitutions and formatters; it is processed like any other announcement.
+
+        Args:
+            plugin_action (indigo.actionGroup): The Indigo action group object.
+        """
+        result   = self.__process_announcement__(plugin_action.props.get('speechText', ''))
+        priority = PRIORITIES.get(plugin_action.props.get('speechPriority', 'normal'), PRIORITIES['normal'])
+
+        if not result.strip():
+            self.logger.warning("Nothing to speak.")
+        elif not self.speech_queue.enqueue(result, priority=priority):
+            self.logger.debug("Speech dropped: %s", result)
+
+    # =============================================================================
+    def speech_queue_flush_action(self, action: indigo.actionGroup=None) -> None:  # noqa
+        """Discard all pending speech in response to an Indigo action item or menu call.
+
+        Args:
+            action (indigo.actionGroup): The Indigo action group object.
+        """
+        count = self.speech_queue.flush()
+        self.logger.info("Speech queue flushed (%s pending items discarded).", count)
+
+    # =============================================================================
+    def speech_queue_status_action(self, action: indigo.actionGroup=None) -> str:  # noqa
+        """Log and return the speech queue status.
+
+        Args:
+            action (indigo.actionGroup): The Indigo action group object.
+
+        Returns:
+            str: The speech queue status serialized as JSON.
+        """
+        status = self.speech_queue.status()
+        self.logger.info(
+            "Speech queue: %s of %s pending, %s spoken, %s coalesced, %s dropped.",
+            status['depth'], status['max_depth'], status['spoken'], status['coalesced'], status['dropped']
+        )
+        return json.dumps(status)
+
     # =============================================================================
     def __update_salutations_device__(self, dev: indigo.Device) -> None:
         """Update the salutations device states based on the current time of day.
 
+        The device's period boundaries are computed from its props the first time it's updated (and again after the
+        props change). The intro and outro are pushed to the server only when they differ from the current states, and
+        the device is not looked at again until the next boundary is reached.
+
         Args:
             dev (indigo.Device): The salutations device to update.
         """
         states_list = []
-        now         = dt.datetime.now()
-        today       = dt.datetime.today().date()
-
-        morning_start   = int(dev.pluginProps.get('morningStart', '5'))
-        afternoon_start = int(dev.pluginProps.get('afternoonStart', '12'))
-        evening_start   = int(dev.pluginProps.get('eveningStart', '17'))
-        night_start     = int(dev.pluginProps.get('nightStart', '21'))
-        morning         = dt.datetime.combine(today, dt.time(morning_start, 0))
-        afternoon       = dt.datetime.combine(today, dt.time(afternoon_start, 0))
-        evening         = dt.datetime.combine(today, dt.time(evening_start, 0))
-        night           = dt.datetime.combine(today, dt.time(night_start, 0))
+        schedule    = self.salutation_schedule.get(dev.id)
 
-        # Determine proper salutation based on the current time.
-        if morning <= now < afternoon:
-            intro_value = dev.pluginProps.get('morningMessageIn', 'Good morning.')
-            outro_value = dev.pluginProps.get('morningMessageOut', 'Have a great morning.')
+        if schedule is None:
+            schedule = {'boundaries': salutation_boundaries(dev.pluginProps), 'next': 0.0}
+            self.salutation_schedule[dev.id] = schedule
 
-        elif afternoon <= now < evening:
-            intro_value = dev.pluginProps.get('afternoonMessageIn', 'Good afternoon.')
-            outro_value = dev.pluginProps.get('afternoonMessageOut', 'Have a great afternoon.')
+        # Determine proper salutation based on the current time.
+        current, next_boundary = salutation_period(dt.datetime.now(), schedule['boundaries'])
+        _, period, intro_value, outro_value = current
 
-        elif evening <= now < night:
-            intro_value = dev.pluginProps.get('eveningMessageIn', 'Good evening.')
-            outro_value = dev.pluginProps.get('eveningMessageOut', 'Have a great evening.')
-
-        else:
-            # Covers now >= night AND now < morning (i.e., midnight through morningStart).
-            intro_value = dev.pluginProps.get('nightMessageIn', 'Good night.')
-            outro_value = dev.pluginProps.get('nightMessageOut', 'Have a great night.')
+        # Naive datetimes are converted using the local UTC offset in effect at that time, so the wakeup lands on the
+        # correct instant even when a DST transition falls between now and the boundary.
+        schedule['next'] = next_boundary.timestamp()
+        self.logger.debug("%s salutation period is %s until %s", dev.name, period, next_boundary)
 
         # Don't update the device state unless the value has changed.
         if intro_value != dev.states['intro']:
@@ -798,103 +1650,657 @@ class Plugin(indigo.PluginBase):
             self.logger.debug("Updating outro to: %s", outro_value)
             states_list.append({'key': 'outro', 'value': outro_value})
 
-        states_list.append({'key': 'onOffState', 'value': True, 'uiValue': " "})
-        dev.updateStatesOnServer(states_list)
+        if states_list:
+            dev.updateStatesOnServer(states_list)
+            self.__fire_triggers__(SALUTATION_CHANGED, dev.id)
+
+    # =============================================================================
+    def __fire_triggers__(self, event: str, dev_id: int, state: str = None) -> None:
+        """Execute the plugin triggers matching an event.
+
+        Args:
+            event (str): The event type.
+            dev_id (int): The device the event happened on.
+            state (str): The announcement state name the event happened on, if any.
+        """
+        for trigger_id in self.triggers.match(event, dev_id, state):
+            if self.logger.isEnabledFor(THREADDEBUG):
+                self.logger.threaddebug("Executing trigger %s (%s on device %s).", trigger_id, event, dev_id)
+            indigo.trigger.execute(trigger_id)
+
+    # =============================================================================
+    def __seconds_until_next_wakeup__(self) -> float:
+        """Return how long the concurrent thread should sleep before its next pass.
+
+        The thread sleeps for at most the plugin refresh interval. It wakes early when the next announcement comes due
+        or a salutations device reaches a period boundary, and after a short pause if due announcements were carried
+        over from the last pass. While the Indigo server is under load, the pacing controller enforces a longer rest.
+
+        Returns:
+            float: The number of seconds to sleep.
+        """
+        now    = time.time()
+        wakeup = BACKLOG_SLICE_INTERVAL if self.refresh_backlog else self.update_frequency
+
+        if self.next_refresh_due is not None:
+            # A little slack so the pass doesn't start a hair before the deadline and find nothing due.
+            wakeup = min(wakeup, self.next_refresh_due.timestamp() - now + 0.01)
+
+        for schedule in list(self.salutation_schedule.values()):
+            wakeup = min(wakeup, schedule['next'] - now)
+        return max(wakeup, self.pacing.gap)
 
     # =============================================================================
     def __process_announcement__(self, text: str) -> str:
         """Substitute variables and apply regex formatting to an announcement string.
 
+        The result is memoized on the compiled template, the resolved values of the device states and variables it
+        references, and its time bucket. If none of those have changed since the last render, the cached string is
+        returned without substituting or running the formatter pipeline. Otherwise the same resolved values are
+        substituted, so the render always matches its cache key.
+
         Args:
             text (str): The raw announcement template string.
 
         Returns:
             str: The fully processed announcement string.
         """
-        return self.substitution_regex(announcement=self.substitute(text))
+        now       = time.time()
+        template  = compile_template(text)
+        resolving = time.perf_counter()
+        values    = self.__resolve_references__(template)
+        self.pacing.observe(time.perf_counter() - resolving)
+        key       = (template.template_id, values, template.time_bucket(now))
+        result    = self.render_cache.get(key)
+
+        if result is None:
+            result = self.substitution_regex(announcement=substitute_values(template, values))
+            self.render_cache.put(key, result)
+            self.metrics.inc('renders_total')
+            recorder = self.recorder
+            if recorder is not None:
+                recorder.record(template, key[1], now)
+
+        return result
 
     # =============================================================================
-    def __update_announcements_device__(self, dev: indigo.Device, announcements: dict, force: bool = False) -> dict:
-        """Update the announcements device states.
+    @staticmethod
+    def __resolve_references__(template: CompiledTemplate, devices: dict = None, timings: list = None) -> tuple:
+        """Resolve the current values of the device states and variables referenced by a template.
+
+        Each referenced device is fetched from the server once, regardless of how many of its states are used. A
+        reference to a missing device, state or variable resolves to None.
 
         Args:
-            dev (indigo.Device): The announcements device to update.
-            announcements (dict): The full announcements data dict.
-            force (bool): If True, update regardless of scheduled refresh time.
+            template (CompiledTemplate): The compiled announcement template.
+            devices (dict): Indigo devices already fetched, keyed by ID. Devices fetched here are added to it, so
+                templates resolved in a batch share each device fetch.
+            timings (list): If given, the time taken to resolve each reference (in milliseconds) is appended to it, in
+                the order of template.references.
 
         Returns:
-            dict: The updated announcements data dict.
+            tuple: The resolved values as strings, in the order of template.references.
         """
-        now         = dt.datetime.now()
-        states_list = []
+        devices = {} if devices is None else devices
+        values  = []
+
+        for reference in template.references:
+            resolving = time.perf_counter()
+            try:
+                if reference[0] == 'd':
+                    if reference[1] not in devices:
+                        devices[reference[1]] = indigo.devices[reference[1]]
+                    values.append(f"{devices[reference[1]].states[reference[2]]}")
+                else:
+                    values.append(indigo.variables[reference[1]].value)
+            except KeyError:
+                values.append(None)
+            if timings is not None:
+                timings.append((time.perf_counter() - resolving) * 1000)
+
+        return tuple(values)
+
+    # =============================================================================
+    def __prerender_announcements__(self, texts: list, devices: dict = None) -> dict:
+        """Render a batch of announcements, running the formatting pipeline in the formatting process pool.
+
+        Indigo references are resolved and substituted here, on the calling thread, since only the plugin can talk to
+        the server. The substituted strings are formatted in the pool and the results are memoized as in
+        __process_announcement__.
+
+        Args:
+            texts (list): The raw announcement template strings.
+            devices (dict): Indigo devices already fetched, keyed by ID; see __resolve_references__.
+
+        Returns:
+            dict: The rendered strings keyed by template string.
+        """
+        now      = time.time()
+        recorder = self.recorder
+        rendered = {}
+        pending  = {}
+        devices  = {} if devices is None else devices
+
+        for text in dict.fromkeys(texts):
+            template  = compile_template(text)
+            resolving = time.perf_counter()
+            values    = self.__resolve_references__(template, devices)
+            self.pacing.observe(time.perf_counter() - resolving)
+            key       = (template.template_id, values, template.time_bucket(now))
+            result    = self.render_cache.get(key)
+            if result is None:
+                pending[text] = (key, substitute_values(template, values))
+                if recorder is not None:
+                    recorder.record(template, key[1], now)
+            else:
+                rendered[text] = result
+
+        results = self.__format_announcements__([substituted for _, substituted in pending.values()])
+        self.metrics.inc('renders_total', len(results))
+        for (text, (key, _)), result in zip(pending.items(), results):
+            self.render_cache.put(key, result)
+            rendered[text] = result
+
+        return rendered
+
+    # =============================================================================
+    def __format_announcements__(self, announcements: list) -> list:
+        """Run the formatting pipeline over substituted announcements in the formatting process pool.
+
+        The announcements are split into a few batches per worker and the results are merged back in order. If the
+        pool can't be started or a worker dies, the announcements are formatted on the calling thread instead and
+        formatting processes are turned off in the plugin prefs.
+
+        Args:
+            announcements (list): Announcement strings with their Indigo references already substituted.
+
+        Returns:
+            list: The formatted strings, in the same order.
+        """
+        workers = int(self.pluginPrefs.get('formatWorkers', 0))
+        if workers < 1 or not announcements:
+            return formatting.render_batch(announcements)
+
+        size    = -(-len(announcements) // (workers * 4))
+        batches = [announcements[i:i + size] for i in range(0, len(announcements), size)]
 
-        # Look at each plugin device and construct a placeholder if not already present. This is a placeholder and
-        # doesn't actually write the key back to the file.
         try:
-            if dev.id not in announcements:
-                announcements[dev.id] = {}
+            if self.format_pool is None:
+                self.format_pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return [result for batch in self.format_pool.map(formatting.render_batch, batches) for result in batch]
+
+        except (concurrent.futures.BrokenExecutor, OSError):
+            self.logger.warning("Formatting processes unavailable. Formatting processes have been turned off.")
+            self.logger.debug("Error: ", exc_info=True)
+            self.pluginPrefs['formatWorkers'] = "0"
+            self.__stop_format_pool__()
+            return formatting.render_batch(announcements)
 
-            for key in announcements[dev.id]:
-                state_name = announcements[dev.id][key]['Name'].replace(' ', '_')
-                try:
-                    refresh_time = announcements[dev.id][key].get('nextRefresh', '1970-01-01 00:00:00')
-                    update_time  = parser.parse(refresh_time)
+    # =============================================================================
+    def __register_metrics__(self) -> None:
+        """Register the plugin metrics. Metrics read from existing plugin state are collected when exported."""
+        metrics = self.metrics
+        cache   = self.render_cache
+        pacing  = self.pacing
+        speech  = self.speech_queue
+        metrics.counter('ticks_total', "Refresh passes run.")
+        metrics.histogram('tick_seconds', "Duration of refresh passes.", TICK_SECONDS_BUCKETS)
+        metrics.counter('renders_total', "Announcements rendered (render cache misses).")
+        metrics.counter('render_cache_hits_total', "Renders served from the render cache.", lambda: cache.hits)
+        metrics.counter('render_cache_misses_total', "Render cache misses.", lambda: cache.misses)
+        metrics.gauge('render_cache_entries', "Rendered strings in the render cache.", lambda: len(cache))
+        metrics.counter('state_updates_total', "Device state updates sent to the server.")
+        metrics.counter('states_sent_total', "Device states sent to the server.")
+        metrics.counter('file_writes_total', "Writes of the announcements file.")
+        metrics.counter('file_bytes_written_total', "Bytes written to the announcements file.")
+        metrics.counter('errors_total', "Errors refreshing announcements.")
+        metrics.gauge('refresh_backlog', "Announcements carried over to the next pass.", lambda: self.refresh_backlog)
+        metrics.gauge(
+            'refresh_lateness_seconds', "Lateness of the most overdue announcement in the last pass.",
+            lambda: self.tick_stats['lateness']
+        )
+        metrics.gauge(
+            'announcements', "Configured announcements.",
+            lambda: sum(len(device) for device in self.store.snapshot().data.values())
+        )
+        metrics.gauge(
+            'distinct_templates', "Distinct announcement templates (identical text is compiled once).",
+            lambda: len({template.template_id for template in self.template_index.values()})
+        )
+        metrics.counter(
+            'shared_renders_total', "Announcements served from a render of identical text in the same pass.",
+            lambda: self.tick_stats['shared']
+        )
+        metrics.counter(
+            'tick_overruns_total', "Refresh passes that took longer than the time budget.", lambda: pacing.overruns
+        )
+        metrics.gauge('tick_stretch', "Refresh pass pacing stretch (1 when not under load).", lambda: pacing.stretch)
+        metrics.gauge('tick_gap_seconds', "Minimum rest between refresh passes.", lambda: pacing.gap)
+        metrics.gauge(
+            'server_latency_seconds', "Moving average of Indigo server round trips.", lambda: pacing.server_latency
+        )
+        metrics.gauge(
+            'quarantined_announcements', "Announcements referencing missing devices or variables.",
+            lambda: len(self.quarantine)
+        )
+        metrics.gauge('speech_queue_depth', "Utterances waiting to be spoken.", lambda: speech.status()['depth'])
+        metrics.counter('speech_spoken_total', "Utterances spoken.", lambda: speech.spoken)
+        metrics.counter('speech_dropped_total', "Utterances dropped from a full speech queue.", lambda: speech.dropped)
 
-                except ValueError:
-                    self.logger.warning("Error coercing announcement update time.")
-                    self.logger.debug("Error: ", exc_info=True)
-                    update_time = now - dt.timedelta(minutes=1)
+    # =============================================================================
+    def __export_metrics__(self, force: bool = False) -> None:
+        """Write the metrics file (plugin prefs), at most once every METRICS_INTERVAL seconds unless forced.
+
+        Args:
+            force (bool): Write the file even if it was written recently.
+        """
+        path = self.pluginPrefs.get('metricsFile', "").strip()
+        if not path or (not force and time.monotonic() - self.metrics_written < METRICS_INTERVAL):
+            return
 
-                # If it's time for an announcement to be refreshed (or a force refresh was requested).
-                if now >= update_time or force:
-                    result = self.__process_announcement__(announcements[dev.id][key]['Announcement'])
-                    states_list.append({'key': state_name, 'value': result})
+        self.metrics_written = time.monotonic()
+        try:
+            self.metrics.write_textfile(os.path.expanduser(path))
+        except OSError:
+            self.render_errors.error('metricsFile', logging.WARNING, "Unable to write the metrics file %s.", path)
 
-                    # Always advance nextRefresh so a forced update doesn't re-fire every cycle.
-                    next_update = now + dt.timedelta(minutes=float(announcements[dev.id][key]['Refresh']))
-                    announcements[dev.id][key]['nextRefresh'] = next_update.strftime('%Y-%m-%d %H:%M:%S')
-                    self.logger.debug("%s updated.", announcements[dev.id][key]['Name'])
+    # =============================================================================
+    def __configure_metrics_server__(self) -> None:
+        """Start, restart or stop the localhost metrics socket to match the plugin prefs. It stops at shutdown."""
+        try:
+            port = 0 if self.pluginIsShuttingDown else int(self.pluginPrefs.get('metricsPort', 0) or 0)
+        except ValueError:
+            self.logger.warning("The metrics port must be a number. The metrics socket is turned off.")
+            port = 0
 
-            if states_list:
-                states_list.append({'key': 'onOffState', 'value': True, 'uiValue': " "})
-                dev.updateStatesOnServer(states_list)
+        if self.metrics_server is not None and self.metrics_server.port != port:
+            self.metrics_server.stop()
+            self.metrics_server = None
 
-            return announcements
+        if port and self.metrics_server is None:
+            try:
+                self.metrics_server = MetricsServer(self.metrics, port)
+                self.logger.info("Serving plugin metrics on http://127.0.0.1:%s/metrics.", port)
+            except OSError:
+                self.logger.warning("Unable to serve plugin metrics on port %s.", port)
+                self.logger.debug("Error: ", exc_info=True)
 
-        except KeyError:
+    # =============================================================================
+    def __apply_trace_logging__(self) -> None:
+        """Write THREADDEBUG messages to the plugin log file when trace logging is turned on (plugin prefs)."""
+        level = THREADDEBUG if self.pluginPrefs.get('traceLogging', False) else logging.DEBUG
+        self.logger.setLevel(level)
+        self.plugin_file_handler.setLevel(level)
+
+    # =============================================================================
+    def __configure_recorder__(self) -> None:
+        """Start or stop recording renders to match the plugin prefs. Recording always stops at shutdown."""
+        enabled = bool(self.pluginPrefs.get('recordRenders', False)) and not self.pluginIsShuttingDown
+
+        if enabled and self.recorder is None:
+            self.recorder = RenderRecorder(
+                path=f"{indigo.server.getInstallFolderPath()}{RECORDING_FILE}", max_bytes=RECORDING_LIMIT
+            )
+            self.logger.info("Recording announcement renders to %s.", self.recorder.path)
+
+        elif not enabled and self.recorder is not None:
+            self.recorder.close()
+            self.logger.info("Recorded %s announcement renders.", self.recorder.records)
+            self.recorder = None
+
+    # =============================================================================
+    def __load_history__(self) -> None:
+        """Load the saved render history, if saving history is turned on (plugin prefs)."""
+        if not self.pluginPrefs.get('spillHistory', False):
+            return
+
+        try:
+            count = self.history.load(f"{indigo.server.getInstallFolderPath()}{HISTORY_FILE}")
+            self.logger.debug("Loaded %s renders from the render history file.", count)
+        except (OSError, ValueError):
+            self.logger.warning("Unable to load the render history file.")
             self.logger.debug("Error: ", exc_info=True)
-            return announcements
 
     # =============================================================================
-    def announcement_update_states(self, force: bool = False) -> None:
-        """Update the state values of each announcement.
+    def __spill_history__(self, force: bool = False) -> None:
+        """Save the render history (plugin prefs), at most once every HISTORY_SPILL_INTERVAL seconds unless forced.
 
-        Refreshes the custom state values of select announcements. The plugin checks every X seconds to see if any
-        announcements require a refresh, based on each announcement's individual refresh interval and the time elapsed
-        since it was last refreshed.
+        Args:
+            force (bool): Save the history even if it was saved recently.
+        """
+        enabled = bool(self.pluginPrefs.get('spillHistory', False))
+        if not enabled or (not force and time.monotonic() - self.history_spilled < HISTORY_SPILL_INTERVAL):
+            return
+
+        self.history_spilled = time.monotonic()
+        try:
+            self.history.save(f"{indigo.server.getInstallFolderPath()}{HISTORY_FILE}")
+        except OSError:
+            self.render_errors.error('historyFile', logging.WARNING, "Unable to save the render history file.")
+
+    # =============================================================================
+    def __stop_format_pool__(self) -> None:
+        """Shut down the formatting process pool, if it's running."""
+        if self.format_pool is not None:
+            self.format_pool.shutdown(wait=False, cancel_futures=True)
+            self.format_pool = None
+
+    # =============================================================================
+    def __due_announcements__(self, dev: indigo.Device, announcements: dict, now: dt.datetime) -> list:
+        """List the announcements of a device that are due to be refreshed.
+
+        An announcement is due when its scheduled refresh time has passed or a forced refresh of it is still pending.
 
         Args:
-            force (bool): If True, update all announcements regardless of their scheduled refresh time.
+            dev (indigo.Device): The announcements device.
+            announcements (dict): The full announcements data dict.
+            now (dt.datetime): The time of the current pass.
+
+        Returns:
+            list: `(deadline, device ID, announcement ID)` tuples.
         """
-        self.logger.debug("Updating announcement states")
+        due        = []
+        quarantine = self.quarantine
 
-        # Load the announcements file and convert to a dict
-        announcements = self.__announcement_file_read__()
+        for key, announcement in announcements.get(dev.id, {}).items():
+            if (dev.id, key) in quarantine:
+                continue
 
-        for dev in indigo.devices.iter('self'):
+            try:
+                update_time = _refresh_deadline(announcement)
+
+            except ValueError:
+                self.render_errors.error(
+                    (dev.id, key), logging.WARNING, "Error coercing the update time of %s.", announcement['Name']
+                )
+                update_time = now - dt.timedelta(minutes=1)
+
+            # If it's time for an announcement to be refreshed (or a force refresh was requested).
+            if now >= update_time or (dev.id, key) in self.forced_refresh:
+                due.append((update_time, dev.id, key))
+
+        return due
+
+    # =============================================================================
+    def __update_announcement__(self, dev_id: int, key: int, announcement: dict, deadline: dt.datetime,
+                                now: dt.datetime, rendered: dict = None) -> dict | None:
+        """Render an announcement and schedule its next refresh.
+
+        Normally the next refresh is one interval from now, moved toward the announcement's phase slot within the
+        interval (see scheduling.leveled_refresh_time) by up to the configured tolerance. This keeps announcements that
+        were refreshed together, such as after a forced refresh, from coming due in the same pass forever after.
+
+        If one or more whole intervals have been missed (e.g., the server was asleep), the announcement's catch-up
+        policy applies:
+
+            once: render once and carry on from now (the default).
+            skip: don't render; resume at the first slot after now.
+            all:  render once per missed slot, one slot per pass, up to CATCH_UP_LIMIT slots.
+
+        A forced refresh always renders.
+
+        Args:
+            dev_id (int): The announcements device ID.
+            key (int): The announcement ID.
+            announcement (dict): The announcement's stored data. Its nextRefresh value is advanced in place.
+            deadline (dt.datetime): The time the announcement was due.
+            now (dt.datetime): The time of the current pass.
+            rendered (dict): Announcements already rendered this pass, keyed by template text. A new render is added to
+                it, so other announcements with the same text share it.
+
+        Returns:
+            dict | None: The state update for the announcement's device state, or None if the render was skipped.
+        """
+        interval = _refresh_interval(announcement)
+        policy   = announcement.get('CatchUp', 'once')
+        missed   = int((now - deadline).total_seconds() // interval) if now >= deadline else 0
+        forced   = (dev_id, key) in self.forced_refresh
+        result   = None
+
+        if missed and policy == 'skip' and not forced:
+            next_update = deadline + dt.timedelta(seconds=(missed + 1) * interval)
+            if self.logger.isEnabledFor(THREADDEBUG):
+                self.logger.threaddebug("%s skipped %s missed refreshes.", announcement['Name'], missed)
+
+        else:
+            rendering = time.perf_counter()
+            text      = announcement['Announcement']
+            if rendered is not None and text in rendered:
+                result = rendered[text]
+            else:
+                result = self.__process_announcement__(text)
+                if rendered is not None:
+                    rendered[text] = result
+            self.history.record((dev_id, key), time.time(), result, (time.perf_counter() - rendering) * 1000)
+
+            if missed and policy == 'all' and not forced:
+                oldest      = now - dt.timedelta(seconds=CATCH_UP_LIMIT * interval)
+                next_update = max(deadline + dt.timedelta(seconds=interval), oldest)
+            else:
+                # Always advance nextRefresh so a forced update doesn't re-fire every cycle.
+                tolerance   = interval * float(self.pluginPrefs.get('refreshTolerance', 50)) / 100
+                next_update = dt.datetime.fromtimestamp(
+                    leveled_refresh_time(now.timestamp(), interval, f"{dev_id}:{key}", tolerance)
+                )
+            if self.logger.isEnabledFor(THREADDEBUG):
+                self.logger.threaddebug("%s updated.", announcement['Name'])
+
+        announcement['nextRefresh'] = next_update.isoformat(sep=' ')
+
+        if result is None:
+            return None
+        return {'key': announcement['Name'].replace(' ', '_'), 'value': result}
+
+    # =============================================================================
+    def __refresh_device__(self, dev: indigo.Device, items: list, announcements: dict, now: dt.datetime,
+                           stop_at: float | None, first: tuple, rendered: dict = None) -> tuple:
+        """Refresh an announcements device's due announcements and push its new states to the server.
+
+        May run on a render pool worker. The shared plugin state it uses (the render cache, history, metrics, pacing
+        controller, render error log and trigger index) is thread-safe; the announcements attempted and their new
+        refresh times are returned and merged by the caller on the pass thread. An error is logged and doesn't affect
+        other devices.
+
+        Args:
+            dev (indigo.Device): The announcements device.
+            items (list): The device's due `(deadline, dev_id, key)` tuples in deadline order.
+            announcements (dict): The announcements snapshot to render from.
+            now (dt.datetime): The time of the refresh pass.
+            stop_at (float | None): The `time.monotonic()` value at which the pass's time budget runs out.
+            first (tuple): The pass's most overdue item, which is refreshed even when the budget has run out.
+            rendered (dict): Announcements already rendered this pass, keyed by template text.
 
-            if dev.enabled:
+        Returns:
+            tuple: The `(dev_id, key)` pairs attempted and a dict of their new `nextRefresh` values.
+        """
+        attempted = []
+        refreshed = {}
+        states    = []
 
-                # Salutations device
-                if dev.deviceTypeId == 'salutationsDevice':
-                    self.__update_salutations_device__(dev)
+        try:
+            for item in items:
+                deadline, dev_id, key = item
+                if stop_at is not None and item != first and time.monotonic() >= stop_at:
+                    break
 
-                # Announcements device
-                elif dev.deviceTypeId == 'announcementsDevice':
-                    announcements = self.__update_announcements_device__(dev, announcements, force)
+                attempted.append((dev_id, key))
+                try:
+                    announcement = dict(announcements[dev_id][key])
+                    state        = self.__update_announcement__(dev_id, key, announcement, deadline, now, rendered)
+                    refreshed[(dev_id, key)] = announcement['nextRefresh']
+                    if state:
+                        states.append(state)
+                except (KeyError, ValueError, ZeroDivisionError):
+                    self.render_errors.error((dev_id, key), logging.DEBUG, "Unable to refresh announcement %s.", key)
+                    if self.triggers.watching(dev_id):
+                        name = announcements.get(dev_id, {}).get(key, {}).get('Name', "")
+                        self.__fire_triggers__(RENDER_FAILED, dev_id, name.replace(' ', '_'))
+
+            if states:
+                # The device object still holds the states from before this pass, so only real changes are dispatched.
+                changed = []
+                if self.triggers.watching(dev.id):
+                    changed = [state['key'] for state in states if dev.states.get(state['key']) != state['value']]
+                states.append({'key': 'onOffState', 'value': True, 'uiValue': " "})
+                pushed = time.perf_counter()
+                dev.updateStatesOnServer(states)
+                self.pacing.observe(time.perf_counter() - pushed)
+                self.metrics.inc('state_updates_total')
+                self.metrics.inc('states_sent_total', len(states))
+                for state_name in changed:
+                    self.__fire_triggers__(ANNOUNCEMENT_CHANGED, dev.id, state_name)
+
+        except Exception:  # noqa - one device's failure mustn't stop the others from refreshing
+            self.render_errors.error(dev.id, logging.WARNING, "Unable to refresh announcements for %s.", dev.name)
+            attempted = [(dev_id, key) for _, dev_id, key in items]
+            if self.triggers.watching(dev.id):
+                self.__fire_triggers__(RENDER_FAILED, dev.id)
+
+        return attempted, refreshed
 
-        # Open the announcements file and save the updated dict.
-        self.__announcement_file_write__(announcements)
+    # =============================================================================
+    def announcement_update_states(self, force: bool = False) -> None:
+        """Update the state values of each announcement.
+
+        Refreshes the custom state values of select announcements. The plugin checks every X seconds to see if any
+        announcements require a refresh, based on each announcement's individual refresh interval and the time elapsed
+        since it was last refreshed.
+
+        The work done in a single pass is bounded by the tick budget (plugin prefs). Due announcements are refreshed in
+        deadline order; any that don't fit in the budget stay due and are carried over to the next pass, which the
+        concurrent thread runs after a short pause rather than a full refresh interval. With more than one render
+        worker (plugin prefs), devices are rendered and updated concurrently. With formatting processes (plugin prefs),
+        the formatting pipeline runs in a process pool.
+
+        Passes are serialized behind refresh_lock, so a pass started while another is running waits for it to finish.
+
+        Args:
+            force (bool): If True, update all announcements regardless of their scheduled refresh time.
+        """
+        # Passes are serialized: the concurrent thread, dialog callbacks and the refresh actions can all start one, and
+        # each pass reads and updates the forced refreshes, the pass statistics and the refresh times.
+        with self.refresh_lock:
+            # Render from the current snapshot; only the new refresh times are written back.
+            started       = time.monotonic()
+            announcements = self.store.snapshot().data
+            now           = dt.datetime.now()
+            devices       = {}
+            due           = []
+            refreshed     = {}
+
+            for dev in indigo.devices.iter('self'):
+
+                if dev.enabled:
+
+                    # Salutations device - only updated when a period boundary has been reached.
+                    if dev.deviceTypeId == 'salutationsDevice':
+                        schedule = self.salutation_schedule.get(dev.id)
+                        if force or schedule is None or time.time() >= schedule['next']:
+                            self.__update_salutations_device__(dev)
+
+                    # Announcements device
+                    elif dev.deviceTypeId == 'announcementsDevice':
+                        devices[dev.id] = dev
+                        if force:
+                            self.forced_refresh.update((dev.id, key) for key in announcements.get(dev.id, {}))
+                        due.extend(self.__due_announcements__(dev, announcements, now))
+
+            # Refresh in deadline order until the budget runs out. The work budget is applied up front; the time budget
+            # is checked before each render.
+            due.sort()
+            time_budget = float(self.pluginPrefs.get('tickTimeBudget', 1000)) / 1000
+            work_budget = int(self.pluginPrefs.get('tickWorkBudget', 0))
+            workers     = int(self.pluginPrefs.get('renderWorkers', 1))
+            work_limit  = self.pacing.work_limit(len(due))  # sheds the least overdue work while the server is slow
+            selected    = due[:min(work_budget, work_limit) if work_budget else work_limit]
+            stop_at     = time.monotonic() + time_budget if time_budget else None
+
+            # Each device's due announcements, with the devices in order of their most overdue announcement.
+            by_device = {}
+            for item in selected:
+                by_device.setdefault(item[1], []).append(item)
+
+            # Announcements with identical text, on any device, are rendered once per pass and the result is shared.
+            # With formatting processes, the whole pass is formatted in the process pool up front.
+            texts = [announcements[dev_id][key]['Announcement'] for _, dev_id, key in selected]
+            self.tick_stats['shared']  += len(texts) - len(set(texts))
+            self.tick_stats['renders'] += len(texts)
+            rendered = {}
+            if int(self.pluginPrefs.get('formatWorkers', 0)) > 0 and selected:
+                rendered = self.__prerender_announcements__(texts)
+
+            # Devices are independent of each other, so with more than one render worker they're refreshed concurrently.
+            # Results are merged back in device order either way.
+            jobs = [
+                (devices[dev_id], items, announcements, now, stop_at, selected[0], rendered)
+                for dev_id, items in by_device.items()
+            ]
+            if workers > 1 and len(jobs) > 1:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Render") as pool:
+                    results = list(pool.map(lambda job: self.__refresh_device__(*job), jobs))
+            else:
+                results = [self.__refresh_device__(*job) for job in jobs]
+
+            attempted = set()
+            for done_items, device_refreshed in results:
+                attempted.update(done_items)
+                refreshed.update(device_refreshed)
+            self.forced_refresh.difference_update(attempted)
+            done = len(attempted)
+
+            # Carry-over metrics. Lateness is measured against the deadlines of the announcements refreshed this pass
+            # and of those still waiting.
+            backlog  = [item for item in due if (item[1], item[2]) not in attempted]
+            lateness = max([(now - deadline).total_seconds() for deadline, _, _ in due] + [0.0])
+            self.refresh_backlog = len(backlog)
+            self.tick_histogram[0 if not done else 2 ** (done.bit_length() - 1)] += 1
+            self.tick_stats['backlog']      = len(backlog)
+            self.tick_stats['max_backlog']  = max(self.tick_stats['max_backlog'], len(backlog))
+            self.tick_stats['lateness']     = lateness
+            self.tick_stats['max_lateness'] = max(self.tick_stats['max_lateness'], lateness)
+
+            # Save the new refresh times. The check and the write both happen inside the store's write lock:
+            # announcements deleted while this pass was running, or whose refresh time was changed meanwhile (e.g., by
+            # an edit), are left alone.
+            previous = {(dev_id, key): announcements[dev_id][key].get('nextRefresh') for dev_id, key in refreshed}
+
+            def advance(current: dict) -> None:
+                for (dev_id_, key_), next_refresh in refreshed.items():
+                    announcement = current.get(dev_id_, {}).get(key_)
+                    if announcement is not None and announcement.get('nextRefresh') == previous[(dev_id_, key_)]:
+                        announcement['nextRefresh'] = next_refresh
+
+            if refreshed:
+                self.store.mutate(advance)
+            announcements = self.store.snapshot().data
+
+            # Note when the next announcement comes due so the concurrent thread can wake up for it.
+            deadlines = []
+            for dev_id in devices:
+                for announcement in announcements.get(dev_id, {}).values():
+                    try:
+                        deadlines.append(_refresh_deadline(announcement))
+                    except ValueError:
+                        pass
+            self.next_refresh_due = min(deadlines, default=None)
+
+            # One summary line per pass. The details of each refresh are logged at the THREADDEBUG level.
+            elapsed = time.monotonic() - started
+            errors  = self.render_errors.take_errors()
+            self.pacing.end_pass(elapsed, time_budget or self.update_frequency)
+            self.metrics.inc('ticks_total')
+            self.metrics.inc('errors_total', errors)
+            self.metrics.observe('tick_seconds', elapsed)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                pacing = self.pacing
+                self.logger.debug(
+                    "Refresh pass: %s due, %s refreshed, %s carried over, %s errors in %.1f ms.%s",
+                    len(due), done, len(backlog), errors, elapsed * 1000,
+                    f" Paced x{pacing.stretch:.1f} (server {pacing.server_latency * 1000:.0f} ms)."
+                    if pacing.stretch > 1 else ""
+                )
 
     # =============================================================================
     def announcement_update_states_now(self) -> None:
@@ -904,7 +2310,10 @@ class Plugin(indigo.PluginBase):
         scheduled refresh time.
         """
         self.announcement_update_states(force=True)
-        self.logger.info("All announcements updated.")
+        if self.refresh_backlog:
+            self.logger.info("Announcements updating (%s remaining).", self.refresh_backlog)
+        else:
+            self.logger.info("All announcements updated.")
 
     # =============================================================================
     def announcement_update_states_now_action(self, action: indigo.actionGroup=None):  # noqa
@@ -962,27 +2371,7 @@ class Plugin(indigo.PluginBase):
         Returns:
             str: The formatted result string.
         """
-        match1: str = match.group(1)  # the string to be formatted
-        match2: str = match.group(2)  # the format specification
-        match1 = match1.replace('<<', '')
-        match2 = match2.replace('>>', '')
-
-        # Current time conversions specified with ct: ...
-        if match2.startswith('ct:'):
-            result = self.format_current_time(match1, match2)
-
-        # Datetime conversions specified with dt: ...
-        elif match2.startswith('dt:'):
-            result = self.format_datetime(match1, match2)
-
-        # Number conversions specified with n: ...
-        elif match2.startswith('n:'):
-            result = self.format_number(match1, match2)
-
-        else:
-            result = f"{match1} {match2}"
-
-        return result
+        return formatting.format_digits(match)
 
     # =============================================================================
     def format_current_time(self, match1: str, match2: str) -> str:  # noqa
@@ -997,16 +2386,7 @@ class Plugin(indigo.PluginBase):
         Returns:
             str: The formatted current time string.
         """
-        match2 = match2.replace('ct:', '')
-
-        try:
-            _validate_format_spec(match2, '.,%:-aAwdbBmyYHIpMSfzZjUWcxX ')
-            match1 = dt.datetime.now()
-            return f"{match1:{match2}}"
-
-        except ValueError:
-            self.logger.debug("Error: ", exc_info=True)
-            return f"Unallowable datetime specifiers: {match1} {match2}"
+        return formatting.format_current_time(match1, match2)
 
     # =============================================================================
     def format_datetime(self, match1: str, match2: str) -> str:  # noqa
@@ -1021,19 +2401,7 @@ class Plugin(indigo.PluginBase):
         Returns:
             str: The formatted datetime string.
         """
-        match2 = match2.replace('dt:', '')
-
-        try:
-            _validate_format_spec(match2, '.,%:-aAwdbBmyYHIpMSfzZjUWcxX ')
-            if match1 == 'now':
-                match1 = dt.datetime.now()
-            else:
-                match1 = parser.parse(match1)
-            return f"{match1:{match2}}"
-
-        except ValueError:
-            self.logger.debug("Error: ", exc_info=True)
-            return f"Unallowable datetime specifiers: {match1} {match2}"
+        return formatting.format_datetime(match1, match2)
 
     # =============================================================================
     def format_number(self, match1: str, match2: str) -> str:  # noqa
@@ -1048,25 +2416,17 @@ class Plugin(indigo.PluginBase):
         Returns:
             str: The formatted number string.
         """
-        match2 = match2.replace('n:', '')
-
-        try:
-            _validate_format_spec(match2, '0123456789')
-            return f"{float(match1):0.{int(match2)}f}"
-
-        except ValueError:
-            self.logger.debug("Error: ", exc_info=True)
-            return f"Unallowable numeric specifiers: {match1} {match2}"
+        return formatting.format_number(match1, match2)
 
     # =============================================================================
-    @staticmethod
-    def generator_announcement_list(fltr: str="", values_dict: indigo.Dict=None, type_id: str="", target_id: int=0) -> list:  # noqa
+    def generator_announcement_list(self, fltr: str="", values_dict: indigo.Dict=None, type_id: str="", target_id: int=0) -> list:  # noqa
         """Generate a list of states for Indigo controls.
 
-        Returns a list of states for the selected plugin device.
+        Returns a list of states for the selected plugin device. The states of an announcements device are served from
+        the announcements name index, sorted by name; other devices (e.g., salutations devices) list their states.
 
         Args:
-            fltr (str): Optional filter string.
+            fltr (str): Optional filter string; only announcements whose names contain it are listed.
             values_dict (indigo.Dict): The dialog's current values.
             type_id (str): The device type identifier.
             target_id (int): The target device ID.
@@ -1077,11 +2437,14 @@ class Plugin(indigo.PluginBase):
         try:
             announcement_id = int(values_dict['announcementDeviceToRefresh'])
             if announcement_id in indigo.devices:
-                result = [
-                    (state, state.replace("_", " "))
-                    for state in indigo.devices[announcement_id].states
-                    if 'onOffState' not in state
-                ]
+                dev = indigo.devices[announcement_id]
+                if dev.deviceTypeId == 'announcementsDevice':
+                    result = [
+                        (name.replace(' ', '_'), name.replace('_', ' '))
+                        for _, name in self.store.names(announcement_id).search(fltr)
+                    ]
+                else:
+                    result = [(state, state.replace("_", " ")) for state in dev.states if 'onOffState' not in state]
             else:
                 result = [('value', 'Value')]
 
@@ -1111,10 +2474,11 @@ class Plugin(indigo.PluginBase):
     def generator_dev_var(self, fltr: str="", values_dict: indigo.Dict=None, type_id: str="", target_id: int=0) -> list:  # noqa
         """Generate a list of Indigo devices and variables.
 
-        Collects IDs and names for all Indigo devices and variables in the form: [(id, name), ...].
+        Collects IDs and names for all Indigo devices and variables in the form: [(id, name), ...]. The list is served
+        from the catalog, which is built on first use and kept up to date from device and variable changes.
 
         Args:
-            fltr (str): Optional filter string.
+            fltr (str): Optional filter string; only devices and variables whose names contain it are listed.
             values_dict (indigo.Dict): The dialog's current values.
             type_id (str): The device type identifier.
             target_id (int): The target device ID.
@@ -1122,7 +2486,9 @@ class Plugin(indigo.PluginBase):
         Returns:
             list: List of (id, name) tuples for all devices and variables.
         """
-        return self.Fogbert.deviceAndVariableList()
+        if not self.catalog.built:
+            self.catalog.build(indigo.devices.iter(), indigo.variables.iter())
+        return self.catalog.devices_and_variables(fltr)
 
     # =============================================================================
     def generator_list(self, fltr: str="", values_dict: indigo.Dict=None, type_id: str="", target_id: int=0) -> list:  # noqa
@@ -1130,8 +2496,12 @@ class Plugin(indigo.PluginBase):
 
         Populates the announcement list based on the device's stored data. The source dict has the form::
 
-            {'announcement ID': {'Announcement': "...", 'nextRefresh': "YYYY-MM-DD HH:MM:SS",
-                                 'Name': "...", 'Refresh': "minutes"}}
+            {'announcement ID': {'Announcement': "...", 'nextRefresh': "YYYY-MM-DD HH:MM:SS.ffffff",
+                                 'Name': "...", 'RefreshSeconds': "seconds", 'CatchUp': "once|skip|all"}}
+
+        The list is served from the announcements name index and filtered by the dialog's search field (or `fltr`):
+        names starting with the search text are listed first, then names containing it. At most
+        ANNOUNCEMENT_LIST_LIMIT announcements are listed.
 
         Args:
             fltr (str): Optional filter string.
@@ -1142,17 +2512,13 @@ class Plugin(indigo.PluginBase):
         Returns:
             list: List of (announcement_id, announcement_name) tuples, sorted by name.
         """
-        # Open the announcements file and load the contents
-        infile = self.__announcement_file_read__()
-
-        # Sort the dict and create a list of tuples for the device config list control.
-        try:
-            announcements = [(key, infile[target_id][key]['Name']) for key in infile[target_id]]
-        except KeyError:
-            announcements = []
+        search        = (values_dict or {}).get('announcementSearch', '') or fltr
+        announcements = self.store.names(target_id).search(search.strip())
 
-        if len(announcements) > 0:
-            announcements = sorted(announcements, key=lambda y: y[1])
+        if len(announcements) > ANNOUNCEMENT_LIST_LIMIT:
+            hidden        = len(announcements) - ANNOUNCEMENT_LIST_LIMIT
+            announcements = announcements[:ANNOUNCEMENT_LIST_LIMIT]
+            announcements.append(('-1', f"%%disabled:{hidden} more. Search to narrow the list.%%"))
 
         return announcements
 
@@ -1172,7 +2538,16 @@ class Plugin(indigo.PluginBase):
             list: List of state or value options for the selected device/variable.
         """
         id_number = values_dict.get('devVarMenu', 'None')
-        return self.Fogbert.generatorStateOrValue(dev_id=id_number)
+
+        try:
+            states = self.catalog.states(int(id_number)) if self.catalog.built else None
+        except ValueError:
+            states = None
+
+        # Nothing (or a menu header) is selected, or the catalog isn't built yet.
+        if states is None:
+            return self.Fogbert.generatorStateOrValue(dev_id=id_number)
+        return states
 
     # =============================================================================
     def generator_substitutions(self, values_dict: indigo.Dict=None, type_id: str="", target_id: int=0) -> indigo.Dict:  # noqa
@@ -1238,8 +2613,8 @@ class Plugin(indigo.PluginBase):
 
         # If it exists under the old location, move it over.
         if os.path.isfile(old_file):
+            import shutil  # noqa - only needed for legacy installs
             os.rename(old_file, self.announcements_file)
-            self.sleep(1)
             shutil.rmtree(path=working_directory, ignore_errors=True)
 
         # If there's no file at all, lets establish a new empty Announcements dict.
@@ -1249,7 +2624,52 @@ class Plugin(indigo.PluginBase):
                 "should be present, reach out for assistance or consult server back-up files."
             )
             self.__announcement_file_write__({})
-            self.sleep(1)
+
+    # =============================================================================
+    def log_plugin_diagnostics(self, action: indigo.actionGroup=None) -> None:  # noqa
+        """Log plugin performance diagnostics when "Display Plugin Diagnostics" is selected from the plugin menu."""
+        cache = self.render_cache
+        self.logger.info("Render cache: %s of %s entries", len(cache), cache.max_entries)
+        self.logger.info(
+            "Render cache: %s hits, %s misses, hit ratio %.1f%%", cache.hits, cache.misses, cache.hit_ratio * 100
+        )
+        self.speech_queue_status_action()
+        stats = self.tick_stats
+        self.logger.info(
+            "Refresh backlog: %s carried over (max %s); lateness %.1f s (max %.1f s)",
+            stats['backlog'], stats['max_backlog'], stats['lateness'], stats['max_lateness']
+        )
+        histogram = ", ".join(
+            f"{bucket if bucket < 2 else f'{bucket}-{bucket * 2 - 1}'}: {count}"
+            for bucket, count in sorted(self.tick_histogram.items())
+        )
+        self.logger.info("Announcements refreshed per pass (passes): %s", histogram or "none")
+        templates = self.template_index
+        distinct  = len({template.template_id for template in templates.values()})
+        self.logger.info(
+            "Templates: %s announcements, %s distinct (dedup x%.1f)",
+            len(templates), distinct, len(templates) / distinct if distinct else 1.0
+        )
+        renders = stats['renders'] - stats['shared']
+        self.logger.info(
+            "Renders: %s announcements from %s renders (dedup x%.1f)",
+            stats['renders'], renders, stats['renders'] / renders if renders else 1.0
+        )
+        self.logger.info("Render and speak latency: %s", self.speak_latency.summary())
+        self.logger.info("Speech queue wait: %s", self.speech_queue.wait.summary())
+        self.logger.info("Startup: %.0f ms (target %.0f ms)", self.startup_seconds * 1000, STARTUP_TARGET * 1000)
+        self.logger.info("Prewarm: %.1f s", self.prewarm_seconds)
+        pacing = self.pacing
+        self.logger.info(
+            "Pacing: stretch x%.1f, rest %.2f s, server latency %.0f ms, pass %.0f ms, %s overruns",
+            pacing.stretch, pacing.gap, pacing.server_latency * 1000, pacing.pass_seconds * 1000, pacing.overruns
+        )
+        self.logger.info("Quarantined announcements (missing devices or variables): %s", len(self.quarantine))
+        history = self.history
+        self.logger.info(
+            "Render history: %s renders, %s distinct, %.0f KB of %.0f KB",
+            len(history), history.texts, history.bytes / 1024, history.max_bytes / 1024
+        )
 
     # =============================================================================
     def log_plugin_environment(self, action: indigo.actionGroup=None) -> None:  # noqa
@@ -1286,4 +2706,4 @@ class Plugin(indigo.PluginBase):
         Returns:
             str: The announcement string with all formatting substitutions applied.
         """
-        return re.sub(r'(<<.*?), *(((ct)|(dt)|(n)):.*?>>)', self.format_digits, announcement)
+        return formatting.substitution_regex(announcement)
@@ -1,5 +1,21 @@
 kDefaultPluginPrefs = {
+    'adaptiveTick': True,
+    'formatWorkers': "0",
+    'metricsFile': "",
+    'metricsPort': "0",
     'pluginRefresh': "15",
+    'recordRenders': False,
+    'refreshTolerance': "50",
+    'renderWorkers': "1",
     'saveToVariable': False,
+    'serverLatencyTarget': "250",
     'showDebugLevel': "30",
+    'spillHistory': False,
+    'speechDropPolicy': "lowest",
+    'speechGap': "0",
+    'speechQueueDepth': "10",
+    'tickMaxGap': "60",
+    'tickTimeBudget': "1000",
+    'tickWorkBudget': "0",
+    'traceLogging': False,
 }
@@ -0,0 +1,123 @@
+"""
+Render recording for offline benchmarking
+
+When recording is enabled (plugin prefs), each announcement render appends the template and the resolved values of the
+device states and variables it references to a local file. Renders served from the render cache aren't recorded. The
+file is JSON lines: a template is written once, as `{"template": n, "text": "..."}`, and each render of it as
+`[n, timestamp, [value, ...]]`, with the values in the order of the template's references. `load()` reads a recording
+back for the replay harness (tests/replay.py).
+"""
+
+import json
+import logging
+import os
+import threading
+
+from templates import CompiledTemplate, compile_template
+
+LOGGER = logging.getLogger("Plugin")
+
+
+class RenderRecorder:
+    """Appends announcement renders to a recording file, up to a size limit."""
+
+    def __init__(self, path: str, max_bytes: int):
+        """Recorder initialization.
+
+        Args:
+            path (str): The recording file. New renders are appended to an existing recording.
+            max_bytes (int): Recording stops once the file reaches this size.
+        """
+        self.closed     = False
+        self.max_bytes  = max_bytes
+        self.path       = path
+        self.records    = 0
+        self._file      = None
+        self._lock      = threading.Lock()
+        self._size      = 0
+        self._templates = {}
+
+    # =============================================================================
+    def record(self, template: CompiledTemplate, values: tuple, timestamp: float) -> None:
+        """Append a render. Ignored once the recorder is closed or the size limit is reached.
+
+        Args:
+            template (CompiledTemplate): The compiled announcement template.
+            values (tuple): The resolved values of the template's references, in order.
+            timestamp (float): The render time as seconds since the epoch.
+        """
+        with self._lock:
+            if self.closed or self._size >= self.max_bytes:
+                return
+            try:
+                if self._file is None:
+                    self.__open__()
+                lines = []
+                if template.text not in self._templates:
+                    self._templates[template.text] = len(self._templates)
+                    lines.append(json.dumps({'template': self._templates[template.text], 'text': template.text}))
+                lines.append(json.dumps([self._templates[template.text], round(timestamp, 3), list(values)]))
+                data = "\n".join(lines) + "\n"
+                self._file.write(data)
+                self._size   += len(data.encode("utf-8"))
+                self.records += 1
+            except OSError:
+                LOGGER.warning("Unable to write to the render recording. Recording stopped.")
+                LOGGER.debug("Error: ", exc_info=True)
+                self._size = self.max_bytes
+                return
+
+            if self._size >= self.max_bytes:
+                LOGGER.info("The render recording has reached its size limit. Recording stopped.")
+
+    # =============================================================================
+    def close(self) -> None:
+        """Close the recording file."""
+        with self._lock:
+            self.closed = True
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # =============================================================================
+    def __open__(self) -> None:
+        """Open the file for appending. Must be called with the lock held.
+
+        A new session starts its own template numbering, so each session begins with a marker line.
+        """
+        marker     = json.dumps({'session': True}) + "\n"
+        self._size = (os.path.getsize(self.path) if os.path.isfile(self.path) else 0) + len(marker)
+        self._file = open(self.path, mode='a', encoding="utf-8", buffering=1)
+        self._file.write(marker)
+
+
+# =============================================================================
+def load(path: str) -> list:
+    """Read a recording.
+
+    Args:
+        path (str): The recording file.
+
+    Returns:
+        list: `(template text, timestamp, {reference: value})` tuples in recording order, where each reference is a
+            `('d', dev_id, state)` or `('v', var_id)` tuple as in CompiledTemplate.references.
+    """
+    renders   = []
+    templates = {}
+
+    with open(path, mode='r', encoding="utf-8") as infile:
+        for line in infile:
+            try:
+                entry = json.loads(line)
+            except json.decoder.JSONDecodeError:
+                continue  # a render cut short when the plugin stopped
+            if isinstance(entry, dict):
+                if entry.get('session'):
+                    templates = {}
+                else:
+                    templates[entry['template']] = compile_template(entry['text'])
+            elif entry[0] in templates:
+                template = templates[entry[0]]
+                renders.append((template.text, entry[1], dict(zip(template.references, entry[2]))))
+
+    return renders
@@ -0,0 +1,85 @@
+"""
+Render result memoization for announcements
+
+Rendered announcement strings are cached under a key built from the compiled template, the resolved device state and
+variable values the template references, and the template's time bucket. When none of those have changed since the
+last render, the previous result is returned without substituting or running the formatter pipeline.
+"""
+
+import collections
+import threading
+
+
+class RenderCache:
+    """A bounded, thread-safe LRU cache of rendered announcement strings."""
+
+    def __init__(self, max_entries: int = 512):
+        """Cache initialization.
+
+        Args:
+            max_entries (int): The maximum number of rendered strings to retain.
+        """
+        self.max_entries = max_entries
+        self.hits        = 0
+        self.misses      = 0
+        self._entries    = collections.OrderedDict()
+        self._lock       = threading.Lock()
+
+    # =============================================================================
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # =============================================================================
+    def __contains__(self, key: tuple) -> bool:
+        """Return True if `key` is cached. Unlike get(), this doesn't count as a lookup or refresh the entry."""
+        with self._lock:
+            return key in self._entries
+
+    # =============================================================================
+    def get(self, key: tuple) -> str | None:
+        """Return the cached render for `key`, or None if it isn't cached.
+
+        Args:
+            key (tuple): The render cache key.
+
+        Returns:
+            str | None: The previously rendered string.
+        """
+        with self._lock:
+            try:
+                result = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    # =============================================================================
+    def put(self, key: tuple, value: str) -> None:
+        """Save a rendered string, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key (tuple): The render cache key.
+            value (str): The rendered announcement string.
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # =============================================================================
+    def clear(self) -> None:
+        """Remove all cached renders and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self.hits   = 0
+            self.misses = 0
+
+    # =============================================================================
+    @property
+    def hit_ratio(self) -> float:
+        """Return the fraction of lookups that were served from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
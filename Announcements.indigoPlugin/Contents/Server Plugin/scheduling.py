@@ -0,0 +1,112 @@
+"""
+Scheduling helpers for plugin devices
+
+Salutations devices change their intro and outro at four wall-clock boundaries each day. Rather than re-evaluating the
+time of day on every refresh, the boundaries are computed once from the device props and the device is only updated
+when the next boundary is reached.
+
+Announcement refreshes are spread across each refresh interval by giving every announcement a deterministic phase
+offset within its interval, so announcements with the same interval don't all come due in the same pass.
+"""
+
+import datetime as dt
+import zlib
+
+SALUTATION_PERIODS = ('morning', 'afternoon', 'evening', 'night')
+
+SALUTATION_DEFAULTS = {
+    'morning':   ('5', 'Good morning.', 'Have a great morning.'),
+    'afternoon': ('12', 'Good afternoon.', 'Have a great afternoon.'),
+    'evening':   ('17', 'Good evening.', 'Have a great evening.'),
+    'night':     ('21', 'Good night.', 'Have a great night.'),
+}
+
+
+# =============================================================================
+def salutation_boundaries(props: dict) -> tuple:
+    """Build the salutation period table from a salutations device's props.
+
+    Args:
+        props (dict): The salutations device pluginProps.
+
+    Returns:
+        tuple: `(start_hour, period, intro, outro)` tuples in period order.
+    """
+    return tuple(
+        (
+            int(props.get(f"{period}Start", SALUTATION_DEFAULTS[period][0])),
+            period,
+            props.get(f"{period}MessageIn", SALUTATION_DEFAULTS[period][1]),
+            props.get(f"{period}MessageOut", SALUTATION_DEFAULTS[period][2]),
+        )
+        for period in SALUTATION_PERIODS
+    )
+
+
+# =============================================================================
+def salutation_period(now: dt.datetime, boundaries: tuple) -> tuple:
+    """Determine the salutation period in effect and when the next one begins.
+
+    Boundaries are local wall-clock times, so a boundary that falls inside a skipped DST hour is reached as soon as the
+    clock jumps past it, and a repeated hour does not fire twice. The period in effect before the first boundary of the
+    day is carried over from the previous night.
+
+    Args:
+        now (dt.datetime): The current local (naive) time.
+        boundaries (tuple): The period table returned by salutation_boundaries().
+
+    Returns:
+        tuple: The `(start_hour, period, intro, outro)` entry in effect and the datetime of the next boundary.
+    """
+    today   = now.date()
+    current = boundaries[-1]
+
+    for entry in boundaries:
+        if dt.datetime.combine(today, dt.time(entry[0], 0)) <= now:
+            current = entry
+        else:
+            return current, dt.datetime.combine(today, dt.time(entry[0], 0))
+
+    return current, dt.datetime.combine(today + dt.timedelta(days=1), dt.time(boundaries[0][0], 0))
+
+
+# =============================================================================
+def refresh_phase(key: str, interval: float) -> float:
+    """Return the deterministic phase offset of an announcement within its refresh interval.
+
+    Args:
+        key (str): A stable identifier for the announcement.
+        interval (float): The refresh interval in seconds.
+
+    Returns:
+        float: The offset in seconds, in the range [0, interval).
+    """
+    return zlib.crc32(key.encode('utf-8')) / 2 ** 32 * interval
+
+
+# =============================================================================
+def leveled_refresh_time(now: float, interval: float, key: str, tolerance: float) -> float:
+    """Return the next refresh time of an announcement, moved toward its phase slot.
+
+    The announcement's slots are the times `phase + k * interval` measured from the epoch. The next refresh is
+    nominally one interval from now; it is moved to the nearest slot, but by no more than `tolerance` seconds. Since
+    each refresh moves a little closer, announcements settle into their slots over a few intervals even with a small
+    tolerance.
+
+    Args:
+        now (float): The current time in seconds since the epoch.
+        interval (float): The refresh interval in seconds.
+        key (str): A stable identifier for the announcement.
+        tolerance (float): The maximum number of seconds the refresh may be moved.
+
+    Returns:
+        float: The next refresh time in seconds since the epoch.
+    """
+    target = now + interval
+    if interval <= 0 or tolerance <= 0:
+        return target
+
+    phase = refresh_phase(key, interval)
+    slot  = round((target - phase) / interval) * interval + phase
+    shift = max(-tolerance, min(tolerance, slot - target))
+    return target + shift
@@ -0,0 +1,202 @@
+"""
+Prioritized speech queue
+
+Announcements are spoken one at a time by a dedicated worker thread rather than being handed straight to
+`indigo.server.speak()`. Pending utterances are ordered by priority (lower numbers are spoken first) and then by
+arrival, identical pending utterances are coalesced, and the queue depth is bounded with a configurable drop policy.
+The sink that does the actual speaking is passed in, so the queue can be exercised with a stand-in that records calls.
+"""
+
+import itertools
+import logging
+import threading
+import time
+from typing import Callable
+
+from metrics import LatencyStats
+
+DROP_POLICIES = ('lowest', 'oldest', 'newest')
+
+PRIORITIES = {
+    'high': 0,
+    'normal': 1,
+    'low': 2,
+}
+
+
+class SpeechQueue:
+    """A bounded priority queue of utterances with a dedicated speaking thread."""
+
+    def __init__(self, sink: Callable[[str], None], max_depth: int = 10, drop_policy: str = 'lowest',
+                 gap: float = 0.0, logger: logging.Logger = None):
+        """Queue initialization.
+
+        Args:
+            sink (Callable[[str], None]): Called with each utterance; expected to block until speech is finished.
+            max_depth (int): The maximum number of pending utterances.
+            drop_policy (str): Which utterance to drop when the queue is full: the one with the `lowest` priority, the
+                `oldest` pending one, or the `newest` (the one being enqueued).
+            gap (float): Seconds of silence to leave between utterances.
+            logger (logging.Logger): The logger to report problems to.
+        """
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+
+        self.sink        = sink
+        self.max_depth   = max_depth
+        self.drop_policy = drop_policy
+        self.gap         = gap
+        self.logger      = logger or logging.getLogger(__name__)
+
+        self.coalesced = 0
+        self.dropped   = 0
+        self.spoken    = 0
+        self.wait      = LatencyStats()
+
+        self._condition = threading.Condition()
+        self._current   = None
+        self._pending   = []  # [priority, sequence, text, enqueued]
+        self._sequence  = itertools.count()
+        self._stopping  = False
+        self._thread    = None
+
+    # =============================================================================
+    def start(self) -> None:
+        """Start the speaking thread."""
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread   = threading.Thread(target=self._run, name="SpeechQueue", daemon=True)
+            self._thread.start()
+
+    # =============================================================================
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the speaking thread. Pending utterances are discarded.
+
+        Args:
+            timeout (float): Seconds to wait for the utterance in progress to finish.
+        """
+        with self._condition:
+            self._stopping = True
+            self._pending.clear()
+            self._condition.notify_all()
+            thread, self._thread = self._thread, None
+
+        if thread is not None:
+            thread.join(timeout)
+
+    # =============================================================================
+    def enqueue(self, text: str, priority: int = PRIORITIES['normal']) -> bool:
+        """Add an utterance to the queue.
+
+        If the same text is already pending, it isn't queued a second time; the pending utterance takes the more
+        urgent of the two priorities instead.
+
+        Args:
+            text (str): The text to be spoken.
+            priority (int): The utterance priority. Lower numbers are spoken first.
+
+        Returns:
+            bool: False if the utterance was dropped because the queue is full.
+        """
+        with self._condition:
+            for item in self._pending:
+                if item[2] == text:
+                    item[0] = min(item[0], priority)
+                    self.coalesced += 1
+                    return True
+
+            item = [priority, next(self._sequence), text, time.monotonic()]
+
+            if len(self._pending) >= self.max_depth:
+                if self.drop_policy == 'newest':
+                    victim = item
+                elif self.drop_policy == 'oldest':
+                    victim = min(self._pending, key=lambda pending: pending[1])
+                else:
+                    # The least urgent utterance, and the most recent one among equals.
+                    victim = max(self._pending + [item], key=lambda pending: (pending[0], pending[1]))
+
+                self.dropped += 1
+                self.logger.warning("Speech queue full; dropping: %s", victim[2])
+
+                if victim is item:
+                    return False
+                self._pending.remove(victim)
+
+            self._pending.append(item)
+            self._condition.notify_all()
+            return True
+
+    # =============================================================================
+    def flush(self) -> int:
+        """Discard all pending utterances. The utterance in progress is not interrupted.
+
+        Returns:
+            int: The number of utterances discarded.
+        """
+        with self._condition:
+            count = len(self._pending)
+            self._pending.clear()
+            self._condition.notify_all()
+            return count
+
+    # =============================================================================
+    def join(self, timeout: float = None) -> bool:
+        """Wait until the queue is empty and nothing is being spoken.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait.
+
+        Returns:
+            bool: True if the queue drained before the timeout.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and self._current is None, timeout)
+
+    # =============================================================================
+    def status(self) -> dict:
+        """Return a snapshot of the queue state.
+
+        Returns:
+            dict: The current utterance, the pending utterances in speaking order, and the queue counters.
+        """
+        with self._condition:
+            return {
+                'speaking': self._current,
+                'pending': [item[2] for item in sorted(self._pending)],
+                'depth': len(self._pending),
+                'max_depth': self.max_depth,
+                'spoken': self.spoken,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+            }
+
+    # =============================================================================
+    def _run(self) -> None:
+        """Speak pending utterances in priority order until stopped."""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._stopping)
+                if self._stopping:
+                    return
+                item = min(self._pending)
+                self._pending.remove(item)
+                self._current = item[2]
+                self.wait.record(time.monotonic() - item[3])
+
+            try:
+                self.sink(item[2])
+            except Exception:  # noqa - a failed utterance must not take down the speaking thread
+                self.logger.warning("Unable to speak: %s", item[2])
+                self.logger.debug("Error: ", exc_info=True)
+
+            with self._condition:
+                self._current = None
+                self.spoken += 1
+                self._condition.notify_all()
+
+                # Leave the configured gap before the next utterance (stop() cuts it short).
+                if self.gap > 0:
+                    self._condition.wait_for(lambda: self._stopping, self.gap)
@@ -0,0 +1,144 @@
+"""
+Announcements store
+
+The announcements database is held in memory as an immutable, versioned snapshot. Readers (dialog list generators,
+state list definitions, rendering) take the current snapshot without locking and always see a consistent database.
+Writers go through `mutate()`, which serializes changes behind a lock, applies each change to a private working copy of
+the current snapshot, persists it, and then publishes it as the next snapshot. The file is only read when the store is
+loaded, so a change made by a dialog callback can no longer be overwritten by a refresh pass writing back a stale copy.
+"""
+
+import threading
+from types import MappingProxyType
+from typing import Any, Callable, NamedTuple
+
+from name_index import NameIndex
+
+
+class Snapshot(NamedTuple):
+    """An immutable view of the announcements database."""
+    version: int
+    data: MappingProxyType
+
+
+# =============================================================================
+def freeze(announcements: dict) -> MappingProxyType:
+    """Return a read-only copy of an announcements dict.
+
+    Args:
+        announcements (dict): The announcements data keyed by device ID, then announcement ID.
+
+    Returns:
+        MappingProxyType: The read-only copy.
+    """
+    return MappingProxyType({
+        dev_id: MappingProxyType({key: MappingProxyType(dict(value)) for key, value in device_announcements.items()})
+        for dev_id, device_announcements in announcements.items()
+    })
+
+
+# =============================================================================
+def thaw(announcements: MappingProxyType) -> dict:
+    """Return a mutable copy of a (frozen) announcements dict.
+
+    Args:
+        announcements (MappingProxyType): The announcements data keyed by device ID, then announcement ID.
+
+    Returns:
+        dict: The mutable copy.
+    """
+    return {
+        dev_id: {key: dict(value) for key, value in device_announcements.items()}
+        for dev_id, device_announcements in announcements.items()
+    }
+
+
+class AnnouncementStore:
+    """Single-writer store of announcements with immutable, versioned snapshots."""
+
+    def __init__(self, load: Callable[[], dict], save: Callable[[dict], Any]):
+        """Store initialization.
+
+        Args:
+            load (Callable[[], dict]): Returns the persisted announcements dict.
+            save (Callable[[dict], Any]): Persists an announcements dict.
+        """
+        self._load     = load
+        self._lock     = threading.RLock()
+        self._names    = {}
+        self._save     = save
+        self._snapshot = Snapshot(version=0, data=freeze({}))
+
+    # =============================================================================
+    def load(self) -> Snapshot:
+        """(Re)load the store from its persisted form.
+
+        Returns:
+            Snapshot: The newly published snapshot.
+        """
+        with self._lock:
+            return self._publish(self._load())
+
+    # =============================================================================
+    def snapshot(self) -> Snapshot:
+        """Return the current snapshot. Never blocks.
+
+        Returns:
+            Snapshot: The current snapshot.
+        """
+        return self._snapshot
+
+    # =============================================================================
+    def names(self, dev_id: int) -> NameIndex:
+        """Return the name index of a device's announcements in the current snapshot.
+
+        The index is built on first use after each change, so dialog lists don't have to sort the announcements each
+        time they are reloaded.
+
+        Args:
+            dev_id (int): The announcements device ID.
+
+        Returns:
+            NameIndex: Announcement names keyed by announcement ID.
+        """
+        snapshot = self._snapshot
+        cached   = self._names.get(dev_id)
+        if cached is None or cached[0] != snapshot.version:
+            index = NameIndex()
+            for key, announcement in snapshot.data.get(dev_id, {}).items():
+                index.add(key, announcement['Name'])
+            self._names[dev_id] = cached = (snapshot.version, index)
+        return cached[1]
+
+    # =============================================================================
+    def mutate(self, change: Callable[[dict], Any]) -> Any:
+        """Apply a change to the database, persist it and publish the result.
+
+        The change is applied to a mutable copy of the current snapshot. If it raises, nothing is persisted or
+        published.
+
+        Args:
+            change (Callable[[dict], Any]): Called with the mutable copy; may modify it in place.
+
+        Returns:
+            Any: Whatever `change` returns.
+        """
+        with self._lock:
+            working = thaw(self._snapshot.data)
+            result  = change(working)
+            self._save(working)
+            self._publish(working)
+            return result
+
+    # =============================================================================
+    def _publish(self, announcements: dict) -> Snapshot:
+        """Publish a new snapshot. Must be called with the lock held.
+
+        Args:
+            announcements (dict): The announcements data to publish.
+
+        Returns:
+            Snapshot: The newly published snapshot.
+        """
+        self._snapshot = Snapshot(version=self._snapshot.version + 1, data=freeze(announcements))
+        return self._snapshot
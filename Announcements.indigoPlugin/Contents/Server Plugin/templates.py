@@ -0,0 +1,130 @@
+"""
+Announcement template compiler
+
+Announcement templates are scanned once for the Indigo substitution references (`%%d:ID:state%%` and `%%v:ID%%`) and
+the `<<value, spec>>` formatter constructs they contain. The compiled result is used to build render cache keys without
+having to re-scan the template text on every refresh.
+
+Templates are content-addressed: the template ID is a digest of the template text, so the same announcement text on any
+number of devices shares one compiled template and one set of render cache entries, even after the compiled template
+has been evicted from the compile cache and compiled again.
+"""
+
+import functools
+import hashlib
+import re
+from typing import NamedTuple
+
+DEVICE_REFERENCE   = re.compile(r'%%d:(\d+):([^%]+?)%%')
+FORMATTER_PATTERN  = re.compile(r'(<<.*?), *(((ct)|(dt)|(n)):.*?>>)')
+VARIABLE_REFERENCE = re.compile(r'%%v:(\d+)%%')
+REFERENCE          = re.compile(f"{DEVICE_REFERENCE.pattern}|{VARIABLE_REFERENCE.pattern}")
+
+# Format directives that expose the seconds of the current time, with or without a flag such as `%-S`. Templates that
+# use one of these must be re-rendered every second; all other time-dependent templates are re-rendered once per minute.
+_SECONDS_DIRECTIVE = re.compile(r'%[-#]?[SfXcT]')
+
+
+class CompiledTemplate(NamedTuple):
+    """An announcement template with its references and time dependence resolved."""
+    template_id: str
+    text: str
+    references: tuple
+    time_bucket_seconds: int
+
+    def time_bucket(self, timestamp: float) -> int:
+        """Return the time bucket that a render at `timestamp` falls into.
+
+        Templates without time-dependent formatters always fall into bucket 0.
+
+        Args:
+            timestamp (float): The render time as seconds since the epoch.
+
+        Returns:
+            int: The time bucket number.
+        """
+        if not self.time_bucket_seconds:
+            return 0
+        return int(timestamp // self.time_bucket_seconds)
+
+
+# =============================================================================
+def template_id(text: str) -> str:
+    """Return the content address of an announcement template.
+
+    Args:
+        text (str): The raw announcement template string.
+
+    Returns:
+        str: A digest of the template text.
+    """
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=12).hexdigest()
+
+
+# =============================================================================
+def _reference(match: re.Match) -> tuple:
+    """Return the reference tuple of a REFERENCE match."""
+    if match.group(1):
+        return 'd', int(match.group(1)), match.group(2)
+    return 'v', int(match.group(3))
+
+
+# =============================================================================
+@functools.lru_cache(maxsize=1024)
+def compile_template(text: str) -> CompiledTemplate:
+    """Compile an announcement template.
+
+    References are returned in order of first appearance as `('d', dev_id, state)` or `('v', var_id)` tuples.
+
+    Args:
+        text (str): The raw announcement template string.
+
+    Returns:
+        CompiledTemplate: The compiled template.
+    """
+    references = []
+    for match in REFERENCE.finditer(text):
+        reference = _reference(match)
+        if reference not in references:
+            references.append(reference)
+
+    bucket_seconds = 0
+    for match in FORMATTER_PATTERN.finditer(text):
+        value = match.group(1).replace('<<', '').strip()
+        spec  = match.group(2)
+        if spec.startswith('ct:') or (spec.startswith('dt:') and value == 'now'):
+            if _SECONDS_DIRECTIVE.search(spec):
+                bucket_seconds = 1
+                break
+            bucket_seconds = 60
+
+    return CompiledTemplate(
+        template_id=template_id(text),
+        text=text,
+        references=tuple(references),
+        time_bucket_seconds=bucket_seconds,
+    )
+
+
+# =============================================================================
+def substitute_values(template: CompiledTemplate, values: tuple) -> str:
+    """Substitute resolved values for a template's Indigo references.
+
+    The values are the ones the render cache key was built from, so the render always matches its key and the server
+    isn't asked to resolve the references a second time. A reference that resolved to None (a missing device, state or
+    variable) is left as is, as the server would.
+
+    Args:
+        template (CompiledTemplate): The compiled announcement template.
+        values (tuple): The resolved values, in the order of template.references.
+
+    Returns:
+        str: The template text with its references substituted.
+    """
+    resolved = dict(zip(template.references, values))
+
+    def replace(match: re.Match) -> str:
+        value = resolved.get(_reference(match))
+        return match.group(0) if value is None else value
+
+    return REFERENCE.sub(replace, template.text)
@@ -0,0 +1,67 @@
+"""
+Logging for the refresh hot path
+
+A refresh pass logs a single summary line at the DEBUG level. Per-announcement detail is logged at Indigo's THREADDEBUG
+level, which is only written to the plugin log file when trace logging is turned on (plugin prefs). Errors that repeat
+on every pass, such as an announcement whose template can't be rendered, are logged at most once per interval for each
+announcement; their tracebacks are only logged at the THREADDEBUG level.
+"""
+
+import logging
+import threading
+import time
+
+# Indigo's thread debug level. Indigo registers its name; it mustn't be renamed here, as level names are process-wide.
+THREADDEBUG = 5
+
+
+class RateLimitedLog:
+    """Logs repeated errors at most once per interval for each key, counting the errors it suppresses."""
+
+    def __init__(self, logger: logging.Logger, interval: float):
+        """Log initialization.
+
+        Args:
+            logger (logging.Logger): The logger to write to.
+            interval (float): The minimum number of seconds between messages for the same key.
+        """
+        self.errors   = 0
+        self.interval = interval
+        self.logger   = logger
+        self._last    = {}
+        self._lock    = threading.Lock()
+
+    # =============================================================================
+    def error(self, key, level: int, message: str, *args) -> None:
+        """Log an error, unless one was logged for the same key within the interval. Call from an except block.
+
+        The message says how many errors for the key were suppressed since the last one was logged. When the logger
+        is enabled for the THREADDEBUG level, every error is also logged at that level with its traceback.
+
+        Args:
+            key: Identifies the source of the error, e.g. `(dev_id, announcement_id)`.
+            level (int): The level of the rate-limited message.
+            message (str): The message, with %-style placeholders for `args`.
+            *args: Arguments for the message.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.errors += 1
+            last, suppressed = self._last.get(key, (None, 0))
+            emit = last is None or now - last >= self.interval
+            self._last[key] = (now, 0) if emit else (last, suppressed + 1)
+
+        if emit and self.logger.isEnabledFor(level):
+            if suppressed:
+                self.logger.log(level, f"{message} ({suppressed} similar errors suppressed)", *args)
+            else:
+                self.logger.log(level, message, *args)
+        if self.logger.isEnabledFor(THREADDEBUG):
+            self.logger.log(THREADDEBUG, message, *args, exc_info=True)
+
+    # =============================================================================
+    def take_errors(self) -> int:
+        """Return the number of errors since the last call, and reset the count."""
+        with self._lock:
+            errors, self.errors = self.errors, 0
+        return errors
@@ -0,0 +1,84 @@
+"""
+Plugin trigger events
+
+Indigo triggers on the plugin's events (Events.xml) are indexed by event type, device and announcement when Indigo
+starts processing them. The plugin only looks for matching triggers after it has worked out that a rendered value
+actually changed (or a render failed), and only for devices that have triggers, so a refresh pass without changes
+doesn't dispatch anything.
+"""
+
+import threading
+
+# The plugin's event types (Events.xml).
+ANNOUNCEMENT_CHANGED = 'announcementChanged'
+RENDER_FAILED        = 'renderFailed'
+SALUTATION_CHANGED   = 'salutationChanged'
+
+
+class TriggerIndex:
+    """The plugin's active triggers, keyed by `(event type, dev_id, state name)`. A state name of None matches all."""
+
+    def __init__(self):
+        """Index initialization."""
+        self._devices  = {}  # dev_id: number of triggers
+        self._index    = {}  # (event type, dev_id, state name): set of trigger IDs
+        self._lock     = threading.Lock()
+        self._triggers = {}  # trigger ID: index key
+
+    # =============================================================================
+    def __len__(self) -> int:
+        return len(self._triggers)
+
+    # =============================================================================
+    def add(self, trigger_id: int, event: str, dev_id: int, state: str = None) -> None:
+        """Add a trigger, replacing any previous entry for it.
+
+        Args:
+            trigger_id (int): The Indigo trigger ID.
+            event (str): The event type.
+            dev_id (int): The plugin device the trigger watches.
+            state (str): The announcement state name the trigger watches; None for all of the device's announcements.
+        """
+        self.remove(trigger_id)
+        key = (event, dev_id, state or None)
+        with self._lock:
+            self._triggers[trigger_id] = key
+            self._index.setdefault(key, set()).add(trigger_id)
+            self._devices[dev_id] = self._devices.get(dev_id, 0) + 1
+
+    # =============================================================================
+    def remove(self, trigger_id: int) -> None:
+        """Remove a trigger, if present."""
+        with self._lock:
+            key = self._triggers.pop(trigger_id, None)
+            if key is None:
+                return
+            self._index[key].discard(trigger_id)
+            if not self._index[key]:
+                del self._index[key]
+            self._devices[key[1]] -= 1
+            if not self._devices[key[1]]:
+                del self._devices[key[1]]
+
+    # =============================================================================
+    def watching(self, dev_id: int) -> bool:
+        """Return True if any trigger watches the device."""
+        return dev_id in self._devices
+
+    # =============================================================================
+    def match(self, event: str, dev_id: int, state: str = None) -> list:
+        """Return the IDs of the triggers for an event.
+
+        Args:
+            event (str): The event type.
+            dev_id (int): The device the event happened on.
+            state (str): The announcement state name the event happened on, if any.
+
+        Returns:
+            list: The matching trigger IDs, sorted.
+        """
+        with self._lock:
+            matched = set(self._index.get((event, dev_id, None), ()))
+            if state is not None:
+                matched.update(self._index.get((event, dev_id, state), ()))
+        return sorted(matched)
@@ -0,0 +1,205 @@
+"""
+Offline render replay
+
+Feeds a render recording (see recording.py and the Record Renders plugin pref) back through the plugin's
+`__process_announcement__`, using the stand-in Indigo server from tests/simulator.py. Before each render, the recorded
+device state and variable values are loaded into the stand-in stores and the fake clock is set to the recorded time.
+The render cache is off by default, so every replayed render does the full work.
+
+A candidate renderer (for example, a new template engine) can be compared with the plugin's: both render the whole
+recording, and the report shows their throughput and every render where the results differ.
+
+Usage::
+
+    python -m tests.replay recording.jsonl
+    python -m tests.replay recording.jsonl --repeat 5 --profile
+    python -m tests.replay recording.jsonl --candidate my_engine:render
+"""
+
+import argparse
+import contextlib
+import cProfile
+import importlib
+import os
+import pstats
+import sys
+import tempfile
+import time
+from typing import Callable, NamedTuple
+
+from tests import simulator
+
+if simulator.SERVER_PLUGIN_DIR_PATH not in sys.path:
+    sys.path.insert(0, simulator.SERVER_PLUGIN_DIR_PATH)
+
+import recording  # noqa
+from constants import RENDER_CACHE_SIZE  # noqa
+from render_cache import RenderCache  # noqa
+
+
+class ReplayReport(NamedTuple):
+    """The results of replaying a recording."""
+    renders: int
+    seconds: float
+    renders_per_second: float
+    cache_hit_ratio: float
+
+
+# =============================================================================
+def process_announcement(plugin, text: str) -> str:
+    """Render an announcement with the plugin's own pipeline. The default renderer."""
+    return plugin.__process_announcement__(text)
+
+
+class Replay:
+    """Replays a render recording through the plugin."""
+
+    def __init__(self, path: str, cache: bool = False):
+        """Replay initialization.
+
+        Args:
+            path (str): The recording file.
+            cache (bool): Keep the plugin's render cache on, as in normal operation.
+        """
+        self.cache   = cache
+        self.clock   = simulator.FakeClock()
+        self.renders = recording.load(path)
+        self._plugin = None
+
+    # =============================================================================
+    def run(self, render: Callable = process_announcement, repeat: int = 1) -> tuple:
+        """Render the whole recording.
+
+        Args:
+            render (Callable): Called as `render(plugin, text)` for each recorded render; returns the rendered string.
+            repeat (int): The number of passes over the recording. Results are returned for the last pass.
+
+        Returns:
+            tuple: A ReplayReport and the rendered strings, in recording order.
+        """
+        with tempfile.TemporaryDirectory() as install_folder, contextlib.ExitStack() as stack:
+            server       = simulator.FakeServer(self.clock, simulator.Latency(fetch=0.0, update=0.0), install_folder)
+            self.indigo  = simulator.FakeIndigo(server)
+            self._plugin = simulator.build_plugin(stack, self, self.indigo, self.clock)
+
+            self._plugin.render_cache = RenderCache(max_entries=RENDER_CACHE_SIZE if self.cache else 0)
+
+            for _, _, values in self.renders:
+                for reference in values:
+                    self.__store__(reference)
+
+            results = []
+            elapsed = 0.0
+            for _ in range(repeat):
+                results = []
+                for text, timestamp, values in self.renders:
+                    self.__load__(timestamp, values)
+                    started = time.perf_counter()
+                    results.append(render(self._plugin, text))
+                    elapsed += time.perf_counter() - started
+
+            count  = len(self.renders) * repeat
+            report = ReplayReport(
+                renders=count,
+                seconds=elapsed,
+                renders_per_second=count / elapsed if elapsed else 0.0,
+                cache_hit_ratio=self._plugin.render_cache.hit_ratio,
+            )
+            return report, results
+
+    # =============================================================================
+    def compare(self, candidate: Callable, baseline: Callable = process_announcement, repeat: int = 1) -> tuple:
+        """Render the recording with two renderers and compare the results.
+
+        Args:
+            candidate (Callable): The renderer under test; see `run()`.
+            baseline (Callable): The reference renderer.
+            repeat (int): The number of passes over the recording for each renderer.
+
+        Returns:
+            tuple: The baseline and candidate ReplayReports, and `(text, expected, actual)` for each render where the
+                results differ.
+        """
+        baseline_report, expected = self.run(baseline, repeat)
+        candidate_report, actual  = self.run(candidate, repeat)
+        differences               = [
+            (text, want, got) for (text, _, _), want, got in zip(self.renders, expected, actual) if want != got
+        ]
+        return baseline_report, candidate_report, differences
+
+    # =============================================================================
+    def sleep(self, seconds: float) -> None:
+        """The replayed plugin never sleeps."""
+
+    # =============================================================================
+    def __store__(self, reference: tuple) -> None:
+        """Create the stand-in device or variable for a recorded reference."""
+        if reference[0] == 'd' and reference[1] not in self.indigo.devices:
+            self.indigo.devices[reference[1]] = simulator.FakeDevice(
+                self.indigo.server, reference[1], f"Device {reference[1]}"
+            )
+        elif reference[0] == 'v' and reference[1] not in self.indigo.variables:
+            self.indigo.variables[reference[1]] = simulator.FakeVariable(reference[1], f"var_{reference[1]}")
+
+    # =============================================================================
+    def __load__(self, timestamp: float, values: dict) -> None:
+        """Set the clock and the stand-in stores to a recorded render."""
+        self.clock.set(timestamp)
+        for reference, value in values.items():
+            if reference[0] == 'd':
+                states = self.indigo.devices.get(reference[1]).states
+                if value is None:
+                    states.pop(reference[2], None)
+                else:
+                    states[reference[2]] = value
+            else:
+                self.indigo.variables.get(reference[1]).value = value
+
+
+# =============================================================================
+def main(argv: list = None) -> int:
+    """Replay a recording from the command line.
+
+    Args:
+        argv (list): Command line arguments.
+
+    Returns:
+        int: The exit status; 1 if a candidate renderer's results differ from the plugin's.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument('recording', help="the render recording")
+    parser.add_argument('--repeat', type=int, default=1, help="passes over the recording")
+    parser.add_argument('--cache', action='store_true', help="keep the render cache on")
+    parser.add_argument('--profile', action='store_true', help="print the top functions by cumulative time")
+    parser.add_argument('--candidate', metavar="MODULE:FUNCTION", help="a renderer to compare with the plugin's")
+    args = parser.parse_args(argv)
+
+    replay = Replay(args.recording, cache=args.cache)
+    print(f"{len(replay.renders):,} recorded renders of {len({text for text, _, _ in replay.renders}):,} templates")
+
+    if args.candidate:
+        module, function = args.candidate.split(':')
+        sys.path.insert(0, os.getcwd())
+        candidate = getattr(importlib.import_module(module), function)
+        baseline_report, candidate_report, differences = replay.compare(candidate, repeat=args.repeat)
+        print(f"plugin:    {baseline_report.renders_per_second:,.0f} renders/s")
+        print(f"candidate: {candidate_report.renders_per_second:,.0f} renders/s")
+        for text, expected, actual in differences:
+            print(f"DIFFERENT: {text!r}\n  expected {expected!r}\n  actual   {actual!r}")
+        return 1 if differences else 0
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    report, _ = replay.run(repeat=args.repeat)
+    if profiler:
+        profiler.disable()
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+
+    print(f"{report.renders:,} renders in {report.seconds:.3f} s ({report.renders_per_second:,.0f} renders/s, "
+          f"cache hit ratio {report.cache_hit_ratio:.0%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,638 @@
+"""
+End-to-end scaling simulator
+
+Drives the real `Plugin` class against a stand-in Indigo server, so the plugin's behavior with hundreds of devices and
+thousands of announcements can be measured without an Indigo host. The stand-in provides device and variable stores,
+a recording `speak()`, and configurable IPC latency on device and variable fetches and `updateStatesOnServer()`.
+A fake clock stands in for wall time: the concurrent thread's sleeps and IPC latency advance it, so hours of plugin
+time run in seconds. Source device states and variables change at a configurable rate while the simulation runs.
+
+Tick durations are the real CPU time spent in each refresh pass plus the IPC latency charged to it. IPC latency is
+charged serially, as if every call went over a single connection to the server. Time-dependent formatters (`ct:`,
+`dt:now`) still render the real time of day; only the plugin's scheduling runs on the fake clock.
+
+Usage::
+
+    python -m tests.simulator --devices 200 --announcements 50 --hours 2
+    python -m tests.simulator --save baseline.json
+    python -m tests.simulator --baseline baseline.json  # exits 1 on a regression
+"""
+
+import argparse
+import collections
+import contextlib
+import datetime as dt
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import types
+from typing import NamedTuple
+from unittest.mock import patch
+
+SERVER_PLUGIN_DIR_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "../Announcements.indigoPlugin/Contents/Server Plugin")
+)
+PLUGIN_ID  = "com.fogbert.indigoplugin.announcements"
+PREFS_FILE = "/Preferences/Plugins/com.fogbert.indigoplugin.announcements.txt"
+START_TIME = dt.datetime(2025, 1, 6, 6, 0).timestamp()
+
+# Announcement templates. {s} is a source device ID, {v} a variable ID and {room} a room name.
+TEMPLATES = (
+    "It is %%d:{s}:temperature%% degrees in the {room}.",
+    "The {room} is %%d:{s}:status%% and the thermostat is set to <<%%v:{v}%%, n:1>>.",
+    "Good <<now, dt:%A>>. The forecast is %%v:{v}%%.",
+    "The {room} sensor reads <<%%d:{s}:temperature%%, n:2>> at <<now, ct:%H:%M>>.",
+    "The {room} is %%d:{s}:status%%.",
+)
+ROOMS     = ("kitchen", "den", "garage", "office", "porch", "attic", "basement", "nursery")
+STATUSES  = ("open", "closed", "occupied", "vacant")
+INTERVALS = (60, 300, 900, 3600)
+
+
+class Latency(NamedTuple):
+    """Simulated IPC latency, in seconds, of each kind of call to the server.
+
+    The plugin resolves device state and variable references itself, so each device or variable it fetches to render an
+    announcement is a round trip to the server.
+    """
+    fetch: float = 0.002
+    update: float = 0.005
+
+
+class Report(NamedTuple):
+    """The results of a simulation."""
+    devices: int
+    announcements: int
+    simulated_hours: float
+    ticks: int
+    tick_mean_ms: float
+    tick_p95_ms: float
+    tick_max_ms: float
+    renders: int
+    renders_per_second: float
+    fetches: int
+    state_updates: int
+    states_sent: int
+    bytes_written: int
+    spoken: int
+    max_backlog: int
+    startup_ms: float  # startup() itself
+    prewarm_ms: float  # from startup until the background prewarm finished
+
+    # =============================================================================
+    def summary(self) -> str:
+        """Return the report as a short, human-readable table."""
+        width = max(len(field) for field in self._fields)
+        return "\n".join(
+            f"{field:<{width}}  {value:,.1f}" if isinstance(value, float) else f"{field:<{width}}  {value:,}"
+            for field, value in self._asdict().items()
+        )
+
+    # =============================================================================
+    def regressions(self, baseline: dict, tolerance: float = 0.2) -> list:
+        """Compare the report to a baseline report.
+
+        Throughput (renders per second) must not fall, and tick times and bytes written must not rise, by more than
+        `tolerance` (a fraction of the baseline value).
+
+        Args:
+            baseline (dict): A baseline report, as saved by `--save`.
+            tolerance (float): The allowed relative change.
+
+        Returns:
+            list: A description of each regression; empty if there are none.
+        """
+        problems = []
+        if self.renders_per_second < baseline['renders_per_second'] * (1 - tolerance):
+            problems.append(
+                f"renders_per_second fell from {baseline['renders_per_second']:.1f} to {self.renders_per_second:.1f}"
+            )
+        for field in ('tick_mean_ms', 'tick_p95_ms', 'bytes_written'):
+            if getattr(self, field) > baseline[field] * (1 + tolerance):
+                problems.append(f"{field} rose from {baseline[field]:,.1f} to {getattr(self, field):,.1f}")
+        return problems
+
+
+class FakeClock:
+    """Simulated wall and monotonic time. Advanced explicitly; never by the passage of real time."""
+
+    def __init__(self, start: float = START_TIME):
+        """Clock initialization.
+
+        Args:
+            start (float): The simulated start time, in seconds since the epoch.
+        """
+        clock      = self
+        self._lock = threading.Lock()
+        self._now  = start
+
+        class _Datetime(dt.datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return cls.fromtimestamp(clock.time(), tz)
+
+        # Stand-ins for the `time` and `datetime` modules as seen by the plugin.
+        self.time_module = types.SimpleNamespace(
+            monotonic=self.time, perf_counter=self.time, sleep=self.advance, time=self.time
+        )
+        self.datetime_module = types.SimpleNamespace(
+            date=dt.date, datetime=_Datetime, time=dt.time, timedelta=dt.timedelta, timezone=dt.timezone
+        )
+
+    # =============================================================================
+    def time(self) -> float:
+        """Return the simulated time in seconds since the epoch."""
+        return self._now
+
+    # =============================================================================
+    def set(self, timestamp: float) -> None:
+        """Set the clock.
+
+        Args:
+            timestamp (float): The new time in seconds since the epoch.
+        """
+        with self._lock:
+            self._now = timestamp
+
+    # =============================================================================
+    def advance(self, seconds: float) -> None:
+        """Move the clock forward.
+
+        Args:
+            seconds (float): The number of seconds to advance.
+        """
+        with self._lock:
+            self._now += max(seconds, 0.0)
+
+
+class FakeDevice:
+    """An Indigo device as seen by the plugin."""
+
+    def __init__(self, server: "FakeServer", dev_id: int, name: str, device_type_id: str = "", plugin_id: str = "",
+                 states: dict = None):
+        """Device initialization."""
+        self.deviceTypeId = device_type_id
+        self.enabled      = True
+        self.id           = dev_id
+        self.name         = name
+        self.pluginId     = plugin_id
+        self.pluginProps  = {}
+        self.states       = dict(states or {})
+        self._server      = server
+
+    # =============================================================================
+    def updateStatesOnServer(self, states: list) -> None:  # noqa
+        """Record a batch state update."""
+        self._server.call('update')
+        self._server.record_update(len(states))
+        self.states.update({state['key']: state['value'] for state in states})
+
+    # =============================================================================
+    def updateStateOnServer(self, key: str, value=None, uiValue: str = None) -> None:  # noqa
+        """Record a single state update."""
+        self.updateStatesOnServer([{'key': key, 'value': value}])
+
+    # =============================================================================
+    def stateListOrDisplayStateIdChanged(self) -> None:  # noqa
+        """Accept a state list change."""
+
+
+class FakeVariable:
+    """An Indigo variable as seen by the plugin."""
+
+    def __init__(self, var_id: int, name: str, value: str = ""):
+        """Variable initialization."""
+        self.id    = var_id
+        self.name  = name
+        self.value = value
+
+
+class FakeStore(dict):
+    """`indigo.devices` / `indigo.variables`: objects keyed by ID, with a latency charged on each fetch."""
+
+    def __init__(self, server: "FakeServer"):
+        """Store initialization."""
+        super().__init__()
+        self._server = server
+
+    def __getitem__(self, item_id):
+        self._server.call('fetch')
+        return super().__getitem__(item_id)
+
+    def __iter__(self):
+        return iter(list(self.values()))
+
+    # =============================================================================
+    def iter(self, fltr: str = ""):
+        """Iterate the objects; `'self'` limits devices to the plugin's own."""
+        return iter([item for item in self.values() if fltr != 'self' or getattr(item, 'pluginId', "") == PLUGIN_ID])
+
+    itervalues = iter
+
+    # =============================================================================
+    def subscribeToChanges(self) -> None:  # noqa
+        """Accept a change subscription."""
+
+
+class FakeServer:
+    """`indigo.server`, plus the counters the simulation reports."""
+
+    def __init__(self, clock: FakeClock, latency: Latency, install_folder: str):
+        """Server initialization."""
+        self.calls          = collections.Counter()
+        self.clock          = clock
+        self.install_folder = install_folder
+        self.ipc_seconds    = 0.0
+        self.latency        = latency
+        self.spoken         = []
+        self.states_sent    = 0
+        self.state_updates  = 0
+        self._lock          = threading.Lock()
+
+    # =============================================================================
+    def call(self, kind: str) -> None:
+        """Count one call to the server and charge its latency.
+
+        Args:
+            kind (str): The kind of call; a `Latency` field name.
+        """
+        seconds = getattr(self.latency, kind)
+        with self._lock:
+            self.calls[kind] += 1
+            self.ipc_seconds += seconds
+        self.clock.advance(seconds)
+
+    # =============================================================================
+    def record_update(self, states: int) -> None:
+        """Count a device state update."""
+        with self._lock:
+            self.state_updates += 1
+            self.states_sent   += states
+
+    # =============================================================================
+    def getInstallFolderPath(self) -> str:  # noqa
+        """Return the simulated Indigo install folder."""
+        return self.install_folder
+
+    # =============================================================================
+    def log(self, message: str, *args, **kwargs) -> None:
+        """Accept an Indigo log message."""
+
+    # =============================================================================
+    def speak(self, text: str, waitUntilDone: bool = True) -> None:  # noqa
+        """Record an utterance."""
+        with self._lock:
+            self.spoken.append(text)
+
+
+class FakeIndigo(types.ModuleType):
+    """A stand-in for the `indigo` module."""
+
+    Device      = FakeDevice
+    Dict        = dict
+    List        = list
+    Trigger     = object
+    Variable    = FakeVariable
+    actionGroup = object
+
+    def __init__(self, server: FakeServer):
+        """Module initialization."""
+        super().__init__("indigo")
+        self.PluginBase = SimHost
+        self.device     = types.SimpleNamespace(enable=lambda dev, value=True: None)
+        self.devices    = FakeStore(server)
+        self.server     = server
+        self.trigger    = types.SimpleNamespace(execute=lambda trigger, **kwargs: None)
+        self.variable   = types.SimpleNamespace(updateValue=self.__update_variable__)
+        self.variables  = FakeStore(server)
+
+    # =============================================================================
+    def __update_variable__(self, name: str, value: str = "") -> None:
+        for var in self.variables.values():
+            if var.name == name:
+                var.value = value
+
+
+class SimHost:
+    """The parts of `indigo.PluginBase` the plugin relies on, backed by a simulation."""
+
+    StopThread = type("StopThread", (Exception,), {})
+    simulation = None  # set on the simulated plugin class
+
+    def __init__(self, plugin_id: str = "", plugin_display_name: str = "", plugin_version: str = "",
+                 plugin_prefs: dict = None, *args, **kwargs):
+        """Host initialization."""
+        self.devicesTypeDict     = {}
+        self.indigo_log_handler  = logging.NullHandler()
+        self.logger              = logging.getLogger("Plugin")
+        self.pluginDisplayName   = plugin_display_name
+        self.pluginId            = plugin_id
+        self.pluginPrefs         = plugin_prefs if plugin_prefs is not None else {}
+        self.pluginVersion       = plugin_version
+        self.plugin_file_handler = logging.NullHandler()
+
+    def __del__(self):
+        pass
+
+    # =============================================================================
+    def sleep(self, seconds: float) -> None:
+        """Sleep on the simulation's clock. Raises StopThread when the simulation is over."""
+        self.simulation.sleep(seconds)
+
+    # =============================================================================
+    def device_created(self, dev: FakeDevice) -> None:
+        """Accept a device created callback."""
+
+    # =============================================================================
+    def device_deleted(self, dev: FakeDevice) -> None:
+        """Accept a device deleted callback."""
+
+    # =============================================================================
+    def device_updated(self, orig_dev: FakeDevice, new_dev: FakeDevice) -> None:
+        """Accept a device updated callback."""
+
+    # =============================================================================
+    def getDeviceStateDictForStringType(self, key: str, trigger_label: str, control_label: str) -> dict:  # noqa
+        """Return a state list entry."""
+        return {'Key': key, 'TriggerLabel': trigger_label, 'ControlPageLabel': control_label}
+
+
+class Simulation:
+    """A simulated Indigo server with a population of devices and announcements, driving the real plugin."""
+
+    def __init__(self, devices: int = 20, announcements: int = 10, sensors: int = 50, variables: int = 10,
+                 changes_per_minute: float = 50.0, latency: Latency = Latency(), prefs: dict = None, seed: int = 1):
+        """Simulation initialization.
+
+        Args:
+            devices (int): The number of announcements devices.
+            announcements (int): The number of announcements on each device.
+            sensors (int): The number of source devices referenced by announcements.
+            variables (int): The number of variables referenced by announcements.
+            changes_per_minute (float): How many source device states and variables change per simulated minute.
+            latency (Latency): Simulated IPC latency.
+            prefs (dict): Plugin prefs, applied over the plugin defaults.
+            seed (int): Seed for the population and the changes.
+        """
+        self.announcements      = announcements
+        self.changes_per_minute = changes_per_minute
+        self.clock              = FakeClock()
+        self.devices            = devices
+        self.latency            = latency
+        self.prefs              = dict(prefs or {})
+        self.rng                = random.Random(seed)
+        self.sensors            = sensors
+        self.ticks              = []
+        self.variables          = variables
+        self._end               = None
+        self._pending_changes   = 0.0
+        self._plugin            = None
+        self._tick_ipc          = 0.0
+        self._tick_started      = None
+
+    # =============================================================================
+    def run(self, hours: float = 1.0) -> Report:
+        """Start the plugin, run its concurrent thread for `hours` of simulated time and shut it down.
+
+        Args:
+            hours (float): The simulated run time.
+
+        Returns:
+            Report: The measured results.
+        """
+        with tempfile.TemporaryDirectory() as install_folder, contextlib.ExitStack() as stack:
+            self.server = FakeServer(self.clock, self.latency, install_folder)
+            self.indigo = FakeIndigo(self.server)
+            self.__populate__(install_folder)
+
+            self._plugin  = build_plugin(stack, self, self.indigo, self.clock, self.prefs)
+            bytes_written = [0]
+            save          = self._plugin.store._save
+
+            def counting_save(announcements: dict) -> bool:
+                result = save(announcements)
+                bytes_written[0] += os.path.getsize(self._plugin.announcements_file)
+                return result
+
+            self._plugin.store._save = counting_save
+
+            # Startup, including the background audit and prewarm.
+            started = time.perf_counter()
+            self._plugin.startup()
+            startup = time.perf_counter() - started
+            for thread in threading.enumerate():
+                if thread.name in ("StartupAudit", "Prewarm"):
+                    thread.join()
+            prewarm = time.perf_counter() - started
+            for dev in self.indigo.devices.iter('self'):
+                self._plugin.device_start_comm(dev)
+
+            # The concurrent thread, measured from here on.
+            self.server.calls.clear()
+            self.server.state_updates = 0
+            self.server.states_sent   = 0
+            bytes_written[0]          = 0
+            self._end                 = self.clock.time() + hours * 3600
+            self._tick_started        = time.perf_counter()
+            self._tick_ipc            = self.server.ipc_seconds
+            self._plugin.run_concurrent_thread()
+            self._plugin.shutdown()
+
+            ticks   = sorted(self.ticks)
+            renders = self.__rendered_states__()
+            return Report(
+                devices=self.devices,
+                announcements=self.devices * self.announcements,
+                simulated_hours=hours,
+                ticks=len(ticks),
+                tick_mean_ms=statistics.fmean(ticks) * 1000 if ticks else 0.0,
+                tick_p95_ms=ticks[int(len(ticks) * 0.95)] * 1000 if ticks else 0.0,
+                tick_max_ms=ticks[-1] * 1000 if ticks else 0.0,
+                renders=renders,
+                renders_per_second=renders / sum(ticks) if sum(ticks) else 0.0,
+                fetches=self.server.calls['fetch'],
+                state_updates=self.server.state_updates,
+                states_sent=self.server.states_sent,
+                bytes_written=bytes_written[0],
+                spoken=len(self.server.spoken),
+                max_backlog=self._plugin.tick_stats['max_backlog'],
+                startup_ms=startup * 1000,
+                prewarm_ms=prewarm * 1000,
+            )
+
+    # =============================================================================
+    def sleep(self, seconds: float) -> None:
+        """End the current tick and advance the clock to the next one, applying device and variable changes.
+
+        Raises:
+            SimHost.StopThread: When the simulated run time is over.
+        """
+        self.ticks.append(time.perf_counter() - self._tick_started + self.server.ipc_seconds - self._tick_ipc)
+        seconds = min(seconds, self._end - self.clock.time())
+        self.clock.advance(seconds)
+        if self.clock.time() >= self._end:
+            raise SimHost.StopThread
+        self.__change_values__(seconds)
+        self._tick_ipc     = self.server.ipc_seconds
+        self._tick_started = time.perf_counter()
+
+    # =============================================================================
+    def __populate__(self, install_folder: str) -> None:
+        """Create the devices and variables, and the announcements file."""
+        sensor_ids   = [100_000 + i for i in range(self.sensors)]
+        variable_ids = [200_000 + i for i in range(self.variables)]
+        for dev_id in sensor_ids:
+            self.indigo.devices[dev_id] = FakeDevice(
+                self.server, dev_id, f"Sensor {dev_id}",
+                states={'temperature': round(self.rng.uniform(10, 30), 1), 'status': self.rng.choice(STATUSES)}
+            )
+        for var_id in variable_ids:
+            self.indigo.variables[var_id] = FakeVariable(var_id, f"var_{var_id}", f"{self.rng.uniform(15, 25):.1f}")
+
+        announcements = {}
+        start         = dt.datetime.fromtimestamp(self.clock.time()).isoformat(sep=' ')
+        for i in range(self.devices):
+            dev_id = 300_000 + i
+            self.indigo.devices[dev_id] = FakeDevice(
+                self.server, dev_id, f"Announcements {i}", 'announcementsDevice', PLUGIN_ID
+            )
+            announcements[dev_id] = {
+                key: {
+                    'Name': f"Announcement {key}",
+                    'Announcement': self.rng.choice(TEMPLATES).format(
+                        s=self.rng.choice(sensor_ids), v=self.rng.choice(variable_ids), room=self.rng.choice(ROOMS)
+                    ),
+                    'RefreshSeconds': f"{self.rng.choice(INTERVALS)}",
+                    'CatchUp': 'once',
+                    'nextRefresh': start,
+                }
+                for key in range(1, self.announcements + 1)
+            }
+
+        os.makedirs(os.path.dirname(f"{install_folder}{PREFS_FILE}"), exist_ok=True)
+        with open(f"{install_folder}{PREFS_FILE}", mode='w', encoding="utf-8") as outfile:
+            json.dump(announcements, outfile)
+
+    # =============================================================================
+    def __change_values__(self, seconds: float) -> None:
+        """Change source device states and variables at the configured rate, notifying the plugin."""
+        self._pending_changes += self.changes_per_minute * seconds / 60
+        sensors   = [dev for dev in self.indigo.devices.values() if dev.pluginId != PLUGIN_ID]
+        variables = list(self.indigo.variables.values())
+        while self._pending_changes >= 1:
+            self._pending_changes -= 1
+            if variables and self.rng.random() < 0.2:
+                var       = self.rng.choice(variables)
+                var.value = f"{self.rng.uniform(15, 25):.1f}"
+                self._plugin.variable_updated(var, var)
+            elif sensors:
+                dev = self.rng.choice(sensors)
+                dev.states['temperature'] = round(self.rng.uniform(10, 30), 1)
+                dev.states['status']      = self.rng.choice(STATUSES)
+                self._plugin.device_updated(dev, dev)
+
+    # =============================================================================
+    def __rendered_states__(self) -> int:
+        """Return the number of announcement states sent to the server so far.
+
+        Every update the plugin sends carries one `onOffState` in addition to any announcement states.
+        """
+        return self.server.states_sent - self.server.state_updates
+
+
+# =============================================================================
+def build_plugin(stack: contextlib.ExitStack, host, indigo: FakeIndigo, clock: FakeClock, prefs: dict = None):
+    """Create a plugin instance that runs against a stand-in server.
+
+    The plugin module is imported if needed and patched to use the stand-in `indigo` module and the fake clock until
+    `stack` is closed. If the plugin was imported against another `indigo` stand-in (as in the unit tests), SimHost is
+    mixed in after the Plugin class.
+
+    Args:
+        stack (contextlib.ExitStack): Holds the patches.
+        host: Provides `sleep(seconds)` to the plugin.
+        indigo (FakeIndigo): The stand-in `indigo` module.
+        clock (FakeClock): The fake clock.
+        prefs (dict): Plugin prefs, applied over the plugin defaults.
+
+    Returns:
+        Plugin: The plugin instance.
+    """
+    if SERVER_PLUGIN_DIR_PATH not in sys.path:
+        sys.path.insert(0, SERVER_PLUGIN_DIR_PATH)
+    sys.modules.setdefault("indigo", indigo)
+
+    import plugin  # noqa
+    from plugin_defaults import kDefaultPluginPrefs  # noqa
+
+    stack.enter_context(patch.object(plugin, 'indigo', indigo))
+    stack.enter_context(patch.object(plugin, 'time', clock.time_module))
+    stack.enter_context(patch.object(plugin, 'dt', clock.datetime_module))
+
+    bases      = (plugin.Plugin,) if issubclass(plugin.Plugin, SimHost) else (plugin.Plugin, SimHost)
+    sim_plugin = type(
+        "SimulatedPlugin", bases, {'simulation': host, 'StopThread': SimHost.StopThread, '__del__': SimHost.__del__}
+    )
+    return sim_plugin(PLUGIN_ID, "Announcements", plugin.__version__, {**kDefaultPluginPrefs, **(prefs or {})})
+
+
+# =============================================================================
+def main(argv: list = None) -> int:
+    """Run a simulation from the command line.
+
+    Args:
+        argv (list): Command line arguments.
+
+    Returns:
+        int: The exit status; 1 if a regression against the baseline was found.
+    """
+    latency = Latency()
+    parser  = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument('--devices', type=int, default=200, help="announcements devices")
+    parser.add_argument('--announcements', type=int, default=50, help="announcements per device")
+    parser.add_argument('--sensors', type=int, default=200, help="source devices referenced by announcements")
+    parser.add_argument('--variables', type=int, default=20, help="variables referenced by announcements")
+    parser.add_argument('--changes', type=float, default=200, help="source value changes per simulated minute")
+    parser.add_argument('--hours', type=float, default=1.0, help="simulated run time")
+    parser.add_argument('--fetch-latency', type=float, default=latency.fetch, help="seconds")
+    parser.add_argument('--update-latency', type=float, default=latency.update, help="seconds")
+    parser.add_argument('--pref', action='append', default=[], metavar="KEY=VALUE", help="plugin pref override")
+    parser.add_argument('--save', metavar="PATH", help="save the report as a baseline")
+    parser.add_argument('--baseline', metavar="PATH", help="compare the report to a saved baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative change from the baseline")
+    args = parser.parse_args(argv)
+
+    simulation = Simulation(
+        devices=args.devices,
+        announcements=args.announcements,
+        sensors=args.sensors,
+        variables=args.variables,
+        changes_per_minute=args.changes,
+        latency=Latency(fetch=args.fetch_latency, update=args.update_latency),
+        prefs=dict(pref.split('=', 1) for pref in args.pref),
+    )
+    report = simulation.run(hours=args.hours)
+    print(report.summary())
+
+    if args.save:
+        with open(args.save, mode='w', encoding="utf-8") as outfile:
+            json.dump(report._asdict(), outfile, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, mode='r', encoding="utf-8") as infile:
+            problems = report.regressions(json.load(infile), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        return 1 if problems else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,12 +5,20 @@ Unit tests for the Announcements plugin.
 from tests.shared import APIBase
 from tests.shared.utils import run_host_script
 from tests import helpers
+from tests import replay
+from tests import simulator
+import collections
+import contextlib
 import datetime as dt
 import httpx
 import json
+import logging
 import re
 import sys
+import tempfile
 import textwrap
+import threading
+import time
 from unittest.mock import MagicMock, patch
 import dotenv
 import os
@@ -29,6 +37,28 @@ _indigo_mock = MagicMock()
 _indigo_mock.PluginBase = object
 sys.modules.setdefault("indigo", _indigo_mock)
 import plugin  # noqa
+import catalog  # noqa
+import formatting  # noqa
+import history  # noqa
+import metrics  # noqa
+import pacing  # noqa
+import plugin_defaults  # noqa
+import recording  # noqa
+import render_cache  # noqa
+import scheduling  # noqa
+import speech  # noqa
+import store  # noqa
+import templates  # noqa
+import tick_log  # noqa
+import triggers  # noqa
+
+
+def _attach_store(mock_self: MagicMock, data: dict) -> MagicMock:
+    """Give a mock plugin a real announcements store loaded with `data`; return the store's save callable."""
+    save = MagicMock(return_value=True)
+    mock_self.store = store.AnnouncementStore(load=lambda: data, save=save)
+    mock_self.store.load()
+    return save
 
 
 class TestActions(APIBase):
@@ -155,6 +185,51 @@ class TestMenuItems(APIBase):
         self.assertEqual(result.status_code, 200, "The menu item call was not successful.")
 
 
+class TestValidatePrefsConfigUi(APIBase):
+    """Unit tests for the validate_prefs_config_ui method."""
+
+    __test__ = True
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        # indigo.Dict() must return a trackable dict so that len(error_msg_dict) > 0 works outside the Indigo host.
+        self._dict_patcher = patch.object(sys.modules['indigo'], 'Dict', dict)
+        self._dict_patcher.start()
+
+    def tearDown(self):
+        self._dict_patcher.stop()
+        super().tearDown()
+
+    def test_defaults_pass(self):
+        """The default plugin prefs pass validation."""
+        result = plugin.Plugin.validate_prefs_config_ui(dict(plugin_defaults.kDefaultPluginPrefs))
+        self.assertTrue(result[0])
+
+    def test_non_numeric_fails(self):
+        """Empty and non-numeric entries are rejected."""
+        values = {'tickWorkBudget': '', 'tickTimeBudget': 'fast', 'renderWorkers': '1.5', 'speechGap': 'nan'}
+        result = plugin.Plugin.validate_prefs_config_ui(values)
+        self.assertFalse(result[0])
+        self.assertEqual(set(result[2]), set(values))
+
+    def test_out_of_range_fails(self):
+        """Negative entries, and entries outside a pref's range, are rejected."""
+        values = {'tickMaxGap': '-1', 'renderWorkers': '0', 'refreshTolerance': '150', 'metricsPort': '70000'}
+        result = plugin.Plugin.validate_prefs_config_ui(values)
+        self.assertFalse(result[0])
+        self.assertEqual(set(result[2]), set(values))
+
+    def test_unknown_drop_policy_fails(self):
+        """The speech queue drop policy must be one of the allowed policies."""
+        result = plugin.Plugin.validate_prefs_config_ui({'speechDropPolicy': 'random'})
+        self.assertFalse(result[0])
+        self.assertIn('speechDropPolicy', result[2])
+
+
 class TestValidateDeviceConfigUi(APIBase):
     """Unit tests for the validate_device_config_ui method."""
 
@@ -400,7 +475,7 @@ class TestFormatDigits(APIBase):
 
 
 class TestFormatSpec(APIBase):
-    """Unit tests for the module-level _validate_format_spec function."""
+    """Unit tests for the formatting.validate_format_spec function."""
 
     __test__ = True
 
@@ -412,33 +487,33 @@ class TestFormatSpec(APIBase):
     def test_valid_datetime_spec_does_not_raise(self):
         """Valid datetime characters should not raise ValueError."""
         try:
-            plugin._validate_format_spec('%H:%M', '.,%:-aAwdbBmyYHIpMSfzZjUWcxX ')
+            formatting.validate_format_spec('%H:%M', '.,%:-aAwdbBmyYHIpMSfzZjUWcxX ')
         except ValueError:
-            self.fail("_validate_format_spec raised ValueError for a valid datetime spec")
+            self.fail("validate_format_spec raised ValueError for a valid datetime spec")
 
     def test_invalid_datetime_spec_raises(self):
         """A character not in the datetime allowlist should raise ValueError."""
         with self.assertRaises(ValueError):
-            plugin._validate_format_spec('!invalid', '.,%:-aAwdbBmyYHIpMSfzZjUWcxX ')
+            formatting.validate_format_spec('!invalid', '.,%:-aAwdbBmyYHIpMSfzZjUWcxX ')
 
     def test_valid_number_spec_does_not_raise(self):
         """Valid digit characters should not raise ValueError."""
         try:
-            plugin._validate_format_spec('2', '0123456789')
+            formatting.validate_format_spec('2', '0123456789')
         except ValueError:
-            self.fail("_validate_format_spec raised ValueError for a valid number spec")
+            self.fail("validate_format_spec raised ValueError for a valid number spec")
 
     def test_invalid_number_spec_raises(self):
         """A non-digit character in a number spec should raise ValueError."""
         with self.assertRaises(ValueError):
-            plugin._validate_format_spec('z', '0123456789')
+            formatting.validate_format_spec('z', '0123456789')
 
     def test_empty_spec_does_not_raise(self):
         """An empty spec string should not raise ValueError (nothing to validate)."""
         try:
-            plugin._validate_format_spec('', '0123456789')
+            formatting.validate_format_spec('', '0123456789')
         except ValueError:
-            self.fail("_validate_format_spec raised ValueError for an empty spec")
+            self.fail("validate_format_spec raised ValueError for an empty spec")
 
 
 class TestAnnouncementFileIO(APIBase):
@@ -456,6 +531,7 @@ class TestAnnouncementFileIO(APIBase):
     def setUp(self):
         self.mock_self = MagicMock()
         self.mock_self.logger = MagicMock()
+        self.mock_self.__dict__['__set_quarantine__'] = MagicMock()
         self._tmp, self.mock_self.announcements_file = helpers.make_announcements_file()
 
     def tearDown(self):
@@ -466,6 +542,16 @@ class TestAnnouncementFileIO(APIBase):
         result = plugin.Plugin.__announcement_file_write__(self.mock_self, {})
         self.assertTrue(result)
 
+    def test_write_leaves_quarantine_alone(self):
+        """A write (e.g., one that only advances refresh times) doesn't look for dangling references."""
+        devices = MagicMock()
+        data    = {99: {1: {"Name": "Hello", "Announcement": "%%d:5:onOffState%%", "nextRefresh": "..."}}}
+        with patch.object(plugin.indigo, 'devices', devices):
+            plugin.Plugin.__announcement_file_write__(self.mock_self, data)
+        self.mock_self.__dict__['__set_quarantine__'].assert_not_called()
+        devices.keys.assert_not_called()
+        devices.__contains__.assert_not_called()
+
     def test_round_trip_preserves_content(self):
         """Write then read should return equivalent data with int keys at both levels."""
         original = {99: {"1": {"Name": "Hello", "Announcement": "World", "Refresh": "5", "nextRefresh": "..."}}}
@@ -496,6 +582,21 @@ class TestAnnouncementFileIO(APIBase):
         with self.assertRaises(FileNotFoundError):
             plugin.Plugin.__announcement_file_read__(self.mock_self)
 
+    def test_read_migrates_refresh_minutes_to_seconds(self):
+        """A legacy Refresh value in minutes should be read back as RefreshSeconds."""
+        data = {12345: {"1": {"Name": "Test", "Announcement": "Hi", "Refresh": "1.5", "nextRefresh": "..."}}}
+        plugin.Plugin.__announcement_file_write__(self.mock_self, data)
+        result = plugin.Plugin.__announcement_file_read__(self.mock_self)
+        self.assertEqual(result[12345][1]['RefreshSeconds'], '90')
+        self.assertNotIn('Refresh', result[12345][1])
+
+    def test_read_migrates_long_interval_as_integer(self):
+        """A long legacy interval should be migrated as whole seconds, not in exponent notation."""
+        data = {12345: {"1": {"Name": "Test", "Announcement": "Hi", "Refresh": "20000", "nextRefresh": "..."}}}
+        plugin.Plugin.__announcement_file_write__(self.mock_self, data)
+        result = plugin.Plugin.__announcement_file_read__(self.mock_self)
+        self.assertEqual(result[12345][1]['RefreshSeconds'], '1200000')
+
     def test_read_python_literal_fallback(self):
         """A Python-literal file (pre-JSON migration) should be parsed via ast.literal_eval."""
         with open(self.mock_self.announcements_file, 'w', encoding='utf-8') as f:
@@ -525,6 +626,13 @@ class TestAnnouncementCRUD(APIBase):
         self.mock_self.__dict__['__clear_announcement_fields__'] = (
             plugin.Plugin.__clear_announcement_fields__
         )
+        self.mock_self.__dict__['__reindex_announcement__'] = (
+            plugin.Plugin.__reindex_announcement__.__get__(self.mock_self)
+        )
+        self.mock_self.__dict__['__set_quarantine__'] = MagicMock()
+        self.mock_self.template_index   = {}
+        self.mock_self.dependency_index = {}
+        self.mock_self.quarantine       = {}
 
     def _make_data(self) -> dict:
         return {
@@ -540,38 +648,33 @@ class TestAnnouncementCRUD(APIBase):
 
     def test_delete_removes_announcement(self):
         """__announcement_delete__ should remove the selected announcement from the file."""
-        data = self._make_data()
-        self.mock_self.__announcement_file_read__ = MagicMock(return_value=data)
-        self.mock_self.__announcement_file_write__ = MagicMock(return_value=True)
+        save = _attach_store(self.mock_self, self._make_data())
         values_dict = {'announcementList': str(self.ANN_ID)}
         plugin.Plugin.__announcement_delete__(self.mock_self, values_dict, '', self.DEV_ID)
-        written = self.mock_self.__announcement_file_write__.call_args[0][0]
+        written = save.call_args[0][0]
         self.assertNotIn(self.ANN_ID, written.get(self.DEV_ID, {}))
 
     def test_delete_no_op_when_list_empty(self):
         """__announcement_delete__ should return unchanged values_dict when nothing is selected."""
-        self.mock_self.__announcement_file_read__ = MagicMock()
+        save = _attach_store(self.mock_self, self._make_data())
         values_dict = {'announcementList': ''}
         result = plugin.Plugin.__announcement_delete__(self.mock_self, values_dict, '', self.DEV_ID)
-        self.mock_self.__announcement_file_read__.assert_not_called()
+        save.assert_not_called()
         self.assertIs(result, values_dict)
 
     def test_duplicate_creates_copy(self):
         """__announcement_duplicate__ should write a new entry with ' copy' appended to the name."""
-        data = self._make_data()
-        self.mock_self.__announcement_file_read__ = MagicMock(return_value=data)
-        self.mock_self.__announcement_file_write__ = MagicMock(return_value=True)
+        save = _attach_store(self.mock_self, self._make_data())
         self.mock_self.announcement_create_id = MagicMock(return_value=999)
         values_dict = {'announcementList': str(self.ANN_ID)}
         plugin.Plugin.__announcement_duplicate__(self.mock_self, values_dict, '', self.DEV_ID)
-        written = self.mock_self.__announcement_file_write__.call_args[0][0]
+        written = save.call_args[0][0]
         self.assertIn(999, written[self.DEV_ID])
         self.assertIn('copy', written[self.DEV_ID][999]['Name'])
 
     def test_edit_populates_values_dict(self):
         """__announcement_edit__ should load the selected announcement into values_dict."""
-        data = self._make_data()
-        self.mock_self.__announcement_file_read__ = MagicMock(return_value=data)
+        _attach_store(self.mock_self, self._make_data())
         values_dict = {
             'announcementList':    str(self.ANN_ID),
             'announcementName':    '',
@@ -583,9 +686,28 @@ class TestAnnouncementCRUD(APIBase):
         result = plugin.Plugin.__announcement_edit__(self.mock_self, values_dict, '', self.DEV_ID)
         self.assertEqual(result['announcementName'],    'My Announcement')
         self.assertEqual(result['announcementText'],    'Hello world')
-        self.assertEqual(result['announcementRefresh'], '15')
+        # Legacy intervals are stored in minutes and shown in seconds.
+        self.assertEqual(result['announcementRefresh'], '900')
+        self.assertEqual(result['announcementCatchUp'], 'once')
         self.assertTrue(result['editFlag'])
 
+    def test_edit_long_interval_is_an_integer(self):
+        """A long interval should be shown as whole seconds, so the dialog can validate and save it again."""
+        data = self._make_data()
+        data[self.DEV_ID][self.ANN_ID]['RefreshSeconds'] = '1e+06'
+        _attach_store(self.mock_self, data)
+        values_dict = {
+            'announcementList':    str(self.ANN_ID),
+            'announcementName':    '',
+            'announcementRefresh': '',
+            'announcementText':    '',
+            'announcementIndex':   0,
+            'editFlag':            False,
+        }
+        result = plugin.Plugin.__announcement_edit__(self.mock_self, values_dict, '', self.DEV_ID)
+        self.assertEqual(result['announcementRefresh'], '1000000')
+        self.assertEqual(int(result['announcementRefresh']), 1000000)
+
     def _run_save(self, values_dict: dict) -> tuple:
         """Call __announcement_save__ with indigo.Dict patched to a real dict.
 
@@ -598,9 +720,31 @@ class TestAnnouncementCRUD(APIBase):
                 self.mock_self, values_dict, '', self.DEV_ID
             )
 
+    def test_save_edit_updates_indexes(self):
+        """Saving an edited announcement re-indexes only that announcement, without a full rebuild."""
+        data = self._make_data()
+        data[self.DEV_ID][self.ANN_ID]['Announcement'] = "Lamp is %%d:5:onOffState%%"
+        _attach_store(self.mock_self, data)
+        self.mock_self.template_index   = plugin.Plugin.__index_templates__(data)
+        self.mock_self.dependency_index = plugin.Plugin.__index_dependencies__(data)
+        values_dict = {
+            'announcementName':    'Weather',
+            'announcementText':    'It is %%v:7%%',
+            'announcementRefresh': '15',
+            'announcementCatchUp': 'once',
+            'announcementIndex':   self.ANN_ID,
+            'editFlag':            True,
+        }
+        with patch.object(plugin.Plugin, '__index_dependencies__') as rebuild:
+            self._run_save(values_dict)
+        rebuild.assert_not_called()
+        self.assertEqual(self.mock_self.dependency_index, {('v', 7): {(self.DEV_ID, self.ANN_ID)}})
+        self.assertEqual(list(self.mock_self.template_index), [(self.DEV_ID, 'Weather')])
+        self.assertEqual(self.mock_self.template_index[(self.DEV_ID, 'Weather')].text, 'It is %%v:7%%')
+
     def test_save_empty_name_fails(self):
         """__announcement_save__ should return an error dict when the name is empty."""
-        self.mock_self.__announcement_file_read__ = MagicMock(return_value={self.DEV_ID: {}})
+        _attach_store(self.mock_self, {self.DEV_ID: {}})
         values_dict = {
             'announcementName':    '',
             'announcementText':    'Some text',
@@ -613,7 +757,7 @@ class TestAnnouncementCRUD(APIBase):
 
     def test_save_name_starting_with_digit_fails(self):
         """__announcement_save__ should reject a name that starts with a digit."""
-        self.mock_self.__announcement_file_read__ = MagicMock(return_value={self.DEV_ID: {}})
+        _attach_store(self.mock_self, {self.DEV_ID: {}})
         values_dict = {
             'announcementName':    '1invalid',
             'announcementText':    'Some text',
@@ -625,7 +769,7 @@ class TestAnnouncementCRUD(APIBase):
 
     def test_save_empty_text_fails(self):
         """__announcement_save__ should return an error dict when the announcement text is empty."""
-        self.mock_self.__announcement_file_read__ = MagicMock(return_value={self.DEV_ID: {}})
+        _attach_store(self.mock_self, {self.DEV_ID: {}})
         values_dict = {
             'announcementName':    'ValidName',
             'announcementText':    '',
@@ -637,7 +781,7 @@ class TestAnnouncementCRUD(APIBase):
 
     def test_save_zero_refresh_fails(self):
         """__announcement_save__ should reject a refresh interval of zero."""
-        self.mock_self.__announcement_file_read__ = MagicMock(return_value={self.DEV_ID: {}})
+        _attach_store(self.mock_self, {self.DEV_ID: {}})
         values_dict = {
             'announcementName':    'ValidName',
             'announcementText':    'Some text',
@@ -649,7 +793,7 @@ class TestAnnouncementCRUD(APIBase):
 
     def test_save_non_numeric_refresh_fails(self):
         """__announcement_save__ should reject a non-numeric refresh interval."""
-        self.mock_self.__announcement_file_read__ = MagicMock(return_value={self.DEV_ID: {}})
+        _attach_store(self.mock_self, {self.DEV_ID: {}})
         values_dict = {
             'announcementName':    'ValidName',
             'announcementText':    'Some text',
@@ -675,6 +819,17 @@ class TestGeneratorList(APIBase):
         self.mock_self = MagicMock()
         self.mock_self.logger = MagicMock()
 
+    @staticmethod
+    def _devices(dev_id: int, type_id: str, states: dict) -> MagicMock:
+        """Return a mock indigo.devices holding a single plugin device."""
+        dev = MagicMock()
+        dev.deviceTypeId = type_id
+        dev.states       = states
+        devices = MagicMock()
+        devices.__contains__ = lambda _, key: key == dev_id
+        devices.__getitem__  = lambda _, key: dev
+        return devices
+
     def test_returns_sorted_tuples(self):
         """generator_list should return announcements sorted by name."""
         data = {
@@ -683,7 +838,7 @@ class TestGeneratorList(APIBase):
                 2: {'Name': 'Apple', 'Announcement': 'A', 'Refresh': '5', 'nextRefresh': '...'},
             }
         }
-        self.mock_self.__announcement_file_read__ = MagicMock(return_value=data)
+        _attach_store(self.mock_self, data)
         result = plugin.Plugin.generator_list(self.mock_self, target_id=100)
         self.assertEqual(len(result), 2)
         self.assertEqual(result[0][1], 'Apple')
@@ -692,20 +847,2162 @@ class TestGeneratorList(APIBase):
     def test_unknown_device_returns_empty(self):
         """generator_list should return an empty list when target_id is not in the data."""
         data = {100: {1: {'Name': 'Test', 'Announcement': 'Hi', 'Refresh': '5', 'nextRefresh': '...'}}}
-        self.mock_self.__announcement_file_read__ = MagicMock(return_value=data)
+        _attach_store(self.mock_self, data)
         result = plugin.Plugin.generator_list(self.mock_self, target_id=999)
         self.assertEqual(result, [])
 
     def test_empty_data_returns_empty(self):
         """generator_list should return an empty list when the file contains no entries."""
-        self.mock_self.__announcement_file_read__ = MagicMock(return_value={})
+        _attach_store(self.mock_self, {})
         result = plugin.Plugin.generator_list(self.mock_self, target_id=100)
         self.assertEqual(result, [])
 
     def test_single_entry_not_sorted(self):
         """generator_list with one entry should return a single-element list."""
         data = {100: {1: {'Name': 'OnlyOne', 'Announcement': 'Hi', 'Refresh': '5', 'nextRefresh': '...'}}}
-        self.mock_self.__announcement_file_read__ = MagicMock(return_value=data)
+        _attach_store(self.mock_self, data)
         result = plugin.Plugin.generator_list(self.mock_self, target_id=100)
         self.assertEqual(len(result), 1)
         self.assertEqual(result[0][1], 'OnlyOne')
+
+    def test_search_lists_prefix_matches_first(self):
+        """generator_list should list names starting with the search text before names containing it."""
+        names = ['Kitchen Temp', 'Attic Temp', 'Temperature', 'Humidity']
+        data  = {100: {i: {'Name': name, 'Announcement': 'x'} for i, name in enumerate(names)}}
+        _attach_store(self.mock_self, data)
+        result = plugin.Plugin.generator_list(
+            self.mock_self, values_dict={'announcementSearch': 'TEMP'}, target_id=100
+        )
+        self.assertEqual([name for _, name in result], ['Temperature', 'Attic Temp', 'Kitchen Temp'])
+
+    def test_fltr_used_when_search_empty(self):
+        """generator_list should fall back to `fltr` when the search field is empty."""
+        data = {100: {1: {'Name': 'Apple', 'Announcement': 'x'}, 2: {'Name': 'Banana', 'Announcement': 'x'}}}
+        _attach_store(self.mock_self, data)
+        result = plugin.Plugin.generator_list(
+            self.mock_self, fltr='ban', values_dict={'announcementSearch': ''}, target_id=100
+        )
+        self.assertEqual(result, [(2, 'Banana')])
+
+    def test_list_is_limited(self):
+        """generator_list should only list the visible slice, followed by a disabled note."""
+        count = plugin.ANNOUNCEMENT_LIST_LIMIT + 5
+        data  = {100: {i: {'Name': f"A{i:04}", 'Announcement': 'x'} for i in range(count)}}
+        _attach_store(self.mock_self, data)
+        result = plugin.Plugin.generator_list(self.mock_self, target_id=100)
+        self.assertEqual(len(result), plugin.ANNOUNCEMENT_LIST_LIMIT + 1)
+        self.assertEqual(result[-2][1], f"A{plugin.ANNOUNCEMENT_LIST_LIMIT - 1:04}")
+        self.assertEqual(result[-1][0], '-1')
+        self.assertIn('5 more', result[-1][1])
+
+    def test_name_index_follows_snapshot(self):
+        """The name index should be reused until the store changes, then rebuilt."""
+        _attach_store(self.mock_self, {100: {1: {'Name': 'Apple', 'Announcement': 'x'}}})
+        index = self.mock_self.store.names(100)
+        self.assertIs(self.mock_self.store.names(100), index)
+
+        self.mock_self.store.mutate(lambda data: data[100].update({2: {'Name': 'Aardvark', 'Announcement': 'x'}}))
+        result = plugin.Plugin.generator_list(self.mock_self, target_id=100)
+        self.assertIsNot(self.mock_self.store.names(100), index)
+        self.assertEqual(result, [(2, 'Aardvark'), (1, 'Apple')])
+
+    def test_announcement_list_served_from_store(self):
+        """generator_announcement_list should list an announcements device's states from the name index."""
+        data = {100: {1: {'Name': 'Good_Morning', 'Announcement': 'x'}, 2: {'Name': 'Bedtime', 'Announcement': 'x'}}}
+        _attach_store(self.mock_self, data)
+        with patch.object(plugin.indigo, 'devices', self._devices(100, 'announcementsDevice', {})):
+            result = plugin.Plugin.generator_announcement_list(
+                self.mock_self, values_dict={'announcementDeviceToRefresh': '100'}
+            )
+            self.assertEqual(result, [('Bedtime', 'Bedtime'), ('Good_Morning', 'Good Morning')])
+
+            result = plugin.Plugin.generator_announcement_list(
+                self.mock_self, fltr='morn', values_dict={'announcementDeviceToRefresh': '100'}
+            )
+        self.assertEqual(result, [('Good_Morning', 'Good Morning')])
+
+    def test_salutations_device_lists_states(self):
+        """A salutations device lists its intro/outro states, even though the startup audit gives it a store entry."""
+        _attach_store(self.mock_self, {200: {}})
+        states = {'intro': 'Good morning', 'outro': 'Have a nice day', 'onOffState': True}
+        with patch.object(plugin.indigo, 'devices', self._devices(200, 'salutationsDevice', states)):
+            result = plugin.Plugin.generator_announcement_list(
+                self.mock_self, values_dict={'announcementDeviceToRefresh': '200'}
+            )
+        self.assertEqual(result, [('intro', 'intro'), ('outro', 'outro')])
+
+
+class TestCompileTemplate(APIBase):
+    """Unit tests for the templates.compile_template function."""
+
+    __test__ = True
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def test_references_in_order_without_duplicates(self):
+        """Device and variable references should be returned once each, in order of appearance."""
+        result = templates.compile_template("%%v:22%% and %%d:11:temp%% and %%v:22%%")
+        self.assertEqual(result.references, (('v', 22), ('d', 11, 'temp')))
+
+    def test_same_text_returns_same_template(self):
+        """Compiling identical text twice should return the same compiled template."""
+        first  = templates.compile_template("Hello %%v:1%%")
+        second = templates.compile_template("Hello %%v:1%%")
+        self.assertEqual(first.template_id, second.template_id)
+
+    def test_template_id_is_content_addressed(self):
+        """The template ID depends only on the text, so it survives the compiled template being evicted."""
+        first = templates.compile_template("Hello %%v:1%%")
+        templates.compile_template.cache_clear()
+        self.assertEqual(templates.compile_template("Hello %%v:1%%").template_id, first.template_id)
+        self.assertNotEqual(templates.compile_template("Hello %%v:2%%").template_id, first.template_id)
+
+    def test_index_shares_identical_templates(self):
+        """Identical announcement text on different devices shares one compiled template in the template index."""
+        index = plugin.Plugin.__index_templates__({
+            1: {1: {'Name': 'Weather', 'Announcement': "It is %%v:1%%"}},
+            2: {1: {'Name': 'Weather Report', 'Announcement': "It is %%v:1%%"}},
+        })
+        self.assertIs(index[(1, 'Weather')], index[(2, 'Weather_Report')])
+
+    def test_static_template_has_no_time_bucket(self):
+        """A template without current-time formatters always falls into bucket 0."""
+        result = templates.compile_template("<<%%v:1%%, n:1>> degrees")
+        self.assertEqual(result.time_bucket_seconds, 0)
+        self.assertEqual(result.time_bucket(1_000_000.0), 0)
+
+    def test_current_time_template_buckets_by_minute(self):
+        """A ct: formatter without a seconds specifier should bucket by minute."""
+        result = templates.compile_template("It is <<now, ct:%H:%M>>")
+        self.assertEqual(result.time_bucket_seconds, 60)
+        self.assertEqual(result.time_bucket(120.0), result.time_bucket(179.0))
+        self.assertNotEqual(result.time_bucket(179.0), result.time_bucket(180.0))
+
+    def test_seconds_specifier_buckets_by_second(self):
+        """A current-time formatter that shows seconds should bucket by second."""
+        result = templates.compile_template("It is <<now, dt:%H:%M:%S>>")
+        self.assertEqual(result.time_bucket_seconds, 1)
+
+    def test_flagged_seconds_specifier_buckets_by_second(self):
+        """A seconds directive with a flag, such as `%-S`, should bucket by second."""
+        result = templates.compile_template("It is <<now, ct:%H:%M:%-S>>")
+        self.assertEqual(result.time_bucket_seconds, 1)
+        result = templates.compile_template("It is <<now, ct:%-H:%-M>>")
+        self.assertEqual(result.time_bucket_seconds, 60)
+
+
+class TestRenderCache(APIBase):
+    """Unit tests for the render_cache.RenderCache class."""
+
+    __test__ = True
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def test_miss_then_hit(self):
+        """A lookup before a put is a miss; after the put it is a hit."""
+        cache = render_cache.RenderCache(max_entries=4)
+        self.assertIsNone(cache.get(('a',)))
+        cache.put(('a',), "rendered")
+        self.assertEqual(cache.get(('a',)), "rendered")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertAlmostEqual(cache.hit_ratio, 0.5)
+
+    def test_evicts_least_recently_used(self):
+        """The least recently used entry should be evicted when the cache is full."""
+        cache = render_cache.RenderCache(max_entries=2)
+        cache.put(('a',), "A")
+        cache.put(('b',), "B")
+        cache.get(('a',))
+        cache.put(('c',), "C")
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(('b',)))
+        self.assertEqual(cache.get(('a',)), "A")
+
+    def test_clear_resets_statistics(self):
+        """clear() should remove all entries and reset the hit ratio."""
+        cache = render_cache.RenderCache()
+        cache.put(('a',), "A")
+        cache.get(('a',))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.hit_ratio, 0.0)
+
+
+class TestProcessAnnouncement(APIBase):
+    """Unit tests for render memoization in __process_announcement__."""
+
+    __test__ = True
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self.mock_self = MagicMock()
+        self.mock_self.render_cache = render_cache.RenderCache()
+        self.mock_self.pacing = pacing.TickController(target_latency=0.25, max_gap=60)
+        self.mock_self.substitution_regex = MagicMock(side_effect=lambda announcement: announcement)
+        self.values = ['42']
+        self.mock_self.__dict__['__resolve_references__'] = lambda template: tuple(self.values)
+
+    def test_unchanged_inputs_skip_substitute(self):
+        """A second render with unchanged referenced values should be served from the cache."""
+        first  = plugin.Plugin.__process_announcement__(self.mock_self, "It is %%v:1%% degrees")
+        second = plugin.Plugin.__process_announcement__(self.mock_self, "It is %%v:1%% degrees")
+        self.assertEqual(first, second)
+        self.mock_self.substitution_regex.assert_called_once()
+        self.assertEqual(self.mock_self.render_cache.hits, 1)
+
+    def test_changed_value_renders_again(self):
+        """A change in a referenced value should bypass the cached render."""
+        plugin.Plugin.__process_announcement__(self.mock_self, "It is %%v:1%% degrees")
+        self.values = ['43']
+        plugin.Plugin.__process_announcement__(self.mock_self, "It is %%v:1%% degrees")
+        self.assertEqual(self.mock_self.substitution_regex.call_count, 2)
+
+    def test_renders_the_resolved_values(self):
+        """The render substitutes the values its cache key was built from, without asking the server again."""
+        result = plugin.Plugin.__process_announcement__(self.mock_self, "It is %%v:1%% degrees")
+        self.assertEqual(result, "It is 42 degrees")
+        self.mock_self.substitute.assert_not_called()
+
+
+class TestSubstituteValues(APIBase):
+    """Unit tests for the templates.substitute_values function."""
+
+    __test__ = True
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def test_each_reference_substituted(self):
+        """Every occurrence of each reference is replaced by its resolved value."""
+        template = templates.compile_template("%%d:11:temp%% and %%v:22%%, again %%d:11:temp%%")
+        self.assertEqual(templates.substitute_values(template, ("70", "on")), "70 and on, again 70")
+
+    def test_missing_reference_left_as_is(self):
+        """A reference that resolved to None is left in the text, as the server would."""
+        template = templates.compile_template("%%v:22%% and %%v:23%%")
+        self.assertEqual(templates.substitute_values(template, ("on", None)), "on and %%v:23%%")
+
+
+class TestSalutationSchedule(APIBase):
+    """Unit tests for salutation period boundaries and __update_salutations_device__."""
+
+    __test__ = True
+
+    PROPS = {
+        'morningStart': '5', 'morningMessageIn': 'Good morning', 'morningMessageOut': 'Bye morning',
+        'afternoonStart': '12', 'afternoonMessageIn': 'Good afternoon', 'afternoonMessageOut': 'Bye afternoon',
+        'eveningStart': '17', 'eveningMessageIn': 'Good evening', 'eveningMessageOut': 'Bye evening',
+        'nightStart': '22', 'nightMessageIn': 'Good night', 'nightMessageOut': 'Bye night',
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+        cls.boundaries = scheduling.salutation_boundaries(cls.PROPS)
+
+    def test_mid_period(self):
+        """A time inside the afternoon should report the afternoon and the evening boundary."""
+        current, next_boundary = scheduling.salutation_period(dt.datetime(2025, 6, 1, 13, 30), self.boundaries)
+        self.assertEqual(current[1], 'afternoon')
+        self.assertEqual(current[2], 'Good afternoon')
+        self.assertEqual(next_boundary, dt.datetime(2025, 6, 1, 17, 0))
+
+    def test_before_morning_is_night(self):
+        """The small hours should carry over the previous night's salutation."""
+        current, next_boundary = scheduling.salutation_period(dt.datetime(2025, 6, 1, 2, 0), self.boundaries)
+        self.assertEqual(current[1], 'night')
+        self.assertEqual(next_boundary, dt.datetime(2025, 6, 1, 5, 0))
+
+    def test_after_night_rolls_to_tomorrow(self):
+        """After the night boundary, the next boundary is tomorrow morning."""
+        current, next_boundary = scheduling.salutation_period(dt.datetime(2025, 6, 1, 23, 0), self.boundaries)
+        self.assertEqual(current[1], 'night')
+        self.assertEqual(next_boundary, dt.datetime(2025, 6, 2, 5, 0))
+
+    def test_exactly_on_boundary(self):
+        """A time exactly on a boundary belongs to the period that starts there."""
+        current, next_boundary = scheduling.salutation_period(dt.datetime(2025, 6, 1, 17, 0), self.boundaries)
+        self.assertEqual(current[1], 'evening')
+        self.assertEqual(next_boundary, dt.datetime(2025, 6, 1, 22, 0))
+
+    def test_update_skips_server_when_unchanged(self):
+        """__update_salutations_device__ should not call the server when intro and outro are current."""
+        mock_self = MagicMock()
+        mock_self.salutation_schedule = {}
+        dev = MagicMock()
+        dev.id = 1
+        dev.pluginProps = self.PROPS
+        current, _ = scheduling.salutation_period(dt.datetime.now(), self.boundaries)
+        dev.states = {'intro': current[2], 'outro': current[3]}
+        plugin.Plugin.__update_salutations_device__(mock_self, dev)
+        dev.updateStatesOnServer.assert_not_called()
+        self.assertGreater(mock_self.salutation_schedule[1]['next'], 0)
+
+
+class TestSpeechQueue(APIBase):
+    """Unit tests for the speech.SpeechQueue class, using a sink that records calls."""
+
+    __test__ = True
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self.spoken = []
+        self.queue  = speech.SpeechQueue(sink=self.spoken.append, max_depth=3, logger=MagicMock())
+
+    def tearDown(self):
+        self.queue.stop()
+
+    def test_spoken_in_priority_order(self):
+        """Pending utterances are spoken most urgent first, then in arrival order."""
+        self.queue.enqueue("low", priority=speech.PRIORITIES['low'])
+        self.queue.enqueue("normal one")
+        self.queue.enqueue("high", priority=speech.PRIORITIES['high'])
+        self.queue.start()
+        self.assertTrue(self.queue.join(timeout=2))
+        self.assertEqual(self.spoken, ["high", "normal one", "low"])
+
+    def test_identical_pending_utterances_coalesce(self):
+        """An utterance identical to a pending one is spoken once, at the more urgent priority."""
+        self.queue.enqueue("other")
+        self.queue.enqueue("repeat", priority=speech.PRIORITIES['low'])
+        self.queue.enqueue("repeat", priority=speech.PRIORITIES['high'])
+        self.queue.start()
+        self.queue.join(timeout=2)
+        self.assertEqual(self.spoken, ["repeat", "other"])
+        self.assertEqual(self.queue.status()['coalesced'], 1)
+
+    def test_full_queue_drops_lowest_priority(self):
+        """With the 'lowest' policy, a full queue drops its least urgent utterance."""
+        self.queue.enqueue("a", priority=speech.PRIORITIES['low'])
+        self.queue.enqueue("b")
+        self.queue.enqueue("c")
+        self.assertTrue(self.queue.enqueue("d", priority=speech.PRIORITIES['high']))
+        self.assertEqual(self.queue.status()['pending'], ["d", "b", "c"])
+        self.assertEqual(self.queue.dropped, 1)
+
+    def test_full_queue_drops_newest(self):
+        """With the 'newest' policy, the utterance being enqueued is rejected."""
+        self.queue.drop_policy = 'newest'
+        for text in ("a", "b", "c"):
+            self.queue.enqueue(text)
+        self.assertFalse(self.queue.enqueue("d", priority=speech.PRIORITIES['high']))
+        self.assertEqual(self.queue.status()['pending'], ["a", "b", "c"])
+
+    def test_full_queue_drops_oldest(self):
+        """With the 'oldest' policy, the earliest pending utterance is dropped."""
+        self.queue.drop_policy = 'oldest'
+        for text in ("a", "b", "c", "d"):
+            self.queue.enqueue(text)
+        self.assertEqual(self.queue.status()['pending'], ["b", "c", "d"])
+
+    def test_flush_discards_pending(self):
+        """flush() should discard pending utterances and report how many there were."""
+        self.queue.enqueue("a")
+        self.queue.enqueue("b")
+        self.assertEqual(self.queue.flush(), 2)
+        self.assertEqual(self.queue.status()['depth'], 0)
+
+    def test_sink_error_does_not_stop_worker(self):
+        """A failing sink call should be logged and the next utterance still spoken."""
+        def sink(text):
+            if text == "bad":
+                raise RuntimeError
+            self.spoken.append(text)
+        self.queue.sink = sink
+        self.queue.enqueue("bad", priority=speech.PRIORITIES['high'])
+        self.queue.enqueue("good")
+        self.queue.start()
+        self.queue.join(timeout=2)
+        self.assertEqual(self.spoken, ["good"])
+
+    def test_unknown_drop_policy_raises(self):
+        """An unknown drop policy should be rejected at construction."""
+        with self.assertRaises(ValueError):
+            speech.SpeechQueue(sink=print, drop_policy='random')
+
+
+class TestRenderSpeakAction(APIBase):
+    """Unit tests for announcement_render_speak_action."""
+
+    __test__ = True
+
+    DEV_ID = 12345
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self.pushed    = threading.Event()
+        self.mock_self = MagicMock()
+        self.mock_self.speak_latency  = metrics.LatencyStats()
+        self.mock_self.template_index = {
+            (self.DEV_ID, 'Weather'): templates.compile_template("It is %%v:1%% degrees")
+        }
+        self.mock_self.__dict__['__process_announcement__'] = lambda text: text.replace("%%v:1%%", "42")
+        self.mock_self.__dict__['__push_announcement_state__'] = lambda *args: self.pushed.set()
+
+    def _action(self, state_name: str) -> MagicMock:
+        action = MagicMock()
+        action.props = {'announcementDeviceToRefresh': str(self.DEV_ID), 'announcementToSpeak': state_name}
+        return action
+
+    def test_renders_from_index_and_enqueues(self):
+        """The announcement is rendered from the template index and queued."""
+        plugin.Plugin.announcement_render_speak_action(self.mock_self, self._action('Weather'))
+        self.mock_self.speech_queue.enqueue.assert_called_once_with(
+            "It is 42 degrees", priority=speech.PRIORITIES['normal']
+        )
+        self.assertTrue(self.pushed.wait(timeout=2), "The device state was not written.")
+        self.assertEqual(self.mock_self.speak_latency.count, 1)
+
+    def test_unknown_announcement_warns(self):
+        """An announcement missing from the index should log a warning and speak nothing."""
+        plugin.Plugin.announcement_render_speak_action(self.mock_self, self._action('Missing'))
+        self.mock_self.speech_queue.enqueue.assert_not_called()
+        self.mock_self.logger.warning.assert_called_once()
+
+
+class TestRefreshBudget(APIBase):
+    """Unit tests for the time/work budget in announcement_update_states."""
+
+    __test__ = True
+
+    DEV_ID = 12345
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self.data = {
+            self.DEV_ID: {
+                1: {'Name': 'Oldest', 'Announcement': 'A', 'Refresh': '5', 'nextRefresh': '2025-01-01 00:00:00'},
+                2: {'Name': 'Newest', 'Announcement': 'C', 'Refresh': '5', 'nextRefresh': '2025-01-01 00:02:00'},
+                3: {'Name': 'Middle', 'Announcement': 'B', 'Refresh': '5', 'nextRefresh': '2025-01-01 00:01:00'},
+            }
+        }
+        self.dev = MagicMock()
+        self.dev.id           = self.DEV_ID
+        self.dev.enabled      = True
+        self.dev.deviceTypeId = 'announcementsDevice'
+
+        mock_self = MagicMock()
+        mock_self.pluginPrefs         = {'tickTimeBudget': '0', 'tickWorkBudget': '2', 'refreshTolerance': '50'}
+        mock_self.forced_refresh      = set()
+        mock_self.salutation_schedule = {}
+        mock_self.tick_stats          = {
+            'backlog': 0, 'max_backlog': 0, 'lateness': 0.0, 'max_lateness': 0.0, 'renders': 0, 'shared': 0
+        }
+        mock_self.triggers            = triggers.TriggerIndex()
+        mock_self.pacing              = pacing.TickController(target_latency=0.25, max_gap=60)
+        mock_self.update_frequency    = 15
+        mock_self.__dict__['__process_announcement__'] = lambda text: text
+        mock_self.__dict__['__due_announcements__'] = (
+            lambda *args: plugin.Plugin.__due_announcements__(mock_self, *args)
+        )
+        mock_self.__dict__['__update_announcement__'] = (
+            lambda *args: plugin.Plugin.__update_announcement__(mock_self, *args)
+        )
+        mock_self.__dict__['__refresh_device__'] = lambda *args: plugin.Plugin.__refresh_device__(mock_self, *args)
+        self.mock_self = mock_self
+        self.save      = _attach_store(mock_self, self.data)
+
+    def _run_pass(self, force: bool = False) -> list:
+        self.dev.updateStatesOnServer.reset_mock()
+        with patch.object(plugin.indigo.devices, 'iter', return_value=[self.dev]):
+            plugin.Plugin.announcement_update_states(self.mock_self, force=force)
+        if not self.dev.updateStatesOnServer.called:
+            return []
+        return [state['key'] for state in self.dev.updateStatesOnServer.call_args[0][0] if state['key'] != 'onOffState']
+
+    def test_work_budget_carries_over_in_deadline_order(self):
+        """Only the two most overdue announcements are refreshed; the third carries over to the next pass."""
+        self.assertEqual(self._run_pass(), ['Oldest', 'Middle'])
+        self.assertEqual(self.mock_self.refresh_backlog, 1)
+        self.assertEqual(self.mock_self.tick_stats['backlog'], 1)
+        self.assertGreater(self.mock_self.tick_stats['max_lateness'], 0)
+        self.assertEqual(self._run_pass(), ['Newest'])
+        self.assertEqual(self.mock_self.refresh_backlog, 0)
+
+    def test_edit_during_pass_is_kept(self):
+        """A refresh time changed while the pass was running (e.g., by an edit) isn't overwritten by the pass."""
+        refresh_device = self.mock_self.__dict__['__refresh_device__']
+
+        def edit_then_refresh(*args):
+            result = refresh_device(*args)
+            self.mock_self.store.mutate(
+                lambda current: current[self.DEV_ID][1].update(nextRefresh='2030-01-01 00:00:00')
+            )
+            return result
+
+        self.mock_self.__dict__['__refresh_device__'] = edit_then_refresh
+        self.assertEqual(self._run_pass(), ['Oldest', 'Middle'])
+        current = self.mock_self.store.snapshot().data[self.DEV_ID]
+        self.assertEqual(current[1]['nextRefresh'], '2030-01-01 00:00:00')
+        self.assertNotEqual(current[3]['nextRefresh'], '2025-01-01 00:01:00')
+
+    def test_passes_are_serialized(self):
+        """Passes started from several threads at once run one at a time."""
+        self.mock_self.refresh_lock = threading.RLock()
+        refresh_device = self.mock_self.__dict__['__refresh_device__']
+        running        = []
+        overlapped     = []
+
+        def slow_refresh(*args):
+            running.append(1)
+            overlapped.append(len(running) > 1)
+            time.sleep(0.02)
+            running.pop()
+            return refresh_device(*args)
+
+        self.mock_self.__dict__['__refresh_device__'] = slow_refresh
+        with patch.object(plugin.indigo.devices, 'iter', return_value=[self.dev]):
+            passes = [
+                threading.Thread(target=plugin.Plugin.announcement_update_states, args=(self.mock_self, True))
+                for _ in range(4)
+            ]
+            for thread in passes:
+                thread.start()
+            for thread in passes:
+                thread.join()
+        self.assertEqual(len(overlapped), 4)
+        self.assertFalse(any(overlapped))
+
+    def test_pacing_sheds_least_overdue(self):
+        """While the server is under load, a pass refreshes only a share of the due announcements, oldest first."""
+        self.mock_self.pluginPrefs['tickWorkBudget'] = '0'
+        self.mock_self.pacing.stretch = 3.0
+        self.assertEqual(self._run_pass(), ['Oldest'])
+        self.assertEqual(self.mock_self.refresh_backlog, 2)
+
+    def test_forced_refresh_carries_over(self):
+        """A forced refresh that exceeds the budget finishes in later passes."""
+        for announcement in self.data[self.DEV_ID].values():
+            announcement['nextRefresh'] = '2999-01-01 00:00:00'
+        self.mock_self.store.load()
+        self.assertEqual(len(self._run_pass(force=True)), 2)
+        self.assertEqual(len(self._run_pass()), 1)
+        self.assertEqual(self._run_pass(), [])
+
+    def test_pass_does_not_resurrect_deleted_announcement(self):
+        """An announcement deleted while a pass is rendering stays deleted when the refresh times are saved."""
+        def render_and_delete(text):
+            self.mock_self.store.mutate(lambda announcements: announcements[self.DEV_ID].pop(2))
+            return text
+
+        self.mock_self.__dict__['__process_announcement__'] = render_and_delete
+        self._run_pass()
+        self.assertNotIn(2, self.save.call_args[0][0][self.DEV_ID])
+        self.assertNotIn(2, self.mock_self.store.snapshot().data[self.DEV_ID])
+
+
+class TestRenderWorkers(APIBase):
+    """Unit tests for concurrent device refreshes in announcement_update_states.
+
+    The Indigo server is replaced by a stand-in that adds a fixed latency to each substitution and state update.
+    """
+
+    __test__ = True
+
+    DEVICES = 8
+    LATENCY = 0.02
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self.devices = []
+        data         = {}
+        for dev_id in range(1, self.DEVICES + 1):
+            dev = MagicMock()
+            dev.id           = dev_id
+            dev.name         = f"Device {dev_id}"
+            dev.enabled      = True
+            dev.deviceTypeId = 'announcementsDevice'
+            dev.updateStatesOnServer.side_effect = lambda states: time.sleep(self.LATENCY)
+            self.devices.append(dev)
+            data[dev_id] = {
+                key: {'Name': f"A{key}", 'Announcement': f"{dev_id}.{key}", 'RefreshSeconds': '60',
+                      'nextRefresh': '2025-01-01 00:00:00'}
+                for key in (1, 2)
+            }
+
+        mock_self = MagicMock()
+        mock_self.pluginPrefs         = {'tickTimeBudget': '0', 'tickWorkBudget': '0', 'refreshTolerance': '0'}
+        mock_self.forced_refresh      = set()
+        mock_self.salutation_schedule = {}
+        mock_self.tick_stats          = {
+            'backlog': 0, 'max_backlog': 0, 'lateness': 0.0, 'max_lateness': 0.0, 'renders': 0, 'shared': 0
+        }
+        mock_self.triggers            = triggers.TriggerIndex()
+        mock_self.pacing              = pacing.TickController(target_latency=0.25, max_gap=60)
+        mock_self.update_frequency    = 15
+        mock_self.__dict__['__process_announcement__'] = self._substitute
+        mock_self.__dict__['__due_announcements__'] = (
+            lambda *args: plugin.Plugin.__due_announcements__(mock_self, *args)
+        )
+        mock_self.__dict__['__update_announcement__'] = (
+            lambda *args: plugin.Plugin.__update_announcement__(mock_self, *args)
+        )
+        mock_self.__dict__['__refresh_device__'] = lambda *args: plugin.Plugin.__refresh_device__(mock_self, *args)
+        self.data      = data
+        self.mock_self = mock_self
+        self.save      = _attach_store(mock_self, data)
+
+    def _substitute(self, text: str) -> str:
+        time.sleep(self.LATENCY)
+        return text
+
+    def _run_pass(self, workers: int) -> tuple:
+        self.mock_self.pluginPrefs['renderWorkers'] = str(workers)
+        self.mock_self.store.load()
+        started = time.monotonic()
+        with patch.object(plugin.indigo.devices, 'iter', return_value=self.devices):
+            plugin.Plugin.announcement_update_states(self.mock_self)
+        elapsed = time.monotonic() - started
+        states  = [dev.updateStatesOnServer.call_args[0][0] for dev in self.devices]
+        return states, elapsed
+
+    def test_workers_match_sequential_results(self):
+        """The same states are pushed to each device with one worker and with several."""
+        sequential, _ = self._run_pass(1)
+        pooled, _     = self._run_pass(4)
+        self.assertEqual(pooled, sequential)
+        self.assertEqual(sequential[0][0], {'key': 'A1', 'value': '1.1'})
+        self.assertEqual(self.save.call_count, 2)
+
+    def test_workers_overlap_server_latency(self):
+        """With eight workers, a pass over eight devices takes well under the sequential time."""
+        _, sequential = self._run_pass(1)
+        _, pooled     = self._run_pass(8)
+        self.assertLess(pooled, sequential / 2)
+
+    def test_identical_text_rendered_once_per_pass(self):
+        """Announcements with the same text on different devices are rendered once and shared with every device."""
+        rendered = []
+        self.mock_self.__dict__['__process_announcement__'] = lambda text: rendered.append(text) or text.upper()
+        for announcements in self.data.values():
+            announcements[1]['Announcement'] = "shared"
+        states, _ = self._run_pass(4)
+        self.assertEqual(rendered.count("shared"), 1)
+        self.assertTrue(all({'key': 'A1', 'value': 'SHARED'} in device_states for device_states in states))
+        self.assertEqual(self.mock_self.tick_stats['renders'], 2 * self.DEVICES)
+        self.assertEqual(self.mock_self.tick_stats['shared'], self.DEVICES - 1)
+
+    def test_device_error_is_isolated(self):
+        """A device whose state update fails is logged; the other devices are still updated."""
+        self.devices[2].updateStatesOnServer.side_effect = RuntimeError
+        self._run_pass(4)
+        self.mock_self.render_errors.error.assert_called_once()
+        self.assertEqual(self.mock_self.render_errors.error.call_args.args[:2], (3, logging.WARNING))
+        for dev in self.devices:
+            dev.updateStatesOnServer.assert_called_once()
+        self.assertEqual(self.mock_self.refresh_backlog, 0)
+
+
+class TestFormattingProcesses(APIBase):
+    """Unit tests for formatting announcements in the formatting process pool."""
+
+    __test__ = True
+
+    ANNOUNCEMENTS = [
+        f"Reading {index}: <<{index * 1.2345}, n:2>> on <<2025-01-0{index % 9 + 1} 12:00:00, dt:%A>>"
+        for index in range(200)
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self.mock_self = MagicMock()
+        self.mock_self.format_pool  = None
+        self.mock_self.pluginPrefs  = {'formatWorkers': '2'}
+        self.mock_self.render_cache = render_cache.RenderCache()
+        self.mock_self.substitute   = lambda text: text
+        self.mock_self.__dict__['__resolve_references__'] = plugin.Plugin.__resolve_references__
+        self.mock_self.__dict__['__stop_format_pool__'] = lambda: plugin.Plugin.__stop_format_pool__(self.mock_self)
+        self.mock_self.__dict__['__format_announcements__'] = (
+            lambda texts: plugin.Plugin.__format_announcements__(self.mock_self, texts)
+        )
+
+    def tearDown(self):
+        plugin.Plugin.__stop_format_pool__(self.mock_self)
+
+    def test_pool_matches_inline_formatting(self):
+        """Announcements formatted in the pool match the inline pipeline, in order."""
+        result = plugin.Plugin.__format_announcements__(self.mock_self, self.ANNOUNCEMENTS)
+        self.assertEqual(result, formatting.render_batch(self.ANNOUNCEMENTS))
+        self.assertEqual(result[1], "Reading 1: 1.23 on Thursday")
+
+    def test_pool_failure_falls_back_inline(self):
+        """If the pool can't be started, the announcements are formatted inline and the pool is turned off."""
+        with patch.object(plugin.concurrent.futures, 'ProcessPoolExecutor', side_effect=OSError):
+            result = plugin.Plugin.__format_announcements__(self.mock_self, self.ANNOUNCEMENTS)
+        self.assertEqual(result, formatting.render_batch(self.ANNOUNCEMENTS))
+        self.assertEqual(self.mock_self.pluginPrefs['formatWorkers'], "0")
+        self.mock_self.logger.warning.assert_called_once()
+
+    def test_prerender_memoizes(self):
+        """Prerendered announcements are memoized, and duplicates are only formatted once."""
+        self.mock_self.pluginPrefs['formatWorkers'] = '0'
+        texts    = self.ANNOUNCEMENTS[:3] + self.ANNOUNCEMENTS[:1]
+        rendered = plugin.Plugin.__prerender_announcements__(self.mock_self, texts)
+        self.assertEqual(len(rendered), 3)
+        self.assertEqual(len(self.mock_self.render_cache), 3)
+        plugin.Plugin.__prerender_announcements__(self.mock_self, texts)
+        self.assertEqual(self.mock_self.render_cache.hits, 3)
+
+    def test_scaling(self):
+        """Format a large batch with 1, 2, 4 and 8 processes. Run pytest with -s to see the timings."""
+        announcements = self.ANNOUNCEMENTS * 50
+        expected      = formatting.render_batch(announcements)
+        timings       = {}
+
+        for workers in (1, 2, 4, 8):
+            with self.subTest(workers=workers):
+                self.mock_self.pluginPrefs['formatWorkers'] = str(workers)
+                plugin.Plugin.__format_announcements__(self.mock_self, announcements[:workers])  # start the pool
+                started = time.monotonic()
+                result  = plugin.Plugin.__format_announcements__(self.mock_self, announcements)
+                timings[workers] = time.monotonic() - started
+                plugin.Plugin.__stop_format_pool__(self.mock_self)
+                self.assertEqual(result, expected)
+
+        print("\nFormatting processes:", ", ".join(f"{w}: {t * 1000:.0f} ms" for w, t in timings.items()))
+
+
+class TestStartup(APIBase):
+    """Unit tests for plugin startup and the deferred startup audit."""
+
+    __test__ = True
+
+    DEVICES       = 50
+    ANNOUNCEMENTS = 40
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        os.makedirs(f"{self._tmp.name}/Preferences/Plugins")
+        data = {
+            dev_id: {
+                key: {'Name': f"A{key}", 'Announcement': f"%%v:{key}%% <<1.5, n:1>>", 'Refresh': '15',
+                      'nextRefresh': '2025-01-01 00:00:00'}
+                for key in range(self.ANNOUNCEMENTS)
+            }
+            for dev_id in range(1, self.DEVICES + 1)
+        }
+        path = f"{self._tmp.name}/Preferences/Plugins/com.fogbert.indigoplugin.announcements.txt"
+        with open(path, 'w', encoding="utf-8") as outfile:
+            json.dump(data, outfile)
+
+        mock_self = MagicMock()
+        mock_self.__dict__['__announcement_file_read__'] = (
+            lambda: plugin.Plugin.__announcement_file_read__(mock_self)
+        )
+        mock_self.__dict__['__announcement_file_write__'] = MagicMock(return_value=True)
+        mock_self.__dict__['__audit_announcements__'] = plugin.Plugin.__audit_announcements__
+        mock_self.__dict__['__startup_audit__'] = MagicMock()
+        mock_self.__dict__['__prewarm__'] = MagicMock()
+        mock_self.__dict__['__configure_recorder__'] = MagicMock()
+        mock_self.__dict__['__configure_metrics_server__'] = MagicMock()
+        mock_self.__dict__['__set_quarantine__'] = MagicMock()
+        mock_self.initialize_announcements_file = lambda: plugin.Plugin.initialize_announcements_file(mock_self)
+        mock_self.store = store.AnnouncementStore(
+            load=mock_self.__dict__['__announcement_file_read__'],
+            save=mock_self.__dict__['__announcement_file_write__'],
+        )
+        self.mock_self = mock_self
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _startup(self) -> None:
+        with patch.object(plugin.indigo.server, 'getInstallFolderPath', return_value=self._tmp.name):
+            plugin.Plugin.startup(self.mock_self)
+
+    def test_startup_defers_work(self):
+        """Startup loads a 2,000 announcement database and leaves the audit and prewarm to background threads.
+
+        The work is counted rather than timed: no announcements file writes, device iteration, per-reference lookups
+        or state updates happen before the deferred threads start.
+        """
+        devices = MagicMock()
+        with patch.object(plugin.indigo, 'devices', devices), \
+                patch.object(plugin.threading, 'Thread') as thread:
+            self._startup()
+
+        self.assertEqual(len(self.mock_self.store.snapshot().data), self.DEVICES)
+        self.mock_self.__dict__['__announcement_file_write__'].assert_not_called()
+        self.mock_self.__dict__['__startup_audit__'].assert_not_called()
+        self.mock_self.__dict__['__prewarm__'].assert_not_called()
+        devices.iter.assert_not_called()
+        # Dangling references are found with one fetch of the existing IDs, not a lookup per reference.
+        devices.__contains__.assert_not_called()
+        self.assertEqual(devices.keys.call_count, 1)
+        self.assertEqual(
+            [call.kwargs['target'] for call in thread.call_args_list],
+            [self.mock_self.__dict__['__startup_audit__'], self.mock_self.__dict__['__prewarm__']]
+        )
+        self.assertEqual(thread.return_value.start.call_count, 2)
+
+    def test_audit_prunes_and_persists_migration(self):
+        """The startup audit drops deleted devices and saves the migrated refresh intervals."""
+        self._startup()
+        devices = MagicMock()
+        devices.__contains__ = lambda _, dev_id: dev_id != 2
+        devices.iter.return_value = []
+        with patch.object(plugin.indigo, 'devices', devices):
+            plugin.Plugin.__startup_audit__(self.mock_self)
+        written = self.mock_self.__dict__['__announcement_file_write__'].call_args[0][0]
+        self.assertNotIn(2, written)
+        self.assertEqual(written[1][0]['RefreshSeconds'], '900')
+
+
+class TestDeletionPruning(APIBase):
+    """Unit tests for pruning announcements and dependencies when devices and variables are deleted."""
+
+    __test__ = True
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self.data = {
+            1: {10: {'Name': 'Lamp', 'Announcement': "Lamp is %%d:5:onOffState%%"}},
+            2: {20: {'Name': 'Weather', 'Announcement': "It is %%v:7%% and %%d:1:Lamp%%"}},
+        }
+        self.devices   = MagicMock()
+        self.devices.__contains__ = lambda _, dev_id: dev_id in (1, 2, 5)
+        self.variables = MagicMock()
+        self.variables.__contains__ = lambda _, var_id: var_id == 7
+
+        mock_self = MagicMock()
+        mock_self.forced_refresh      = {(1, 10), (2, 20)}
+        mock_self.quarantine          = {}
+        mock_self.salutation_schedule = {1: {'next': 0}}
+        mock_self.template_index      = {}
+        for name in ('__set_quarantine__', '__quarantine_dependents__', '__rearm_dependents__',
+                     '__reindex_announcement__'):
+            mock_self.__dict__[name] = getattr(plugin.Plugin, name).__get__(mock_self)
+        mock_self.__dict__['__push_announcement_state__'] = MagicMock()
+        self.save      = _attach_store(mock_self, self.data)
+        self.mock_self = mock_self
+        base           = patch.object(plugin.indigo, 'PluginBase')
+        self.base      = base.start()
+        self.addCleanup(base.stop)
+        with patch.object(plugin.indigo, 'devices', self.devices), \
+                patch.object(plugin.indigo, 'variables', self.variables):
+            mock_self.dependency_index = plugin.Plugin.__index_dependencies__(self.data)
+
+    def _device(self, dev_id: int) -> MagicMock:
+        dev = MagicMock()
+        dev.id = dev_id
+        return dev
+
+    def test_index_maps_references_to_announcements(self):
+        """Each referenced device and variable maps to the announcements that use it."""
+        self.assertEqual(
+            self.mock_self.dependency_index, {('d', 5): {(1, 10)}, ('v', 7): {(2, 20)}, ('d', 1): {(2, 20)}}
+        )
+
+    def test_index_built_without_server_lookups(self):
+        """The index is built from the announcement text alone, without asking the server what exists."""
+        self.variables.__contains__ = MagicMock(return_value=False)
+        with patch.object(plugin.indigo, 'variables', self.variables):
+            index = plugin.Plugin.__index_dependencies__(self.data)
+        self.assertIn(('v', 7), index)
+        self.variables.__contains__.assert_not_called()
+
+    def test_reindex_removed_announcement(self):
+        """Removing an announcement drops it from the dependency and template indexes."""
+        self.mock_self.template_index = plugin.Plugin.__index_templates__(self.data)
+        plugin.Plugin.__reindex_announcement__(self.mock_self, 2, 20, self.data[2][20], None)
+        self.assertEqual(self.mock_self.dependency_index, {('d', 5): {(1, 10)}})
+        self.assertNotIn((2, 'Weather'), self.mock_self.template_index)
+
+    def test_plugin_device_deleted(self):
+        """Deleting a plugin device removes its announcements, schedule, pending refreshes and dependencies."""
+        plugin.Plugin.device_deleted(self.mock_self, self._device(1))
+        self.assertNotIn(1, self.save.call_args[0][0])
+        self.assertNotIn(1, self.mock_self.store.snapshot().data)
+        self.assertEqual(self.mock_self.forced_refresh, {(2, 20)})
+        self.assertNotIn(1, self.mock_self.salutation_schedule)
+        self.assertNotIn(('d', 1), self.mock_self.dependency_index)
+
+    def test_base_callbacks_called_first(self):
+        """The device callbacks call the Indigo base implementation before doing their own work."""
+        calls = []
+        self.base.device_deleted.side_effect = lambda *args: calls.append('base')
+        self.mock_self.catalog.remove_device.side_effect = lambda *args: calls.append('catalog')
+        dev = self._device(1)
+        plugin.Plugin.device_deleted(self.mock_self, dev)
+        self.base.device_deleted.assert_called_once_with(self.mock_self, dev)
+        self.assertEqual(calls[:2], ['base', 'catalog'])
+
+        plugin.Plugin.device_created(self.mock_self, dev)
+        self.base.device_created.assert_called_once_with(self.mock_self, dev)
+
+        new_dev = self._device(1)
+        plugin.Plugin.device_updated(self.mock_self, dev, new_dev)
+        self.base.device_updated.assert_called_once_with(self.mock_self, dev, new_dev)
+        self.mock_self.catalog.update_device.assert_called_with(new_dev)
+
+    def test_other_device_deleted(self):
+        """Deleting a referenced device drops its dependency entries without touching the announcements."""
+        plugin.Plugin.device_deleted(self.mock_self, self._device(5))
+        self.assertNotIn(('d', 5), self.mock_self.dependency_index)
+        self.save.assert_not_called()
+
+    def test_variable_deleted(self):
+        """Deleting a referenced variable drops its dependency entries."""
+        var = MagicMock()
+        var.id = 7
+        plugin.Plugin.variable_deleted(self.mock_self, var)
+        self.assertNotIn(('v', 7), self.mock_self.dependency_index)
+
+    def test_dangling_references_indexed(self):
+        """Announcements referencing missing devices or variables are found with what they're missing."""
+        self.variables.keys.return_value = []
+        self.devices.keys.return_value   = [5]
+        self.devices.__contains__        = MagicMock()
+        with patch.object(plugin.indigo, 'devices', self.devices), \
+                patch.object(plugin.indigo, 'variables', self.variables):
+            dangling = plugin.Plugin.__index_dangling__(self.data)
+        self.assertEqual(dangling, {(2, 20): (('d', 1), ('v', 7))})
+        # The existing IDs are fetched once rather than looked up per reference.
+        self.devices.__contains__.assert_not_called()
+        self.assertEqual(
+            plugin._quarantine_message(dangling[(2, 20)]), "Unavailable: device 1, variable 7 no longer exist."
+        )
+
+    def test_deleted_reference_quarantines(self):
+        """Deleting a referenced variable quarantines its announcements once, with a state saying what's missing."""
+        var = MagicMock()
+        var.id = 7
+        plugin.Plugin.variable_deleted(self.mock_self, var)
+        self.assertEqual(self.mock_self.quarantine, {(2, 20): (('v', 7),)})
+        self.mock_self.__dict__['__push_announcement_state__'].assert_called_once_with(
+            2, 'Weather', "Unavailable: variable 7 no longer exists."
+        )
+        self.mock_self.logger.warning.assert_called_once()
+
+        # Re-indexing with the same dangling references doesn't report them again.
+        plugin.Plugin.__set_quarantine__(self.mock_self, dict(self.mock_self.quarantine), self.data)
+        self.mock_self.logger.warning.assert_called_once()
+
+    def test_edit_quarantines_new_reference(self):
+        """Editing an announcement to reference a missing variable quarantines it; editing it back releases it."""
+        before = self.data[1][10]
+        after  = dict(before, Announcement="Lamp is %%v:8%%")
+        self.data[1][10] = after
+        with patch.object(plugin.indigo, 'devices', self.devices), \
+                patch.object(plugin.indigo, 'variables', self.variables):
+            plugin.Plugin.__reindex_announcement__(self.mock_self, 1, 10, before, after)
+            self.assertEqual(self.mock_self.quarantine, {(1, 10): (('v', 8),)})
+            self.mock_self.__dict__['__push_announcement_state__'].assert_called_once_with(
+                1, 'Lamp', "Unavailable: variable 8 no longer exists."
+            )
+
+            self.mock_self.forced_refresh = set()
+            self.data[1][10] = before
+            plugin.Plugin.__reindex_announcement__(self.mock_self, 1, 10, after, before)
+        self.assertEqual(self.mock_self.quarantine, {})
+        self.assertEqual(self.mock_self.forced_refresh, {(1, 10)})
+
+    def test_refresh_only_change_skips_lookups(self):
+        """A change that leaves the announcement text alone doesn't look up its references."""
+        self.mock_self.quarantine = {(2, 20): (('v', 7),)}
+        self.devices.__contains__ = MagicMock()
+        before = self.data[2][20]
+        after  = dict(before, nextRefresh='2030-01-01 00:00:00.000000')
+        with patch.object(plugin.indigo, 'devices', self.devices):
+            plugin.Plugin.__reindex_announcement__(self.mock_self, 2, 20, before, after)
+        self.devices.__contains__.assert_not_called()
+        self.assertEqual(self.mock_self.quarantine, {(2, 20): (('v', 7),)})
+
+    def test_quarantined_announcements_not_due(self):
+        """Quarantined announcements are left out of the refresh schedule."""
+        self.mock_self.quarantine     = {(2, 20): (('v', 7),)}
+        self.mock_self.forced_refresh = set()
+        dev = self._device(2)
+        due = plugin.Plugin.__due_announcements__(self.mock_self, dev, self.data, dt.datetime(2030, 1, 1))
+        self.assertEqual(due, [])
+        dev = self._device(1)
+        due = plugin.Plugin.__due_announcements__(self.mock_self, dev, self.data, dt.datetime(2030, 1, 1))
+        self.assertEqual([item[1:] for item in due], [(1, 10)])
+
+    def test_recreated_reference_rearms(self):
+        """A quarantined announcement is re-armed and refreshed straight away when its device reappears."""
+        self.mock_self.quarantine     = {(2, 20): (('d', 1), ('v', 7))}
+        self.mock_self.forced_refresh = set()
+        plugin.Plugin.variable_created(self.mock_self, MagicMock(id=7))
+        self.assertEqual(self.mock_self.quarantine, {(2, 20): (('d', 1),)})
+        self.assertEqual(self.mock_self.forced_refresh, set())
+
+        plugin.Plugin.device_created(self.mock_self, self._device(1))
+        self.assertEqual(self.mock_self.quarantine, {})
+        self.assertEqual(self.mock_self.forced_refresh, {(2, 20)})
+
+
+class TestPrewarm(APIBase):
+    """Unit tests for rendering every announcement in the background at startup."""
+
+    __test__ = True
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self.pushed  = []
+        self.devices = []
+        data         = {}
+        for dev_id, name in ((1, 'Alpha'), (2, 'Bravo'), (3, 'Charlie')):
+            dev = MagicMock()
+            dev.id           = dev_id
+            dev.name         = name
+            dev.enabled      = True
+            dev.deviceTypeId = 'announcementsDevice'
+            dev.updateStatesOnServer.side_effect = lambda states, name=name: self.pushed.append((name, states))
+            self.devices.append(dev)
+            data[dev_id] = {
+                10: {
+                    'Name': f"{name} Power",
+                    'Announcement': f"{name} uses %%d:50:watts%% watts",
+                    'RefreshSeconds': '60',
+                    'nextRefresh': '2025-01-01 00:00:00',
+                }
+            }
+
+        self.source = MagicMock()
+        self.source.states = {'watts': 120}
+
+        mock_self = MagicMock()
+        mock_self.pluginPrefs  = {'prewarmDevices': ['3'], 'formatWorkers': '0'}
+        mock_self.render_cache = render_cache.RenderCache()
+        mock_self.substitute   = lambda text: text.replace("%%d:50:watts%%", "120")
+        mock_self.__dict__['__resolve_references__'] = plugin.Plugin.__resolve_references__
+        mock_self.__dict__['__load_history__'] = MagicMock()
+        mock_self.__dict__['__format_announcements__'] = (
+            lambda texts: plugin.Plugin.__format_announcements__(mock_self, texts)
+        )
+        mock_self.__dict__['__prerender_announcements__'] = (
+            lambda *args: plugin.Plugin.__prerender_announcements__(mock_self, *args)
+        )
+        self.save      = _attach_store(mock_self, data)
+        self.mock_self = mock_self
+
+    def _prewarm(self) -> MagicMock:
+        devices = MagicMock()
+        devices.iter.return_value = self.devices
+        devices.__getitem__ = MagicMock(return_value=self.source)
+        with patch.object(plugin.indigo, 'devices', devices):
+            plugin.Plugin.__prewarm__(self.mock_self)
+        return devices
+
+    def test_priority_devices_first(self):
+        """Priority devices are pushed first, then the rest by name."""
+        self._prewarm()
+        self.assertEqual([name for name, _ in self.pushed], ['Charlie', 'Alpha', 'Bravo'])
+        self.assertEqual(self.pushed[0][1][0], {'key': 'Charlie_Power', 'value': 'Charlie uses 120 watts'})
+
+    def test_references_resolved_once(self):
+        """A device referenced by every announcement is fetched from the server once."""
+        devices = self._prewarm()
+        self.assertEqual(devices.__getitem__.call_count, 1)
+
+    def test_progress_logged(self):
+        """The prewarm reports its start, the priority devices and its duration."""
+        self._prewarm()
+        messages = [call[0][0] for call in self.mock_self.logger.info.call_args_list]
+        self.assertEqual(len(messages), 3)
+        self.assertIn("Prewarm complete", messages[-1])
+        self.assertGreater(self.mock_self.prewarm_seconds, 0)
+
+    def test_device_error_is_isolated(self):
+        """A device that can't be updated is logged and the prewarm carries on."""
+        self.devices[0].updateStatesOnServer.side_effect = RuntimeError
+        self._prewarm()
+        self.mock_self.logger.warning.assert_called_once()
+        self.assertEqual([name for name, _ in self.pushed], ['Charlie', 'Bravo'])
+
+    def test_quarantined_not_rendered(self):
+        """A quarantined announcement's state says what's missing, and it isn't rendered."""
+        self.mock_self.quarantine = {(1, 10): (('d', 99),)}
+        self._prewarm()
+        pushed = dict(self.pushed)
+        self.assertEqual(
+            pushed['Alpha'][0], {'key': 'Alpha_Power', 'value': "Unavailable: device 99 no longer exists."}
+        )
+        self.assertEqual(pushed['Bravo'][0], {'key': 'Bravo_Power', 'value': 'Bravo uses 120 watts'})
+        self.assertEqual(self.mock_self.render_cache.misses, 2)
+
+    def test_refresh_times_advanced(self):
+        """Prewarmed announcements are scheduled as if refreshed, saved after the priority devices and at the end."""
+        self.mock_self.quarantine = {(1, 10): (('d', 99),)}
+        started = dt.datetime.now()
+        self._prewarm()
+        announcements = self.mock_self.store.snapshot().data
+        self.assertEqual(announcements[1][10]['nextRefresh'], '2025-01-01 00:00:00')
+        for dev_id in (2, 3):
+            next_refresh = dt.datetime.fromisoformat(announcements[dev_id][10]['nextRefresh'])
+            self.assertGreaterEqual(next_refresh, started + dt.timedelta(seconds=30))
+        self.assertEqual(self.save.call_count, 2)
+
+    def test_rescheduled_announcement_kept(self):
+        """An announcement rescheduled while the prewarm runs (e.g., by a refresh pass) keeps its new refresh time."""
+        def reschedule(states, name='Alpha'):
+            self.pushed.append((name, states))
+            self.mock_self.store.mutate(lambda current: current[3][10].update(nextRefresh='2030-01-01 00:00:00'))
+
+        self.mock_self.pluginPrefs['prewarmDevices'] = []
+        self.devices[0].updateStatesOnServer.side_effect = reschedule
+        self._prewarm()
+        announcements = self.mock_self.store.snapshot().data
+        self.assertEqual(announcements[3][10]['nextRefresh'], '2030-01-01 00:00:00')
+        self.assertNotEqual(announcements[2][10]['nextRefresh'], '2025-01-01 00:00:00')
+
+
+class TestCatalog(APIBase):
+    """Unit tests for the substitution generator catalog."""
+
+    __test__ = True
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    @staticmethod
+    def _item(item_id: int, name: str, states: dict = None) -> MagicMock:
+        item = MagicMock()
+        item.id     = item_id
+        item.name   = name
+        item.states = states or {}
+        return item
+
+    def setUp(self):
+        self.devices = [
+            self._item(1, 'Kitchen Lamp', {'onOffState': True, 'onOffState.ui': 'on', 'brightness': 50}),
+            self._item(2, 'Hall Lamp', {'onOffState': False}),
+            self._item(3, 'Lamp Post', {'onOffState': False}),
+        ]
+        self.variables = [self._item(4, 'lamp_count'), self._item(5, 'Outside Temp')]
+        self.catalog   = catalog.Catalog()
+        self.catalog.build(self.devices, self.variables)
+
+    def _names(self, fltr: str = "") -> list:
+        return [name for item_id, name in self.catalog.devices_and_variables(fltr) if int(item_id) > 0]
+
+    def test_sorted_by_name(self):
+        """Devices, then variables, each sorted case-insensitively."""
+        self.assertEqual(self._names(), ['Hall Lamp', 'Kitchen Lamp', 'Lamp Post', 'lamp_count', 'Outside Temp'])
+
+    def test_filter_prefix_then_substring(self):
+        """A filter lists prefix matches first, then substring matches."""
+        self.assertEqual(self._names('lamp'), ['Lamp Post', 'Hall Lamp', 'Kitchen Lamp', 'lamp_count'])
+        self.assertEqual(self._names('TEMP'), ['Outside Temp'])
+
+    def test_incremental_updates(self):
+        """Creates, renames and deletes are applied without a rebuild."""
+        self.catalog.update_device(self._item(6, 'Attic Fan', {'onOffState': False}))
+        self.catalog.update_device(self._item(1, 'Zebra Lamp', self.devices[0].states))
+        self.catalog.remove_device(2)
+        self.catalog.remove_variable(4)
+        self.assertEqual(self._names(), ['Attic Fan', 'Lamp Post', 'Zebra Lamp', 'Outside Temp'])
+
+    def test_states(self):
+        """Device states are listed without their .ui variants; variables have a single value."""
+        self.assertEqual(self.catalog.states(1), [('brightness', 'brightness'), ('onOffState', 'onOffState')])
+        self.assertEqual(self.catalog.states(5), [('value', 'Value')])
+        self.assertIsNone(self.catalog.states(99))
+
+    def test_updates_ignored_until_built(self):
+        """Notifications received before the catalog is first used are ignored."""
+        unbuilt = catalog.Catalog()
+        unbuilt.update_device(self.devices[0])
+        self.assertFalse(unbuilt.built)
+        self.assertIsNone(unbuilt.states(1))
+
+    def test_generators_build_once(self):
+        """The dialog generators build the catalog on first use and then serve it from memory."""
+        mock_self = MagicMock()
+        mock_self.catalog = catalog.Catalog()
+        with patch.object(plugin.indigo.devices, 'iter', return_value=self.devices) as devices, \
+                patch.object(plugin.indigo.variables, 'iter', return_value=self.variables):
+            plugin.Plugin.generator_dev_var(mock_self)
+            result = plugin.Plugin.generator_dev_var(mock_self, fltr='temp')
+        devices.assert_called_once()
+        self.assertEqual(result[-1], (5, 'Outside Temp'))
+        self.assertEqual(
+            plugin.Plugin.generator_state_or_value(mock_self, values_dict={'devVarMenu': '2'}),
+            [('onOffState', 'onOffState')]
+        )
+        plugin.Plugin.generator_state_or_value(mock_self, values_dict={'devVarMenu': '-1'})
+        mock_self.Fogbert.generatorStateOrValue.assert_called_once_with(dev_id='-1')
+
+
+class TestAnnouncementStore(APIBase):
+    """Unit tests for store.AnnouncementStore."""
+
+    __test__ = True
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self.save  = MagicMock(return_value=True)
+        self.store = store.AnnouncementStore(
+            load=lambda: {1: {2: {'Name': 'Test', 'Announcement': 'Hi'}}}, save=self.save
+        )
+        self.store.load()
+
+    def test_snapshot_is_read_only(self):
+        """Snapshots can't be modified, at any level."""
+        data = self.store.snapshot().data
+        with self.assertRaises(TypeError):
+            data[1][2]['Name'] = 'Changed'
+        with self.assertRaises(TypeError):
+            data[1][3] = {}
+
+    def test_mutate_saves_and_publishes(self):
+        """A change is saved and published as a new version; earlier snapshots are unaffected."""
+        before = self.store.snapshot()
+        self.store.mutate(lambda announcements: announcements[1][2].update(Name='Changed'))
+        after = self.store.snapshot()
+        self.assertEqual(after.version, before.version + 1)
+        self.assertEqual(after.data[1][2]['Name'], 'Changed')
+        self.assertEqual(before.data[1][2]['Name'], 'Test')
+        self.assertEqual(self.save.call_args[0][0][1][2]['Name'], 'Changed')
+
+    def test_failed_change_is_not_published(self):
+        """A change that raises is neither saved nor published."""
+        before = self.store.snapshot()
+
+        def change(announcements):
+            announcements[1][2]['Name'] = 'Changed'
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            self.store.mutate(change)
+        self.save.assert_not_called()
+        self.assertIs(self.store.snapshot(), before)
+
+    def test_concurrent_changes_are_serialized(self):
+        """Changes made from several threads at once are all kept."""
+        def add(index):
+            self.store.mutate(lambda announcements: announcements[1].update({index: {'Name': str(index)}}))
+
+        threads = [threading.Thread(target=add, args=(index,)) for index in range(100, 150)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.store.snapshot().data[1]), 51)
+
+
+class TestLoadLeveling(APIBase):
+    """Unit tests for scheduling.leveled_refresh_time."""
+
+    __test__ = True
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def test_deterministic(self):
+        """The same announcement always gets the same refresh time."""
+        first  = scheduling.leveled_refresh_time(1_000_000.0, 300, "1:2", 150)
+        second = scheduling.leveled_refresh_time(1_000_000.0, 300, "1:2", 150)
+        self.assertEqual(first, second)
+
+    def test_shift_within_tolerance(self):
+        """The refresh is never moved more than the tolerance from one interval after now."""
+        for index in range(200):
+            result = scheduling.leveled_refresh_time(1_000_000.0, 300, f"1:{index}", 30)
+            self.assertLessEqual(abs(result - 1_000_300.0), 30)
+
+    def test_zero_tolerance_disables_leveling(self):
+        """A tolerance of zero schedules exactly one interval after now."""
+        self.assertEqual(scheduling.leveled_refresh_time(1_000_000.0, 300, "1:2", 0), 1_000_300.0)
+
+    def test_converges_to_phase_slot(self):
+        """Repeated refreshes with a small tolerance settle on the announcement's phase slot."""
+        now = 1_000_000.0
+        for _ in range(20):
+            now = scheduling.leveled_refresh_time(now, 300, "7:7", 15)
+        self.assertAlmostEqual(now % 300, scheduling.refresh_phase("7:7", 300), places=6)
+
+    def test_forced_refresh_spreads_across_interval(self):
+        """Announcements refreshed together come due spread across the interval rather than in one pass."""
+        per_tick = collections.Counter(
+            int(scheduling.leveled_refresh_time(1_000_000.0, 300, f"1:{index}", 150) // 15)
+            for index in range(300)
+        )
+        self.assertGreaterEqual(len(per_tick), 15)
+        self.assertLess(max(per_tick.values()), 60)
+
+
+class TestCatchUpPolicy(APIBase):
+    """Unit tests for sub-minute intervals and the missed-refresh catch-up policy in __update_announcement__."""
+
+    __test__ = True
+
+    NOW = dt.datetime(2025, 6, 1, 12, 0, 0)
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self.mock_self = MagicMock()
+        self.mock_self.pluginPrefs    = {'refreshTolerance': '0'}
+        self.mock_self.forced_refresh = set()
+        self.mock_self.__dict__['__process_announcement__'] = lambda text: text
+
+    def _update(self, policy: str, late_seconds: float) -> tuple:
+        announcement = {'Name': 'Power', 'Announcement': 'P', 'RefreshSeconds': '10', 'CatchUp': policy}
+        deadline = self.NOW - dt.timedelta(seconds=late_seconds)
+        state = plugin.Plugin.__update_announcement__(self.mock_self, 1, 2, announcement, deadline, self.NOW)
+        return state, dt.datetime.fromisoformat(announcement['nextRefresh'])
+
+    def test_on_time_refresh_uses_seconds(self):
+        """An on-time refresh renders and schedules the next one interval (in seconds) later."""
+        state, next_refresh = self._update('skip', 0.5)
+        self.assertEqual(state['value'], 'P')
+        self.assertEqual(next_refresh, self.NOW + dt.timedelta(seconds=10))
+
+    def test_fire_once_after_missed(self):
+        """The 'once' policy renders once and carries on from now."""
+        state, next_refresh = self._update('once', 3600)
+        self.assertIsNotNone(state)
+        self.assertEqual(next_refresh, self.NOW + dt.timedelta(seconds=10))
+
+    def test_skip_missed(self):
+        """The 'skip' policy doesn't render and resumes at the first slot after now."""
+        state, next_refresh = self._update('skip', 35)
+        self.assertIsNone(state)
+        self.assertEqual(next_refresh, self.NOW + dt.timedelta(seconds=5))
+
+    def test_fire_all_replays_each_slot(self):
+        """The 'all' policy renders and advances by a single slot, so the next pass fires again."""
+        state, next_refresh = self._update('all', 35)
+        self.assertIsNotNone(state)
+        self.assertEqual(next_refresh, self.NOW - dt.timedelta(seconds=25))
+
+    def test_fire_all_is_limited(self):
+        """The 'all' policy replays at most CATCH_UP_LIMIT missed slots."""
+        _, next_refresh = self._update('all', 86400)
+        self.assertEqual(next_refresh, self.NOW - dt.timedelta(seconds=10 * plugin.CATCH_UP_LIMIT))
+
+    def test_forced_refresh_ignores_policy(self):
+        """A forced refresh renders even with the 'skip' policy."""
+        self.mock_self.forced_refresh = {(1, 2)}
+        state, _ = self._update('skip', 3600)
+        self.assertIsNotNone(state)
+
+
+class TestSimulator(APIBase):
+    """End-to-end runs of the plugin against the stand-in Indigo server (tests/simulator.py)."""
+
+    __test__ = True
+
+    # The regression gate: generous limits for a small population, well above a normal run.
+    TICK_P95_LIMIT_MS  = 250
+    RENDERS_PER_SECOND = 20
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class, then run one simulated hour."""
+        super().setUpClass()
+        cls.simulation = simulator.Simulation(devices=10, announcements=10, sensors=20, variables=5)
+        cls.report     = cls.simulation.run(hours=1)
+
+    def test_plugin_builds_against_stand_in(self):
+        """The plugin imports and builds against the stand-in `indigo` module alone, as from the command line.
+
+        The other tests import the plugin against a mock `indigo` module, which has every attribute; here the plugin is
+        imported fresh through simulator.build_plugin, so anything the stand-in lacks fails.
+        """
+        with patch.dict(sys.modules), tempfile.TemporaryDirectory() as folder, contextlib.ExitStack() as stack:
+            del sys.modules['plugin']
+            del sys.modules['indigo']
+            clock    = simulator.FakeClock()
+            indigo   = simulator.FakeIndigo(simulator.FakeServer(clock, simulator.Latency(), folder))
+            instance = simulator.build_plugin(stack, simulator.Simulation(), indigo, clock)
+            self.assertIsNot(sys.modules['plugin'], plugin)
+            self.assertIs(sys.modules['plugin'].indigo, indigo)
+            self.assertIsInstance(instance, simulator.SimHost)
+        self.assertIs(sys.modules['plugin'], plugin)
+
+    def test_every_announcement_rendered(self):
+        """Every announcement is rendered and pushed, and no unsubstituted references reach the server."""
+        devices = [dev for dev in self.simulation.indigo.devices.values() if dev.pluginId == simulator.PLUGIN_ID]
+        self.assertEqual(len(devices), 10)
+        for dev in devices:
+            states = {key: value for key, value in dev.states.items() if key != 'onOffState'}
+            self.assertEqual(len(states), 10)
+            for value in states.values():
+                self.assertNotIn('%%', value)
+                self.assertNotIn('<<', value)
+
+    def test_plugin_time_is_simulated(self):
+        """An hour of plugin time runs many refresh passes, writes refresh times, and leaves no backlog.
+
+        The plugin resolves references by fetching devices and variables from the server, which is charged as IPC.
+        """
+        self.assertGreater(self.report.ticks, 60)
+        self.assertGreaterEqual(self.report.renders, self.report.announcements)
+        self.assertGreater(self.report.bytes_written, 0)
+        self.assertGreater(self.report.fetches, 0)
+        self.assertEqual(self.report.max_backlog, 0)
+
+    def test_fetch_latency_charged(self):
+        """Slower device and variable fetches make refresh passes take longer."""
+        def run(fetch: float) -> simulator.Report:
+            latency = simulator.Latency(fetch=fetch, update=0.0)
+            return simulator.Simulation(devices=2, announcements=5, sensors=5, variables=2, latency=latency).run(0.25)
+
+        fast, slow = run(0.0), run(0.05)
+        self.assertGreater(slow.fetches, 0)
+        self.assertGreater(slow.tick_mean_ms, fast.tick_mean_ms)
+        self.assertGreaterEqual(slow.tick_max_ms, 50)
+
+    def test_regression_gate(self):
+        """Tick time and throughput stay within the gate."""
+        self.assertLess(self.report.tick_p95_ms, self.TICK_P95_LIMIT_MS, self.report.summary())
+        self.assertGreater(self.report.renders_per_second, self.RENDERS_PER_SECOND, self.report.summary())
+
+    def test_baseline_comparison(self):
+        """A report is flagged against a baseline it's meaningfully worse than."""
+        baseline = self.report._asdict()
+        self.assertEqual(self.report.regressions(baseline), [])
+
+        slower = self.report._replace(tick_p95_ms=baseline['tick_p95_ms'] * 2, renders_per_second=0.0)
+        problems = slower.regressions(baseline)
+        self.assertEqual(len(problems), 2)
+        self.assertTrue(problems[0].startswith('renders_per_second'))
+
+
+class TestRenderRecording(APIBase):
+    """Unit tests for render recording (recording.py) and offline replay (tests/replay.py)."""
+
+    __test__ = True
+
+    TEMPERATURE = "It is %%d:101:temperature%% degrees and <<%%v:201%%, n:1>> outside."
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = f"{self._tmp.name}/recording.jsonl"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _record(self, renders: list, max_bytes: int = 1_000_000) -> recording.RenderRecorder:
+        recorder = recording.RenderRecorder(self.path, max_bytes=max_bytes)
+        for text, values in renders:
+            recorder.record(templates.compile_template(text), values, 1_700_000_000.0)
+        recorder.close()
+        return recorder
+
+    def test_round_trip(self):
+        """A recording loads back as each render's template, time and values keyed by reference."""
+        self._record([(self.TEMPERATURE, ('21.5', '8')), (self.TEMPERATURE, ('22', '9'))])
+        renders = recording.load(self.path)
+        self.assertEqual(len(renders), 2)
+        self.assertEqual(
+            renders[1], (self.TEMPERATURE, 1_700_000_000.0, {('d', 101, 'temperature'): '22', ('v', 201): '9'})
+        )
+
+        # The template is written once.
+        with open(self.path, encoding="utf-8") as infile:
+            self.assertEqual(sum(1 for line in infile if '"text"' in line), 1)
+
+    def test_sessions_appended(self):
+        """A second session appends to the recording with its own template numbering."""
+        self._record([("The %%v:201%% forecast.", ('dry',))])
+        self._record([(self.TEMPERATURE, ('21.5', '8'))])
+        self.assertEqual(
+            [text for text, _, _ in recording.load(self.path)], ["The %%v:201%% forecast.", self.TEMPERATURE]
+        )
+
+    def test_size_limit(self):
+        """Recording stops at the size limit, and after the recorder is closed."""
+        recorder = self._record([(self.TEMPERATURE, (f"{i}", '8')) for i in range(100)], max_bytes=500)
+        self.assertLess(recorder.records, 100)
+        recorder.record(templates.compile_template(self.TEMPERATURE), ('1', '2'), 0.0)
+        self.assertEqual(len(recording.load(self.path)), recorder.records)
+
+    def test_only_renders_recorded(self):
+        """__process_announcement__ records cache misses, not renders served from the render cache."""
+        mock_self = MagicMock()
+        mock_self.render_cache = render_cache.RenderCache()
+        mock_self.__dict__['__resolve_references__'] = lambda template: ('21.5',)
+        mock_self.substitute = lambda text: text
+        mock_self.substitution_regex = lambda announcement: announcement
+        text = "It is %%d:101:temperature%% degrees."
+        plugin.Plugin.__process_announcement__(mock_self, text)
+        plugin.Plugin.__process_announcement__(mock_self, text)
+        mock_self.recorder.record.assert_called_once()
+        self.assertEqual(mock_self.recorder.record.call_args.args[1], ('21.5',))
+
+    def test_replay_renders_recorded_values(self):
+        """Replaying a recording renders each announcement from its recorded values."""
+        self._record([(self.TEMPERATURE, ('21.5', '8')), (self.TEMPERATURE, ('22', '9.25'))])
+        report, results = replay.Replay(self.path).run()
+        self.assertEqual(results, ["It is 21.5 degrees and 8.0 outside.", "It is 22 degrees and 9.2 outside."])
+        self.assertEqual(report.renders, 2)
+        self.assertEqual(report.cache_hit_ratio, 0.0)
+
+    def test_replay_compares_renderers(self):
+        """A candidate renderer is compared with the plugin's render by render."""
+        self._record([(self.TEMPERATURE, ('21.5', '8')), ("The %%v:201%% forecast.", ('dry',))])
+
+        def candidate(plugin_, text):
+            result = plugin_.__process_announcement__(text)
+            return result.upper() if 'forecast' in result else result
+
+        _, _, differences = replay.Replay(self.path).compare(candidate)
+        self.assertEqual(differences, [("The %%v:201%% forecast.", "The dry forecast.", "THE DRY FORECAST.")])
+
+
+class TestHotPathLogging(APIBase):
+    """Unit tests for refresh pass logging (tick_log.py)."""
+
+    __test__ = True
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestHotPathLogging")
+        self.logger.setLevel(logging.DEBUG)
+        self.log = tick_log.RateLimitedLog(self.logger, interval=300)
+
+    def _fail(self, key):
+        try:
+            raise ValueError("bad template")
+        except ValueError:
+            self.log.error(key, logging.WARNING, "Unable to refresh %s.", key)
+
+    def test_repeated_errors_rate_limited(self):
+        """An error repeating for the same key is logged once per interval; other keys are logged separately."""
+        with self.assertLogs(self.logger, level=logging.DEBUG) as logs:
+            for _ in range(5):
+                self._fail('a')
+            self._fail('b')
+        self.assertEqual(logs.output, ["WARNING:TestHotPathLogging:Unable to refresh a.",
+                                       "WARNING:TestHotPathLogging:Unable to refresh b."])
+        self.assertEqual(self.log.take_errors(), 6)
+        self.assertEqual(self.log.take_errors(), 0)
+
+    def test_suppressed_count_reported(self):
+        """The next message after the interval says how many errors were suppressed."""
+        self.log.interval = 0.05
+        with self.assertLogs(self.logger, level=logging.DEBUG) as logs:
+            for _ in range(3):
+                self._fail('a')
+            time.sleep(0.06)
+            self._fail('a')
+        self.assertEqual(
+            logs.output[-1], "WARNING:TestHotPathLogging:Unable to refresh a. (2 similar errors suppressed)"
+        )
+
+    def test_thread_debug_level_not_renamed(self):
+        """Level 5 belongs to Indigo (THREADDEBUG); the plugin doesn't give it a name of its own."""
+        self.assertNotEqual(logging.getLevelName(tick_log.THREADDEBUG), "TRACE")
+
+    def test_traceback_only_at_threaddebug(self):
+        """Tracebacks are only logged at the THREADDEBUG level, and for every error."""
+        with self.assertLogs(self.logger, level=logging.DEBUG) as logs:
+            self._fail('a')
+        self.assertTrue(all(record.exc_info is None for record in logs.records))
+
+        self.logger.setLevel(tick_log.THREADDEBUG)
+        with self.assertLogs(self.logger, level=tick_log.THREADDEBUG) as logs:
+            self._fail('a')
+            self._fail('a')
+        traced = [record for record in logs.records if record.levelno == tick_log.THREADDEBUG]
+        self.assertEqual(len(traced), 2)
+        self.assertTrue(all(record.exc_info for record in traced))
+
+    def test_refresh_pass_logs_one_line(self):
+        """A debug-level refresh pass logs a single summary line, not a line per announcement."""
+        self.logger.setLevel(logging.DEBUG)
+        mock_self = MagicMock()
+        mock_self.logger           = self.logger
+        mock_self.pluginPrefs      = {'tickTimeBudget': '0', 'tickWorkBudget': '0', 'refreshTolerance': '0'}
+        mock_self.forced_refresh   = set()
+        mock_self.render_errors    = self.log
+        mock_self.tick_stats       = {
+            'backlog': 0, 'max_backlog': 0, 'lateness': 0.0, 'max_lateness': 0.0, 'renders': 0, 'shared': 0
+        }
+        mock_self.tick_histogram   = collections.Counter()
+        mock_self.triggers         = triggers.TriggerIndex()
+        mock_self.pacing           = pacing.TickController(target_latency=0.25, max_gap=60)
+        mock_self.update_frequency = 15
+        mock_self.__dict__['__process_announcement__'] = lambda text: text
+        for name in ('__due_announcements__', '__update_announcement__', '__refresh_device__'):
+            mock_self.__dict__[name] = getattr(plugin.Plugin, name).__get__(mock_self)
+        _attach_store(mock_self, {1: {
+            key: {'Name': f"A{key}", 'Announcement': "x", 'RefreshSeconds': '60', 'nextRefresh': '2025-01-01 00:00:00'}
+            for key in range(1, 21)
+        }})
+        dev = MagicMock(id=1, enabled=True, deviceTypeId='announcementsDevice')
+        dev.name = "Device"
+
+        with patch.object(plugin.indigo.devices, 'iter', return_value=[dev]), \
+                self.assertLogs(self.logger, level=logging.DEBUG) as logs:
+            plugin.Plugin.announcement_update_states(mock_self)
+        self.assertEqual(len(logs.output), 1)
+        self.assertRegex(logs.output[0], r"Refresh pass: 20 due, 20 refreshed, 0 carried over, 0 errors in [\d.]+ ms\.")
+
+
+
+class TestMetrics(APIBase):
+    """Unit tests for the metrics export (metrics.py)."""
+
+    __test__ = True
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self.registry = metrics.MetricsRegistry(prefix="test")
+        self.registry.counter('renders_total', "Renders.")
+        self.registry.gauge('depth', "Queue depth.", lambda: 3)
+        self.registry.histogram('tick_seconds', "Tick duration.", (0.1, 1))
+
+    def test_exposition_format(self):
+        """Metrics are written with HELP and TYPE lines; histogram buckets are cumulative and end with +Inf."""
+        self.registry.inc('renders_total', 2)
+        for value in (0.05, 0.1, 0.5, 5):
+            self.registry.observe('tick_seconds', value)
+        self.assertEqual(self.registry.exposition(), textwrap.dedent("""\
+            # HELP test_renders_total Renders.
+            # TYPE test_renders_total counter
+            test_renders_total 2
+            # HELP test_depth Queue depth.
+            # TYPE test_depth gauge
+            test_depth 3
+            # HELP test_tick_seconds Tick duration.
+            # TYPE test_tick_seconds histogram
+            test_tick_seconds_bucket{le="0.1"} 2
+            test_tick_seconds_bucket{le="1"} 3
+            test_tick_seconds_bucket{le="+Inf"} 4
+            test_tick_seconds_sum 5.65
+            test_tick_seconds_count 4
+        """))
+
+    def test_failing_collector_skipped(self):
+        """A gauge whose collector raises is exported without a sample, and the other metrics are unaffected."""
+        self.registry.gauge('broken', "Broken.", lambda: 1 / 0)
+        text = self.registry.exposition()
+        self.assertIn("# TYPE test_broken gauge", text)
+        self.assertNotRegex(text, r"(?m)^test_broken ")
+        self.assertIn("test_depth 3", text)
+
+    def test_write_textfile_atomic(self):
+        """The textfile is replaced in one step and no temporary files are left behind."""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "announcements.prom")
+            with open(path, mode='w', encoding="utf-8") as outfile:
+                outfile.write("stale")
+            written = self.registry.write_textfile(path)
+            with open(path, mode='r', encoding="utf-8") as infile:
+                text = infile.read()
+            self.assertEqual(os.listdir(folder), ["announcements.prom"])
+        self.assertEqual(written, len(text.encode("utf-8")))
+        self.assertEqual(text, self.registry.exposition())
+
+    def test_export_interval(self):
+        """The plugin writes the metrics file at most once per interval unless forced, and not at all when unset."""
+        mock_self = MagicMock()
+        mock_self.pluginPrefs     = {'metricsFile': ""}
+        mock_self.metrics_written = 0.0
+        plugin.Plugin.__export_metrics__(mock_self, force=True)
+        mock_self.metrics.write_textfile.assert_not_called()
+
+        mock_self.pluginPrefs['metricsFile'] = "/tmp/announcements.prom"
+        plugin.Plugin.__export_metrics__(mock_self)
+        plugin.Plugin.__export_metrics__(mock_self)
+        self.assertEqual(mock_self.metrics.write_textfile.call_count, 1)
+        plugin.Plugin.__export_metrics__(mock_self, force=True)
+        self.assertEqual(mock_self.metrics.write_textfile.call_count, 2)
+
+    def test_export_error_rate_limited(self):
+        """A metrics file that can't be written is reported through the rate-limited error log."""
+        mock_self = MagicMock()
+        mock_self.pluginPrefs     = {'metricsFile': "/no/such/folder/announcements.prom"}
+        mock_self.metrics_written = 0.0
+        mock_self.metrics.write_textfile.side_effect = OSError
+        plugin.Plugin.__export_metrics__(mock_self)
+        self.assertEqual(mock_self.render_errors.error.call_args.args[:2], ('metricsFile', logging.WARNING))
+
+    def test_plugin_metrics_registered(self):
+        """The plugin's counters, gauges and histogram are exported from live plugin state."""
+        mock_self = MagicMock()
+        mock_self.metrics         = metrics.MetricsRegistry(prefix="announcements")
+        mock_self.render_cache    = render_cache.RenderCache(max_entries=10)
+        mock_self.refresh_backlog = 4
+        mock_self.tick_stats      = {'lateness': 1.5}
+        mock_self.speech_queue.status.return_value = {'depth': 2}
+        mock_self.speech_queue.spoken  = 7
+        mock_self.speech_queue.dropped = 1
+        _attach_store(mock_self, {1: {1: {}, 2: {}}, 2: {3: {}}})
+        plugin.Plugin.__register_metrics__(mock_self)
+        mock_self.render_cache.get('missing')
+        mock_self.metrics.observe('tick_seconds', 0.02)
+
+        text = mock_self.metrics.exposition()
+        for line in ("announcements_render_cache_misses_total 1", "announcements_refresh_backlog 4",
+                     "announcements_refresh_lateness_seconds 1.5", "announcements_announcements 3",
+                     "announcements_speech_queue_depth 2", "announcements_speech_spoken_total 7",
+                     "announcements_tick_seconds_count 1"):
+            self.assertIn(line + "\n", text)
+
+    def test_server_localhost(self):
+        """The metrics socket serves the metrics on 127.0.0.1 and stops cleanly."""
+        import socket
+        import urllib.error
+        import urllib.request
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        server = metrics.MetricsServer(self.registry, port)
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+                self.assertEqual(response.read().decode("utf-8"), self.registry.exposition())
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/other", timeout=5)
+        finally:
+            server.stop()
+
+
+class TestExplainAnnouncement(APIBase):
+    """Unit tests for the Explain Announcement action and menu item."""
+
+    __test__ = True
+
+    DEV_ID = 12345
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self.mock_self = MagicMock()
+        self.mock_self.render_cache   = render_cache.RenderCache()
+        self.mock_self.template_index = {
+            (self.DEV_ID, 'Weather'): templates.compile_template("It is <<%%v:1%%, n:1>> degrees (%%v:2%%)")
+        }
+        self.mock_self.__dict__['__resolve_references__'] = plugin.Plugin.__resolve_references__
+        self.variables = {1: MagicMock(value="21.456")}
+
+    def _explain(self, state_name: str = 'Weather') -> dict:
+        with patch.object(plugin.indigo, 'variables', self.variables):
+            return plugin.Plugin.__explain_announcement__(self.mock_self, self.DEV_ID, state_name)
+
+    def test_trace_tokens(self):
+        """Each reference is traced with its value and each formatter with its input and output."""
+        trace = self._explain()
+        self.assertEqual([(item['token'], item['value']) for item in trace['references']],
+                         [("%%v:1%%", "21.456"), ("%%v:2%%", None)])
+        self.assertEqual(len(trace['formatters']), 1)
+        self.assertEqual(trace['formatters'][0]['input'], "21.456")
+        self.assertEqual(trace['formatters'][0]['spec'], "n:1")
+        self.assertEqual(trace['formatters'][0]['output'], "21.5")
+        self.assertEqual(trace['result'], "It is 21.5 degrees (%%v:2%%)")
+        self.assertFalse(trace['cache_hit'])
+        self.assertGreaterEqual(trace['total_ms'], trace['substitute_ms'] + sum(
+            item['ms'] for item in trace['references']
+        ))
+
+    def test_explanation_matches_render(self):
+        """The explanation resolves references through the render path and gives the same result as a real render."""
+        self.mock_self.pacing             = pacing.TickController(target_latency=0.25, max_gap=60)
+        self.mock_self.recorder           = None
+        self.mock_self.substitution_regex = lambda announcement: formatting.substitution_regex(announcement)
+        resolve = MagicMock(wraps=plugin.Plugin.__resolve_references__)
+        self.mock_self.__dict__['__resolve_references__'] = resolve
+        text = self.mock_self.template_index[(self.DEV_ID, 'Weather')].text
+        with patch.object(plugin.indigo, 'variables', self.variables):
+            rendered = plugin.Plugin.__process_announcement__(self.mock_self, text)
+        self.assertEqual(self._explain()['result'], rendered)
+        self.assertEqual(resolve.call_count, 2)
+
+    def test_result_matches_pipeline(self):
+        """The traced render gives the same result as the formatting pipeline."""
+        text = "It is <<7.25, n:0>> degrees on <<2025-01-02, dt:%A>>"
+        result, steps = formatting.trace_formatters(text)
+        self.assertEqual(result, formatting.substitution_regex(text))
+        self.assertEqual([step['spec'] for step in steps], ["n:0", "dt:%A"])
+
+    def test_cache_hit_reported_without_lookup(self):
+        """A cached render is reported as a cache hit without changing the cache statistics."""
+        template = self.mock_self.template_index[(self.DEV_ID, 'Weather')]
+        self.mock_self.render_cache.put((template.template_id, ("21.456", None), 0), "It is 21.5 degrees (%%v:2%%)")
+        self.assertTrue(self._explain()['cache_hit'])
+        self.assertEqual((self.mock_self.render_cache.hits, self.mock_self.render_cache.misses), (0, 0))
+
+    def test_json_logged_and_returned(self):
+        """The action returns the trace as JSON, which is also logged on a single line."""
+        action = MagicMock()
+        action.props = {'announcementDeviceToRefresh': str(self.DEV_ID), 'announcementToSpeak': 'Weather'}
+        self.mock_self.__dict__['__explain_announcement__'] = (
+            lambda *args: plugin.Plugin.__explain_announcement__(self.mock_self, *args)
+        )
+        with patch.object(plugin.indigo, 'variables', self.variables):
+            result = plugin.Plugin.announcement_explain_action(self.mock_self, action)
+        self.assertEqual(json.loads(result)['result'], "It is 21.5 degrees (%%v:2%%)")
+        logged = [call.args for call in self.mock_self.logger.info.call_args_list]
+        self.assertIn(("Explain JSON: %s", result), logged)
+
+    def test_unknown_announcement_warns(self):
+        """An announcement missing from the index logs a warning and returns an empty trace."""
+        self.assertEqual(self._explain('Missing'), {})
+        self.mock_self.logger.warning.assert_called_once()
+
+    def test_menu_requires_device(self):
+        """The menu item warns when no device is selected and always closes the dialog."""
+        self.assertTrue(plugin.Plugin.announcement_explain_menu(self.mock_self, {}, ""))
+        self.mock_self.logger.warning.assert_called_once()
+
+
+class TestRenderHistory(APIBase):
+    """Unit tests for the rendered announcement history (history.py)."""
+
+    __test__ = True
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self.history = history.RenderHistory(max_entries=3, max_bytes=1024 * 1024)
+
+    def test_ring_buffer_keeps_recent_renders(self):
+        """Each announcement keeps its most recent renders, oldest first."""
+        for second in range(5):
+            self.history.record((1, 10), 1000.0 + second, f"Render {second}", 0.5)
+        self.history.record((1, 11), 1000.0, "Other", 0.5)
+        self.assertEqual([text for _, text, _ in self.history.query((1, 10))], ["Render 2", "Render 3", "Render 4"])
+        self.assertEqual(len(self.history), 4)
+        self.assertEqual(self.history.query((1, 10), since=1004.0), [(1004.0, "Render 4", 0.5)])
+        self.assertEqual(len(self.history.query((1, 10), limit=2)), 2)
+        self.assertEqual(self.history.query((2, 10)), [])
+
+    def test_identical_renders_interned(self):
+        """Identical renders share one string, counted once toward the memory limit."""
+        self.history.record((1, 10), 1000.0, "".join(["It is ", "warm"]), 0.5)
+        single = self.history.bytes
+        self.history.record((1, 10), 1001.0, "".join(["It is ", "warm"]), 0.5)
+        first, second = self.history.query((1, 10))
+        self.assertIs(first[1], second[1])
+        self.assertEqual(self.history.texts, 1)
+        self.assertEqual(self.history.bytes - single, history.ENTRY_BYTES)
+
+    def test_memory_bound_evicts_oldest(self):
+        """Past the memory limit, the oldest renders across all announcements are dropped first."""
+        self.history = history.RenderHistory(max_entries=100, max_bytes=history.ENTRY_BYTES * 4 + 100)
+        for second in range(6):
+            self.history.record((1, second % 2), 1000.0 + second, "x" * 10, 0.5)
+        self.assertLessEqual(self.history.bytes, self.history.max_bytes)
+        remaining = sorted(timestamp for key in ((1, 0), (1, 1)) for timestamp, _, _ in self.history.query(key))
+        self.assertEqual(remaining, [1002.0, 1003.0, 1004.0, 1005.0])
+
+    def test_remove_releases_memory(self):
+        """Removing a device's history releases its entries and their strings."""
+        self.history.record((1, 10), 1000.0, "One", 0.5)
+        self.history.record((1, 11), 1000.0, "Two", 0.5)
+        self.history.record((2, 10), 1000.0, "Three", 0.5)
+        self.history.remove(1, 11)
+        self.assertEqual(self.history.query((1, 11)), [])
+        self.history.remove(1)
+        self.assertEqual(len(self.history), 1)
+        self.assertEqual(self.history.texts, 1)
+        self.history.remove(2)
+        self.assertEqual(self.history.bytes, 0)
+
+    def test_save_and_load(self):
+        """A saved history loads back with the same renders, each distinct string written once."""
+        for second in range(3):
+            self.history.record((1, 10), 1000.0 + second, "Same", 0.25)
+        self.history.record((2, 20), 1001.5, "Different", 1.0)
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "history.json")
+            self.history.save(path)
+            with open(path, mode='r', encoding="utf-8") as infile:
+                self.assertEqual(json.load(infile)['texts'], ["Same", "Different"])
+            loaded = history.RenderHistory(max_entries=3, max_bytes=1024 * 1024)
+            self.assertEqual(loaded.load(path), 4)
+            self.assertEqual(loaded.load(os.path.join(folder, "missing.json")), 0)
+        self.assertEqual(loaded.query((1, 10)), self.history.query((1, 10)))
+        self.assertEqual(loaded.query((2, 20)), [(1001.5, "Different", 1.0)])
+
+    def test_history_action_returns_json(self):
+        """The action returns the announcement's most recent renders as JSON."""
+        mock_self = MagicMock()
+        mock_self.history = self.history
+        _attach_store(mock_self, {1: {10: {'Name': "Front Door", 'Announcement': "x"}}})
+        for second in range(3):
+            self.history.record((1, 10), 1000.0 + second, f"Render {second}", 0.5)
+        action = MagicMock()
+        action.props = {'announcementDeviceToRefresh': "1", 'announcementToSpeak': "Front_Door", 'historyLimit': "2"}
+        result = json.loads(plugin.Plugin.announcement_history_action(mock_self, action))
+        self.assertEqual([item['text'] for item in result], ["Render 1", "Render 2"])
+        self.assertEqual(result[-1]['timestamp'], 1002.0)
+
+        action.props['announcementToSpeak'] = "Missing"
+        self.assertEqual(plugin.Plugin.announcement_history_action(mock_self, action), "")
+        mock_self.logger.warning.assert_called_once()
+
+    def test_refresh_records_history(self):
+        """Refreshing an announcement adds the render to its history."""
+        mock_self = MagicMock()
+        mock_self.history        = self.history
+        mock_self.pluginPrefs    = {'refreshTolerance': '0'}
+        mock_self.forced_refresh = set()
+        mock_self.__dict__['__process_announcement__'] = lambda text: text.upper()
+        now          = dt.datetime(2025, 1, 1, 12, 0)
+        announcement = {'Name': "A", 'Announcement': "hello", 'RefreshSeconds': '60'}
+        plugin.Plugin.__update_announcement__(mock_self, 1, 10, announcement, now, now)
+        self.assertEqual([text for _, text, _ in self.history.query((1, 10))], ["HELLO"])
+
+
+class TestTriggerEvents(APIBase):
+    """Unit tests for the plugin trigger events (triggers.py)."""
+
+    __test__ = True
+
+    DEV_ID = 1
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self.dev = MagicMock()
+        self.dev.id     = self.DEV_ID
+        self.dev.name   = "Device"
+        self.dev.states = {'Same': "unchanged", 'Different': "old"}
+
+        mock_self = MagicMock()
+        mock_self.pluginPrefs    = {'refreshTolerance': '0'}
+        mock_self.forced_refresh = set()
+        mock_self.triggers       = triggers.TriggerIndex()
+        mock_self.__dict__['__process_announcement__'] = self._render
+        mock_self.__dict__['__update_announcement__'] = (
+            lambda *args: plugin.Plugin.__update_announcement__(mock_self, *args)
+        )
+        mock_self.__dict__['__fire_triggers__'] = (
+            lambda *args: plugin.Plugin.__fire_triggers__(mock_self, *args)
+        )
+        self.mock_self     = mock_self
+        self.announcements = {self.DEV_ID: {
+            1: {'Name': "Same", 'Announcement': "unchanged", 'RefreshSeconds': '60'},
+            2: {'Name': "Different", 'Announcement': "new", 'RefreshSeconds': '60'},
+            3: {'Name': "Broken", 'Announcement': "fail", 'RefreshSeconds': '60'},
+        }}
+
+    @staticmethod
+    def _render(text: str) -> str:
+        if text == "fail":
+            raise ValueError
+        return text
+
+    def _refresh(self) -> list:
+        now   = dt.datetime(2025, 1, 1, 12, 0)
+        items = [(now, self.DEV_ID, key) for key in (1, 2, 3)]
+        with patch.object(plugin.indigo.trigger, 'execute') as execute:
+            plugin.Plugin.__refresh_device__(self.mock_self, self.dev, items, self.announcements, now, None, items[0])
+        return [call.args[0] for call in execute.call_args_list]
+
+    def test_index_matches_announcement_and_wildcard(self):
+        """A trigger matches its own announcement; a trigger without one matches all of the device's announcements."""
+        index = triggers.TriggerIndex()
+        index.add(100, triggers.ANNOUNCEMENT_CHANGED, 1, 'Weather')
+        index.add(101, triggers.ANNOUNCEMENT_CHANGED, 1)
+        index.add(102, triggers.RENDER_FAILED, 1)
+        self.assertEqual(index.match(triggers.ANNOUNCEMENT_CHANGED, 1, 'Weather'), [100, 101])
+        self.assertEqual(index.match(triggers.ANNOUNCEMENT_CHANGED, 1, 'Other'), [101])
+        self.assertEqual(index.match(triggers.ANNOUNCEMENT_CHANGED, 2, 'Weather'), [])
+        self.assertTrue(index.watching(1))
+        self.assertFalse(index.watching(2))
+
+        for trigger_id in (100, 101, 102):
+            index.remove(trigger_id)
+        self.assertEqual(len(index), 0)
+        self.assertFalse(index.watching(1))
+
+    def test_trigger_processing_updates_index(self):
+        """Starting a trigger adds it to the index and stopping it removes it."""
+        trigger = MagicMock(id=100, pluginTypeId=triggers.ANNOUNCEMENT_CHANGED)
+        trigger.pluginProps = {'announcementDeviceToRefresh': "1", 'anyAnnouncement': False,
+                               'announcementToSpeak': "Weather"}
+        plugin.Plugin.trigger_start_processing(self.mock_self, trigger)
+        self.assertEqual(self.mock_self.triggers.match(triggers.ANNOUNCEMENT_CHANGED, 1, 'Weather'), [100])
+        plugin.Plugin.trigger_stop_processing(self.mock_self, trigger)
+        self.assertEqual(len(self.mock_self.triggers), 0)
+
+    def test_fires_only_on_changed_text(self):
+        """Announcement Changed triggers fire for announcements whose text changed, not for every refresh."""
+        self.mock_self.triggers.add(100, triggers.ANNOUNCEMENT_CHANGED, self.DEV_ID, 'Same')
+        self.mock_self.triggers.add(101, triggers.ANNOUNCEMENT_CHANGED, self.DEV_ID, 'Different')
+        self.mock_self.triggers.add(102, triggers.ANNOUNCEMENT_CHANGED, self.DEV_ID)
+        self.assertEqual(self._refresh(), [101, 102])
+
+    def test_render_failure_fires(self):
+        """Render Failed triggers fire for the announcement that couldn't be refreshed."""
+        self.mock_self.triggers.add(200, triggers.RENDER_FAILED, self.DEV_ID, 'Broken')
+        self.mock_self.triggers.add(201, triggers.RENDER_FAILED, self.DEV_ID, 'Same')
+        self.assertEqual(self._refresh(), [200])
+
+    def test_no_triggers_no_dispatch(self):
+        """Without triggers for the device, nothing is compared or dispatched."""
+        self.mock_self.triggers.add(100, triggers.ANNOUNCEMENT_CHANGED, 99)
+        self.dev.states = MagicMock()
+        self.assertEqual(self._refresh(), [])
+        self.dev.states.get.assert_not_called()
+
+    def test_salutation_change_fires(self):
+        """Salutation Period Changed triggers fire when the intro or outro changes, and not otherwise."""
+        self.mock_self.salutation_schedule = {}
+        self.mock_self.triggers.add(300, triggers.SALUTATION_CHANGED, self.DEV_ID)
+        self.dev.pluginProps = TestSalutationSchedule.PROPS
+        self.dev.states      = {'intro': "", 'outro': ""}
+        with patch.object(plugin.indigo.trigger, 'execute') as execute:
+            plugin.Plugin.__update_salutations_device__(self.mock_self, self.dev)
+            execute.assert_called_once_with(300)
+            self.dev.states = {state['key']: state['value'] for state in self.dev.updateStatesOnServer.call_args[0][0]}
+            plugin.Plugin.__update_salutations_device__(self.mock_self, self.dev)
+            execute.assert_called_once_with(300)
+
+    def test_validate_event_config(self):
+        """An announcement trigger needs a device and an announcement, unless it watches any announcement."""
+        with patch.object(plugin.indigo, 'Dict', dict):
+            result = plugin.Plugin.validate_event_config_ui({'announcementDeviceToRefresh': "1"}, 'announcementChanged')
+            self.assertFalse(result[0])
+            self.assertIn('announcementToSpeak', result[2])
+            values = {'announcementDeviceToRefresh': "1", 'anyAnnouncement': True}
+            self.assertEqual(plugin.Plugin.validate_event_config_ui(values, 'renderFailed'), (True, values))
+            values = {'announcementDeviceToRefresh': "1"}
+            self.assertEqual(plugin.Plugin.validate_event_config_ui(values, 'salutationChanged'), (True, values))
+
+
+class TestAdaptivePacing(APIBase):
+    """Unit tests for the adaptive refresh pacing controller (pacing.py)."""
+
+    __test__ = True
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-level fixtures by delegating to the base class."""
+        super().setUpClass()
+
+    def setUp(self):
+        self.pacing = pacing.TickController(target_latency=0.25, max_gap=10)
+
+    def _passes(self, count: int, latency: float, seconds: float = 0.5, limit: float = 1.0) -> None:
+        for _ in range(count):
+            self.pacing.observe(latency)
+            self.pacing.end_pass(seconds, limit)
+
+    def test_idle_server_not_stretched(self):
+        """A responsive server leaves passes unpaced."""
+        self._passes(10, latency=0.01)
+        self.assertEqual(self.pacing.stretch, 1.0)
+        self.assertEqual(self.pacing.gap, pacing.MIN_GAP)
+        self.assertEqual(self.pacing.work_limit(40), 40)
+
+    def test_slow_server_stretches_within_bounds(self):
+        """A slow server stretches the rest between passes, up to the maximum, and sheds work."""
+        self._passes(3, latency=1.0)
+        self.assertGreater(self.pacing.stretch, 1.0)
+        self.assertLess(self.pacing.work_limit(40), 40)
+        self.assertGreaterEqual(self.pacing.work_limit(1), 1)
+
+        self._passes(50, latency=1.0)
+        self.assertAlmostEqual(self.pacing.gap, 10)
+        self.assertGreater(self.pacing.work_limit(40), 0)
+
+    def test_recovers_when_idle(self):
+        """Once the server is responsive again, pacing returns to normal."""
+        self._passes(10, latency=1.0)
+        self._passes(40, latency=0.01)
+        self.assertEqual(self.pacing.stretch, 1.0)
+        self.assertEqual(self.pacing.gap, pacing.MIN_GAP)
+
+    def test_long_passes_stretch(self):
+        """Passes that run over their limit count as overruns and stretch the pacing even if the server is fast."""
+        self._passes(3, latency=0.01, seconds=2.0, limit=1.0)
+        self.assertEqual(self.pacing.overruns, 3)
+        self.assertGreater(self.pacing.stretch, 1.0)
+        self.assertFalse(self.pacing.end_pass(2.0, 0))
+
+    def test_disabled_never_stretches(self):
+        """With adaptive pacing turned off, passes are never stretched."""
+        self.pacing.enabled = False
+        self._passes(10, latency=1.0)
+        self.assertEqual(self.pacing.stretch, 1.0)
+
+    def test_wakeup_respects_gap(self):
+        """The concurrent thread rests for at least the pacing gap, even when an announcement is due sooner."""
+        mock_self = MagicMock()
+        mock_self.refresh_backlog     = 0
+        mock_self.update_frequency    = 15
+        mock_self.salutation_schedule = {}
+        mock_self.next_refresh_due    = dt.datetime.now() + dt.timedelta(seconds=1)
+        mock_self.pacing              = self.pacing
+        self.pacing.pass_seconds      = 2.0
+        self.pacing.stretch           = 3.0
+        self.assertAlmostEqual(plugin.Plugin.__seconds_until_next_wakeup__(mock_self), 4.0)
+        self.pacing.stretch = 1.0
+        self.assertLess(plugin.Plugin.__seconds_until_next_wakeup__(mock_self), 1.1)
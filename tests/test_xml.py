@@ -16,9 +16,9 @@ class TestActionsXml(ValidateXmlFile, APIBase):
     server_plugin_dir_path = SERVER_PLUGIN_DIR_PATH
     file_name = "Actions.xml"
 
-# class TestEventsXml(ValidateXmlFile, APIBase):
-#     server_plugin_dir_path = SERVER_PLUGIN_DIR_PATH
-#     file_name = "Events.xml"
+class TestEventsXml(ValidateXmlFile, APIBase):
+    server_plugin_dir_path = SERVER_PLUGIN_DIR_PATH
+    file_name = "Events.xml"
 
 class TestMenuItemsXml(ValidateXmlFile, APIBase):
     server_plugin_dir_path = SERVER_PLUGIN_DIR_PATH